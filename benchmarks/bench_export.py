@@ -0,0 +1,148 @@
+"""
+bench_export.py
+====================================
+Benchmarks the export hot paths of faerun (add_scatter, add_tree, get_min_max,
+create_data, create_python_data and plot) on synthetic TMAP-like data. Wall
+time, peak memory (traced Python allocations) and output size are recorded
+for each step and size and written as JSON.
+
+Usage:
+    python benchmarks/bench_export.py [--sizes 10000 100000] [--series 2] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+from faerun import Faerun
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import generate
+
+
+def measure(fn: Callable[[], Any], memory: bool = True) -> Tuple[Any, Dict]:
+    """Runs a function and records its wall time and, optionally, its peak memory
+    usage. The peak memory is measured in a second run, as tracing allocations
+    slows down the function.
+
+    Arguments:
+        fn (:obj:`Callable[[], Any]`): The function to benchmark
+
+    Keyword Arguments:
+        memory (:obj:`bool`, optional): Whether to measure the peak memory usage
+
+    Returns:
+        :obj:`Tuple[Any, Dict]`: The return value of the function and the measurements
+    """
+    start = time.perf_counter()
+    result = fn()
+    measurements = {"seconds": time.perf_counter() - start}
+
+    if memory:
+        tracemalloc.start()
+        fn()
+        measurements["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, measurements
+
+
+def create_faerun(scatter: Dict, tree: Dict, n_series: int) -> Faerun:
+    f = Faerun(view="front", coords=False)
+    f.add_scatter(
+        "S",
+        scatter,
+        colormap=["tab10"] + ["viridis"] * (n_series - 1),
+        categorical=[True] + [False] * (n_series - 1),
+        has_legend=True,
+    )
+    f.add_tree("S_tree", tree, point_helper="S")
+
+    return f
+
+
+def run(n: int, n_series: int, memory: bool) -> Dict:
+    """Benchmarks the export steps for a data set of size n.
+
+    Arguments:
+        n (:obj:`int`): The number of points
+        n_series (:obj:`int`): The number of property series
+        memory (:obj:`bool`): Whether to measure the peak memory usage
+
+    Returns:
+        :obj:`Dict`: The measurements of each step
+    """
+    scatter, tree = generate(n, n_series=n_series, categorical=True, s=True)
+    results = {}
+
+    f = Faerun(view="front", coords=False)
+    _, results["add_scatter"] = measure(
+        lambda: f.add_scatter(
+            "S",
+            scatter,
+            colormap=["tab10"] + ["viridis"] * (n_series - 1),
+            categorical=[True] + [False] * (n_series - 1),
+            has_legend=True,
+        ),
+        memory,
+    )
+    _, results["add_tree"] = measure(
+        lambda: f.add_tree("S_tree", tree, point_helper="S"), memory
+    )
+
+    f = create_faerun(scatter, tree, n_series)
+    _, results["get_min_max"] = measure(f.get_min_max, memory)
+
+    data, results["create_data"] = measure(f.create_data, memory)
+    results["create_data"]["output_bytes"] = len(data.encode("utf8"))
+
+    data, results["create_python_data"] = measure(f.create_python_data, memory)
+    results["create_python_data"]["output_bytes"] = len(
+        pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    )
+
+    with tempfile.TemporaryDirectory() as path:
+        _, results["plot"] = measure(lambda: f.plot("index", path=path), memory)
+        results["plot"]["output_bytes"] = sum(
+            os.path.getsize(os.path.join(path, file_name))
+            for file_name in os.listdir(path)
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--series", type=int, default=2)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    results = {str(n): run(n, args.series, not args.no_memory) for n in args.sizes}
+
+    for n, steps in results.items():
+        for step, measurements in steps.items():
+            print(
+                "{:>10} {:<20} {:>10.4f} s {:>14} {:>14}".format(
+                    n,
+                    step,
+                    measurements["seconds"],
+                    measurements.get("peak_bytes", ""),
+                    measurements.get("output_bytes", ""),
+                )
+            )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+bench_import.py
+====================================
+Measures the time needed to import faerun in a fresh interpreter and checks
+that heavy dependencies are only imported when they are needed.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 10] [--max-seconds 1.0]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules that must not be imported by "import faerun"
+LAZY_MODULES = ["pandas", "matplotlib.pyplot", "cherrypy", "IPython", "tmap", "jinja2"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import faerun
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure(repeat: int) -> dict:
+    """Imports faerun repeat times, each time in a new interpreter.
+
+    Arguments:
+        repeat (:obj:`int`): The number of measurements
+
+    Returns:
+        :obj:`dict`: The median and minimum import time and the eagerly imported heavy modules
+    """
+    times = []
+    modules = set()
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT % LAZY_MODULES],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        modules.update(result["modules"])
+
+    return {
+        "median_seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "eager_heavy_modules": sorted(modules),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="Fail if the median import time exceeds this value",
+    )
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    print(json.dumps(result, indent=2))
+
+    if result["eager_heavy_modules"]:
+        print("Heavy modules imported by 'import faerun'.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.max_seconds is not None and result["median_seconds"] > args.max_seconds:
+        print("Importing faerun is slower than the limit.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+bench_web.py
+====================================
+Benchmarks the endpoints of the faerun web server (get_values, get_index and
+get_label) through a local HTTP client on synthetic TMAP-like data. Latencies
+and response sizes are recorded for each endpoint and size and written as JSON.
+
+Usage:
+    python benchmarks/bench_web.py [--sizes 10000 100000] [--requests 50] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict
+
+import cherrypy
+
+from faerun import Faerun
+from faerun.web import FaerunWeb
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import generate
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def post(url: str, body: Dict) -> bytes:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+
+def time_requests(url: str, bodies: list) -> Dict:
+    """Sends the requests one after the other and records their latencies.
+
+    Arguments:
+        url (:obj:`str`): The URL of the endpoint
+        bodies (:obj:`list`): The JSON bodies of the requests
+
+    Returns:
+        :obj:`Dict`: The median, 95th percentile and maximum latency and the mean response size
+    """
+    latencies = []
+    sizes = []
+
+    for body in bodies:
+        start = time.perf_counter()
+        sizes.append(len(post(url, body)))
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+
+    return {
+        "median_seconds": statistics.median(latencies),
+        "p95_seconds": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "max_seconds": latencies[-1],
+        "response_bytes": statistics.mean(sizes),
+    }
+
+
+def run(n: int, n_requests: int, base_url: str) -> Dict:
+    """Benchmarks the endpoints for a data set of size n.
+
+    Arguments:
+        n (:obj:`int`): The number of points
+        n_requests (:obj:`int`): The number of requests per endpoint
+        base_url (:obj:`str`): The URL of the running server
+
+    Returns:
+        :obj:`Dict`: The measurements of each endpoint
+    """
+    scatter, tree = generate(n, n_series=2, categorical=True)
+    f = Faerun()
+    f.add_scatter(
+        "S", scatter, colormap=["tab10", "viridis"], categorical=[True, False]
+    )
+    f.add_tree("S_tree", tree, point_helper="S")
+
+    with tempfile.TemporaryDirectory() as path:
+        file_name = os.path.join(path, "data.faerun")
+        with open(file_name, "wb+") as handle:
+            pickle.dump(
+                f.create_python_data(), handle, protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+        start = time.perf_counter()
+        app = FaerunWeb(file_name)
+        results = {"startup": {"seconds": time.perf_counter() - start}}
+
+    # Each data set is served by its own application on the running server
+    cherrypy.tree.mount(app, "/" + str(n))
+    url = base_url + str(n) + "/"
+    ids = list(range(0, n, max(1, n // n_requests)))[:n_requests]
+
+    results["get_values"] = time_requests(
+        url + "get_values",
+        [{"name": "S", "coord": coord, "dtype": "float32"} for coord in "xyz"]
+        * max(1, n_requests // 3),
+    )
+    results["get_values_colors"] = time_requests(
+        url + "get_values",
+        [
+            {"name": "S", "coord": coord, "dtype": "uint8", "series": 1}
+            for coord in "rgb"
+        ]
+        * max(1, n_requests // 3),
+    )
+    results["get_label"] = time_requests(
+        url + "get_label", [{"name": "S", "id": i} for i in ids]
+    )
+    results["get_index"] = time_requests(
+        url + "get_index", [{"name": "S", "label": str(i)} for i in ids]
+    )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    port = free_port()
+    cherrypy.config.update(
+        {
+            "server.socket_host": "127.0.0.1",
+            "server.socket_port": port,
+            "log.screen": False,
+            "environment": "embedded",
+        }
+    )
+    cherrypy.engine.start()
+
+    try:
+        base_url = "http://127.0.0.1:" + str(port) + "/"
+        results = {str(n): run(n, args.requests, base_url) for n in args.sizes}
+    finally:
+        cherrypy.engine.exit()
+
+    for n, endpoints in results.items():
+        for endpoint, measurements in endpoints.items():
+            print(
+                "{:>10} {:<20} {:>10.4f} s {:>14}".format(
+                    n,
+                    endpoint,
+                    measurements.get("median_seconds", measurements.get("seconds")),
+                    measurements.get("response_bytes", ""),
+                )
+            )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
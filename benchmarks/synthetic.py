@@ -0,0 +1,75 @@
+"""
+synthetic.py
+====================================
+Generators for synthetic, TMAP-like benchmark data: points laid out along the
+branches of a random tree, with one or more property series.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def generate(
+    n: int,
+    n_series: int = 1,
+    labels: bool = True,
+    cs: bool = False,
+    s: bool = False,
+    categorical: bool = False,
+    seed: int = 0,
+) -> Tuple[Dict, Dict]:
+    """Generates a scatter layer with n points and a tree with n - 1 edges connecting them.
+
+    Arguments:
+        n (:obj:`int`): The number of points
+
+    Keyword Arguments:
+        n_series (:obj:`int`, optional): The number of property series
+        labels (:obj:`bool`, optional): Whether to generate labels ("smiles__id")
+        cs (:obj:`bool`, optional): Whether to generate per-point color saturation values
+        s (:obj:`bool`, optional): Whether to generate per-point sizes
+        categorical (:obj:`bool`, optional): Whether the first series is categorical (10 categories)
+        seed (:obj:`int`, optional): The seed of the random number generator
+
+    Returns:
+        :obj:`Tuple[Dict, Dict]`: The scatter data (x, y, c and optionally labels, cs and s) and the tree data (from, to)
+    """
+    rng = np.random.default_rng(seed)
+
+    # Attach every vertex to a random, recently added vertex, which results in
+    # long branches similar to the ones in TMAP layouts
+    parents = np.zeros(n, dtype=np.int64)
+    if n > 1:
+        offsets = rng.integers(1, 32, n - 1)
+        parents[1:] = np.maximum(np.arange(1, n) - offsets, 0)
+
+    steps = rng.normal(size=(n, 2))
+    steps[0] = 0.0
+    xy = np.zeros((n, 2))
+    for i in range(1, n):
+        xy[i] = xy[parents[i]] + steps[i]
+
+    scatter = {"x": xy[:, 0], "y": xy[:, 1]}
+
+    series = [rng.random(n) for _ in range(n_series)]
+    if categorical and n_series > 0:
+        series[0] = rng.integers(0, 10, n)
+
+    scatter["c"] = series
+
+    if labels:
+        lengths = rng.integers(5, 40, n)
+        scatter["labels"] = [
+            "C" * int(length) + "O__" + str(i) for i, length in enumerate(lengths)
+        ]
+
+    if cs:
+        scatter["cs"] = [rng.random(n) for _ in range(n_series)]
+
+    if s:
+        scatter["s"] = rng.random(n)
+
+    tree = {"from": parents[1:], "to": np.arange(1, n)}
+
+    return scatter, tree
@@ -1,14 +1,31 @@
+import importlib
 import os
 from faerun.faerun import Faerun
-from faerun.web import host
-
-try:
-    from .plot import FaerunPlot
-except:
-    ...
+from faerun.store import save_data, load_data, LabelStore
+from faerun.chunked import write_chunked
+from faerun.instrumentation import ExportProfiler
+from faerun.cache import ExportCache
+from faerun.batch import plot_batch
+from faerun.density import create_density
+from faerun.labels import format_labels
 
 _ROOT = os.path.abspath(os.path.dirname(__file__))
 
+# Members that pull in heavy dependencies (e.g. cherrypy) are only imported
+# once they are accessed
+_LAZY_MEMBERS = {"host": "faerun.web", "FaerunPlot": "faerun.plot"}
+
+
+def __getattr__(name):
+    if name in _LAZY_MEMBERS:
+        return getattr(importlib.import_module(_LAZY_MEMBERS[name]), name)
+
+    raise AttributeError("module 'faerun' has no attribute '" + name + "'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_MEMBERS))
+
 
 def get_asset(path):
     """Gets the path to the assets folder
@@ -0,0 +1,153 @@
+"""
+batch.py
+====================================
+A module for plotting many figures at once, e.g. one figure per target that only
+differs in the highlighted series or subset.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from faerun.cache import MemoryCache
+from faerun.faerun import DATA_DECODER, Faerun
+
+if TYPE_CHECKING:
+    import jinja2
+
+
+def plot_batch(
+    figures: Dict[str, Faerun],
+    path: str = "./",
+    template: str = "default",
+    max_workers: int = None,
+) -> Dict[str, str]:
+    """Plots many figures to HTML files. The data of each layer is split into parts
+    (the coordinates, the labels, the sizes and each series of colors, see
+    :obj:`faerun.Faerun.scatter_parts`), which are written to files named after a hash
+    of their content. Figures share the files of the parts they have in common (e.g.
+    the coordinates of figures that only differ in their colors), and the data file of
+    each figure only assembles its parts. Layers that are identical across figures are
+    only exported once. The template is compiled once and the files are written by a
+    pool of threads while the next figures are exported (exporting and rendering are
+    bound by the interpreter and do not run in parallel).
+
+    Arguments:
+        figures (:obj:`Dict[str, Faerun]`): The figures to plot by the names of their HTML files (without extension)
+
+    Keyword Arguments:
+        path (:obj:`str`, optional): The path to which to write the HTML / JS files
+        template (:obj:`str`, optional): The name or path of the template to use
+        max_workers (:obj:`int`, optional): The maximum number of threads writing files. Defaults to the default of :obj:`concurrent.futures.ThreadPoolExecutor`
+
+    Returns:
+        :obj:`Dict[str, str]`: The names of the data files by the names of the HTML files
+    """
+    compiled = Faerun.load_template(template)
+
+    # One memory cache per distinct export cache of the figures
+    memos = {}
+    data_files = {}
+    written = set()
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file_name, figure in figures.items():
+            if id(figure.cache) not in memos:
+                memos[id(figure.cache)] = MemoryCache(figure.cache)
+
+            parts, data = _assemble(figure.create_parts(memos[id(figure.cache)]))
+            data_file_name = _content_name(data)
+
+            for part_file_name, part in list(parts.items()) + [(data_file_name, data)]:
+                if part_file_name not in written:
+                    written.add(part_file_name)
+                    futures.append(
+                        executor.submit(
+                            _write_data, os.path.join(path, part_file_name), part
+                        )
+                    )
+
+            data_files[file_name] = data_file_name
+            model = figure.create_model(data_file_name, list(parts))
+            futures.append(
+                executor.submit(
+                    _write_html,
+                    os.path.join(path, file_name + ".html"),
+                    compiled,
+                    model,
+                )
+            )
+
+        # Raise the first error of the workers, if any
+        for future in futures:
+            future.result()
+
+    return data_files
+
+
+def _assemble(layers: Dict[str, Dict[str, List[str]]]) -> Tuple[Dict[str, str], str]:
+    # Each part is a function registered by its hash, which creates the object
+    # containing its properties when the data file of the figure is run
+    parts = {}
+
+    def reference(properties: str) -> str:
+        file_name = _content_name(properties)
+        key = file_name[len("data-") : -len(".js")]
+
+        if file_name not in parts:
+            parts[file_name] = (
+                "var faerunParts = faerunParts || {};\n"
+                + 'faerunParts["'
+                + key
+                + '"] = () => ({\n'
+                + properties
+                + "});\n"
+            )
+
+        return 'faerunParts["' + key + '"]()'
+
+    output = "const data = {\n"
+    for name, layer in layers.items():
+        objects = [reference(properties) for properties in layer["properties"]]
+        if "colors" in layer:
+            colors = [reference(properties) for properties in layer["colors"]]
+            objects.append("{ colors: [" + ", ".join(colors) + "] }")
+
+        output += name + ": Object.assign({}, " + ", ".join(objects) + "),\n"
+
+    output += "};\n"
+
+    # Binary arrays (quantized coordinates, palettes) are decoded by the prelude
+    if any('faerunDecode("' in part for part in parts.values()):
+        output = (
+            DATA_DECODER
+            + output
+            + "faerunDequantize(data);\nfaerunExpandPalettes(data);\n"
+        )
+
+    return parts, output
+
+
+def _content_name(data: str) -> str:
+    return "data-" + hashlib.blake2b(data.encode(), digest_size=8).hexdigest() + ".js"
+
+
+def _write_data(path: str, data: str) -> None:
+    # The file name depends on the content, so existing files are up to date
+    if os.path.isfile(path):
+        return
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+
+    os.replace(tmp_path, path)
+
+
+def _write_html(path: str, template: "jinja2.Template", model: Dict) -> None:
+    output_text = template.render(model)
+
+    with open(path, "w") as f:
+        f.write(output_text)
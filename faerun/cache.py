@@ -0,0 +1,378 @@
+"""
+cache.py
+====================================
+A module for caching the exported data of faerun layers on disk, so that plotting the
+same data again (e.g. after changing the style of a plot) only recomputes the layers
+that changed.
+"""
+
+import hashlib
+import heapq
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, List, Tuple, Union
+
+import numpy as np
+from matplotlib.colors import Colormap
+
+from faerun.store import LabelStore
+
+# Part of every key, increase when the exported format of a layer changes
+CACHE_VERSION = 1
+
+
+class ExportCache:
+    """A size-bounded, content-addressed cache of exported layers stored in a directory.
+    When the cache grows larger than its maximum size, the least recently used entries
+    are removed. The sizes and order of use of the entries are tracked in memory, so the
+    directory is only scanned when the cache is created and when it is full."""
+
+    def __init__(self, path: str, max_bytes: int = 2**30, binary: bool = False):
+        """Constructor for ExportCache.
+
+        Arguments:
+            path (:obj:`str`): The path of the cache directory (created if it does not exist)
+
+        Keyword Arguments:
+            max_bytes (:obj:`int`, optional): The maximum size of the cache in bytes. Defaults to 1 GiB.
+            binary (:obj:`bool`, optional): Whether the entries are bytes (e.g. images) instead of strings
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.binary = binary
+        self.suffix = ".bin" if binary else ".js"
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # The sizes of the entries by path, least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+
+        os.makedirs(path, exist_ok=True)
+        self.scan()
+
+    def get(self, key: str) -> Union[str, bytes, None]:
+        """Gets a cached entry and marks it as recently used.
+
+        Arguments:
+            key (:obj:`str`): The key of the entry, as returned by :obj:`hash_values`
+
+        Returns:
+            :obj:`Union[str, bytes, None]`: The cached entry or None if it is not in the cache
+        """
+        path = self.entry_path(key)
+
+        try:
+            with open(path, "rb") if self.binary else open(path, encoding="utf8") as f:
+                value = f.read()
+                size = os.fstat(f.fileno()).st_size
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            self.untrack(path)
+            return None
+
+        self.hits += 1
+        self.track(path, size)
+        return value
+
+    def put(self, key: str, value: Union[str, bytes]) -> None:
+        """Adds an entry to the cache and evicts the least recently used entries
+        if the cache exceeds its maximum size.
+
+        Arguments:
+            key (:obj:`str`): The key of the entry, as returned by :obj:`hash_values`
+            value (:obj:`Union[str, bytes]`): The entry
+        """
+        if len(value) > self.max_bytes:
+            return
+
+        # Write to a temporary file first, so that concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with (
+            os.fdopen(fd, "wb") if self.binary else os.fdopen(fd, "w", encoding="utf8")
+        ) as f:
+            f.write(value)
+            f.flush()
+            size = os.fstat(f.fileno()).st_size
+
+        os.replace(tmp_path, self.entry_path(key))
+        self.track(self.entry_path(key), size)
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache is no larger than 90%
+        of its maximum size, so that a full cache is not evicted on every put. The
+        directory is scanned first, as it may be shared with other processes."""
+        self.scan()
+
+        with self.lock:
+            while self.entries and self.size > 0.9 * self.max_bytes:
+                path, size = self.entries.popitem(last=False)
+                self.size -= size
+
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def scan(self) -> None:
+        """Reads the sizes and the order of use (modification times) of the entries from
+        the cache directory."""
+        entries = []
+
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+
+        with self.lock:
+            self.entries = OrderedDict(
+                (path, size) for _, path, size in sorted(entries)
+            )
+            self.size = sum(self.entries.values())
+
+    def track(self, path: str, size: int) -> None:
+        """Marks an entry as most recently used and updates its size.
+
+        Arguments:
+            path (:obj:`str`): The path of the file storing the entry
+            size (:obj:`int`): The size of the file in bytes
+        """
+        with self.lock:
+            self.size += size - self.entries.pop(path, 0)
+            self.entries[path] = size
+
+    def untrack(self, path: str) -> None:
+        """Stops tracking an entry, e.g. after it was removed by another process.
+
+        Arguments:
+            path (:obj:`str`): The path of the file storing the entry
+        """
+        with self.lock:
+            self.size -= self.entries.pop(path, 0)
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(self.suffix):
+                os.remove(entry.path)
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def entry_path(self, key: str) -> str:
+        """Gets the path of the file storing an entry.
+
+        Arguments:
+            key (:obj:`str`): The key of the entry
+
+        Returns:
+            :obj:`str`: The path of the file
+        """
+        return os.path.join(self.path, key + self.suffix)
+
+
+class MemoryCache:
+    """A cache of exported layers kept in memory, e.g. to share identical layers between
+    the figures of a batch. Lookups that miss fall back to an optional (disk) cache."""
+
+    def __init__(self, parent: Union[ExportCache, None] = None):
+        """Constructor for MemoryCache.
+
+        Keyword Arguments:
+            parent (:obj:`ExportCache`, optional): A cache to look up entries in that are not in memory and to add new entries to
+        """
+        self.parent = parent
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Union[str, None]:
+        """Gets a cached entry.
+
+        Arguments:
+            key (:obj:`str`): The key of the entry, as returned by :obj:`hash_values`
+
+        Returns:
+            :obj:`Union[str, None]`: The cached entry or None if it is not in the cache
+        """
+        with self.lock:
+            value = self.entries.get(key)
+
+        if value is None and self.parent is not None:
+            value = self.parent.get(key)
+            if value is not None:
+                with self.lock:
+                    self.entries[key] = value
+
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        """Adds an entry to the cache (and its parent).
+
+        Arguments:
+            key (:obj:`str`): The key of the entry, as returned by :obj:`hash_values`
+            value (:obj:`str`): The entry
+        """
+        with self.lock:
+            self.entries[key] = value
+
+        if self.parent is not None:
+            self.parent.put(key, value)
+
+
+class LRUCache:
+    """A thread-safe, in-memory cache that keeps a fixed number of the most recently
+    used entries, e.g. the results of repeated queries to the web server."""
+
+    def __init__(self, max_entries: int = 128):
+        """Constructor for LRUCache.
+
+        Keyword Arguments:
+            max_entries (:obj:`int`, optional): The maximum number of entries. Defaults to 128.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        """Gets a cached entry and marks it as recently used.
+
+        Arguments:
+            key (:obj:`Any`): The key of the entry
+
+        Returns:
+            :obj:`Any`: The cached entry or None if it is not in the cache
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        """Adds an entry to the cache and evicts the least recently used entry if the cache is full.
+
+        Arguments:
+            key (:obj:`Any`): The key of the entry
+            value (:obj:`Any`): The entry
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DecayingCounter:
+    """A thread-safe counter of a bounded number of keys, e.g. the views of data points.
+    Whenever more than the maximum number of keys are counted, all counts are halved and
+    the least counted keys are forgotten, so that recent counts weigh more."""
+
+    def __init__(self, max_keys: int = 4096):
+        """Constructor for DecayingCounter.
+
+        Keyword Arguments:
+            max_keys (:obj:`int`, optional): The maximum number of counted keys. Defaults to 4096.
+        """
+        self.max_keys = max(2, max_keys)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def add(self, key: Any) -> None:
+        """Counts a key.
+
+        Arguments:
+            key (:obj:`Any`): The key
+        """
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+            if len(self.counts) > self.max_keys:
+                self.counts = {k: v // 2 for k, v in self.counts.items() if v > 1}
+
+                # Keeping at most half of the keys bounds the cost of halving per add
+                if len(self.counts) > self.max_keys // 2:
+                    self.counts = dict(
+                        heapq.nlargest(
+                            self.max_keys // 2,
+                            self.counts.items(),
+                            key=lambda item: item[1],
+                        )
+                    )
+
+    def most_common(self, n: int) -> List[Tuple[Any, int]]:
+        """Gets the most counted keys.
+
+        Arguments:
+            n (:obj:`int`): The number of keys
+
+        Returns:
+            :obj:`List[Tuple[Any, int]]`: The keys and their counts, most counted first
+        """
+        with self.lock:
+            return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+def hash_values(*values: Any) -> str:
+    """Creates a key from the content of (nested) faerun data and options. Arrays and
+    label stores are hashed by their content, colormaps by their colors.
+
+    Arguments:
+        *values (:obj:`Any`): The data and options the key depends on
+
+    Returns:
+        :obj:`str`: A hexadecimal key
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(CACHE_VERSION).encode())
+
+    for value in values:
+        _update(h, value)
+
+    return h.hexdigest()
+
+
+def _update(h: Any, value: Any) -> None:
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        _update(h, value.tolist())
+    elif isinstance(value, np.ndarray):
+        h.update(("array" + value.dtype.str + str(value.shape)).encode())
+        h.update(memoryview(np.ascontiguousarray(value)).cast("B"))
+    elif isinstance(value, LabelStore):
+        h.update(b"labels")
+        _update(h, value.offsets)
+        _update(h, value.buffer)
+    elif isinstance(value, Colormap):
+        h.update(("colormap" + value.name + str(value.N)).encode())
+        _update(h, value(np.arange(value.N)))
+    elif isinstance(value, dict):
+        h.update(("dict" + str(len(value))).encode())
+        for key in sorted(value, key=str):
+            _update(h, key)
+            _update(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(("list" + str(len(value))).encode())
+        if len(value) > 0 and all(isinstance(v, str) for v in value):
+            # Lists of labels are hashed at once, which is a lot faster than one by one
+            h.update("\0".join(value).encode("utf8", "surrogatepass"))
+        else:
+            for v in value:
+                _update(h, v)
+    else:
+        h.update((type(value).__name__ + repr(value)).encode("utf8", "surrogatepass"))
@@ -0,0 +1,505 @@
+"""
+chunked.py
+====================================
+A module for exporting scatter layers that are too large to fit into memory.
+"""
+
+import os
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+from matplotlib.colors import Colormap
+
+from faerun.faerun import Faerun
+from faerun.store import ArrayRef, LabelsRef, layer_prefix, read_meta, write_meta
+
+
+def write_chunked(
+    path: str,
+    name: str,
+    chunks: Union[Callable[[], Iterable[Any]], Iterable[Any], str],
+    mapping: Dict = {
+        "x": "x",
+        "y": "y",
+        "z": "z",
+        "c": "c",
+        "cs": "cs",
+        "s": "s",
+        "labels": "labels",
+    },
+    colormap: Union[str, Colormap, List[str], List[Colormap]] = "plasma",
+    shader: str = "sphere",
+    point_scale: float = 1.0,
+    max_point_size: float = 100.0,
+    fog_intensity: float = 0.0,
+    saturation_limit: Union[float, List[float]] = 0.2,
+    categorical: Union[bool, List[bool]] = False,
+    interactive: bool = True,
+    has_legend: bool = False,
+    legend_title: Union[str, List[str]] = None,
+    legend_labels: Union[Dict, List[Dict]] = None,
+    series_title: Union[str, List[str]] = None,
+    legend_number_format: str = "{:.2f}",
+    color_encoding: str = "rgb",
+    quantization_bits: int = None,
+    scale: float = 750.0,
+    bounds: Tuple[float, float] = None,
+    keep_values: bool = False,
+) -> None:
+    """Writes a scatter layer to a faerun data directory (see :obj:`faerun.save_data`)
+    from chunks of data, without ever loading the whole data set into memory.
+    The chunks are read twice: once to compute the bounds and color ranges and once to
+    write the normalized binary columns.
+
+    Arguments:
+        path (:obj:`str`): The path of the faerun data directory
+        name (:obj:`str`): The name of the layer
+        chunks (:obj:`Callable[[], Iterable[Any]]`, :obj:`Iterable[Any]` or :obj:`str`): A function returning an iterator over the chunks, a re-iterable collection of chunks or the path to a Parquet file (which is read by row group, only reading the columns in :obj:`mapping`). A chunk can be a dict of NumPy arrays, a pandas :obj:`DataFrame`, a NumPy structured array or a pyarrow :obj:`Table` or :obj:`RecordBatch`
+
+    Keyword Arguments:
+        mapping (:obj:`dict`, optional): The keys which contain the data in the chunks. The value for "c" (and "s") can be a list of keys when visualizing multiple series
+        colormap (:obj:`str`, :obj:`Colormap`, :obj:`List[str]`, or :obj:`List[Colormap]` optional): The name of the colormap (can also be a matplotlib Colormap object). A list when visualizing multiple series
+        shader (:obj:`str`, optional): The name of the shader to use for the data point visualization
+        point_scale (:obj:`float`, optional): The relative size of the data points
+        max_point_size (:obj:`int`, optional): The maximum size of the data points when zooming in
+        fog_intensity (:obj:`float`, optional): The intensity of the distance fog
+        saturation_limit (:obj:`float` or :obj:`List[float]`, optional): The minimum saturation to avoid "gray soup". A list when visualizing multiple series
+        categorical (:obj:`bool` or :obj:`List[bool]`, optional): Whether this scatter layer is categorical. A list when visualizing multiple series
+        interactive (:obj:`bool`, optional): Whether this scatter layer is interactive
+        has_legend (:obj:`bool`, optional): Whether or not to draw a legend
+        legend_title (:obj:`str` or :obj:`List[str]`, optional): The title of the legend. A list when visualizing multiple series
+        legend_labels (:obj:`Dict` or :obj:`List[Dict]`, optional): A dict mapping values to legend labels. A list when visualizing multiple series
+        series_title (:obj:`str` or :obj:`List[str]`, optional): The name of the series (used when multiple properites supplied). A list when visualizing multiple series
+        legend_number_format (:obj:`str`, optional): A format string applied to the numbers displayed in the legend
+        color_encoding (:obj:`str`, optional): How colors are stored ('rgb', 'palette' or 'lut', see :obj:`Faerun`)
+        quantization_bits (:obj:`int`, optional): If set, the coordinates are stored as unsigned integers with this bit depth (see :obj:`Faerun`)
+        scale (:obj:`float`, optional): To what size to scale the coordinates (which are normalized)
+        bounds (:obj:`Tuple[float, float]`, optional): The minimum and maximum coordinate used for normalization. Computed from the data if not supplied
+        keep_values (:obj:`bool`, optional): Whether to store the raw values of each series (see :obj:`Faerun`)
+    """
+    if isinstance(chunks, str):
+        chunks = _parquet_chunks(chunks, mapping)
+
+    if not callable(chunks) and iter(chunks) is chunks:
+        raise TypeError(
+            "The chunks are read twice, pass a function returning an iterator "
+            "instead of an iterator."
+        )
+
+    get_chunks = chunks if callable(chunks) else lambda: chunks
+
+    # First pass: count the points and get the bounds and the color ranges
+    n = 0
+    n_series = 0
+    n_size_series = 0
+    min_coords = {key: float("inf") for key in ["x", "y", "z"]}
+    max_coords = {key: float("-inf") for key in ["x", "y", "z"]}
+    min_c = []
+    max_c = []
+    min_cs = []
+    max_cs = []
+    categories = []
+    has_nan = []
+    is_integer = []
+    value_dtypes = []
+    has_z = has_cs = has_s = has_labels = False
+
+    for chunk in get_chunks():
+        c = _columns(chunk, mapping["c"])
+        n_series = len(c)
+
+        if n == 0:
+            has_z = _has(chunk, mapping["z"])
+            has_cs = _has(chunk, mapping["cs"])
+            has_s = _has(chunk, mapping["s"])
+            has_labels = _has(chunk, mapping["labels"])
+            min_c = [float("inf")] * n_series
+            max_c = [float("-inf")] * n_series
+            min_cs = [float("inf")] * n_series
+            max_cs = [float("-inf")] * n_series
+            categories = [set() for _ in range(n_series)]
+            has_nan = [False] * n_series
+            is_integer = [c[s].dtype.kind in "iu" for s in range(n_series)]
+            value_dtypes = [c[s].dtype for s in range(n_series)]
+
+        colormap = Faerun.expand_list(Faerun.make_list(colormap), n_series)
+        saturation_limit = Faerun.expand_list(
+            Faerun.make_list(saturation_limit), n_series
+        )
+        categorical = Faerun.expand_list(Faerun.make_list(categorical), n_series)
+        legend_title = Faerun.expand_list(
+            Faerun.make_list(legend_title), n_series, with_none=True
+        )
+        legend_labels = Faerun.expand_list(
+            Faerun.make_list(legend_labels, make_list_list=True),
+            n_series,
+            with_none=True,
+        )
+        series_title = Faerun.expand_list(
+            Faerun.make_list(series_title), n_series, with_value="Series"
+        )
+        cmaps = [Faerun.get_cmap(cmap) for cmap in colormap]
+
+        n += len(c[0])
+
+        for key in ["x", "y", "z"]:
+            if key == "z" and not has_z:
+                values = np.zeros(1)
+            else:
+                values = _column(chunk, mapping[key])
+
+            min_coords[key] = min(min_coords[key], float(np.min(values)))
+            max_coords[key] = max(max_coords[key], float(np.max(values)))
+
+        for s in range(n_series):
+            # Missing values do not count towards the range, and are later mapped
+            # to the "bad" color of the colormap
+            values = c[s]
+            if values.dtype.kind == "f":
+                nan = np.isnan(values)
+                has_nan[s] = has_nan[s] or bool(np.any(nan))
+                values = values[~nan]
+
+            if len(values) > 0:
+                min_c[s] = min(min_c[s], float(np.min(values)))
+                max_c[s] = max(max_c[s], float(np.max(values)))
+
+            if categorical[s]:
+                categories[s].update(np.unique(c[s]).tolist())
+
+        if has_cs:
+            cs = _columns(chunk, mapping["cs"])
+            for s in range(len(cs)):
+                min_cs[s] = min(min_cs[s], float(np.min(cs[s])))
+                max_cs[s] = max(max_cs[s], float(np.max(cs[s])))
+
+        if has_s:
+            n_size_series = len(_columns(chunk, mapping["s"]))
+
+    if n == 0:
+        raise ValueError("The chunks do not contain any data.")
+
+    if bounds is None:
+        bounds = (min(min_coords.values()), max(max_coords.values()))
+
+    minimum, maximum = bounds
+    diff = maximum - minimum
+
+    # Prepare the legends (based on the ranges and categories) and the meta data
+    legend = [None] * n_series
+    is_range = [False] * n_series
+    min_legend_label = [None] * n_series
+    max_legend_label = [None] * n_series
+
+    for s in range(n_series):
+        if legend_title[s] is None:
+            legend_title[s] = name
+
+        min_legend_label[s] = legend_number_format.format(min_c[s])
+        max_legend_label[s] = legend_number_format.format(max_c[s])
+
+        legend[s] = []
+        if has_legend:
+            legend_values = []
+            if categorical[s]:
+                if legend_labels[s]:
+                    legend_values = legend_labels[s]
+                else:
+                    legend_values = [(i, str(i)) for i in sorted(categories[s])]
+            else:
+                if legend_labels[s]:
+                    for value, label in reversed(legend_labels[s]):
+                        legend_values.append(
+                            [(value - min_c[s]) / (max_c[s] - min_c[s]), label]
+                        )
+                else:
+                    is_range[s] = True
+                    for val in np.linspace(1.0, 0.0, 99):
+                        legend_values.append(
+                            [
+                                val,
+                                legend_number_format.format(
+                                    min_c[s] + val * (max_c[s] - min_c[s])
+                                ),
+                            ]
+                        )
+
+            # Continuous legends keep the positions of their colors, so that they
+            # can be recolored along with a lookup table
+            for value, label in legend_values:
+                if categorical[s]:
+                    legend[s].append([list(cmaps[s](value)), label])
+                else:
+                    legend[s].append([list(cmaps[s](value)), label, float(value)])
+
+    meta = read_meta(path) if os.path.isdir(path) else {}
+    os.makedirs(path, exist_ok=True)
+    prefix = layer_prefix(meta, name)
+
+    layer = {
+        "meta": {
+            "name": name,
+            "shader": shader,
+            "point_scale": point_scale,
+            "max_point_size": max_point_size,
+            "fog_intensity": fog_intensity,
+            "interactive": interactive,
+            "categorical": categorical,
+            "mapping": mapping,
+            "colormap": colormap,
+            "has_legend": has_legend,
+            "legend_title": legend_title,
+            "legend": legend,
+            "is_range": is_range,
+            "min_c": min_c,
+            "max_c": max_c,
+            "min_legend_label": min_legend_label,
+            "max_legend_label": max_legend_label,
+            "series_title": series_title,
+            "ondblclick": [None] * n_series,
+            "selected_labels": [None] * n_series,
+            "label_index": [0] * n_series,
+            "title_index": [0] * n_series,
+            "palettes": [None] * n_series,
+            "lut_bins": [None] * n_series,
+        },
+        "type": "scatter",
+    }
+
+    # Second pass: write the normalized binary columns
+    def create_column(key, dtype, shape):
+        file_name = prefix + "." + key + ".npy"
+        column = np.lib.format.open_memmap(
+            os.path.join(path, file_name), mode="w+", dtype=dtype, shape=shape
+        )
+        return file_name, column
+
+    # The quantization is done over the (normalized) bounding box of the layer
+    coord_dtype = np.float32
+    if quantization_bits is not None:
+        coord_dtype = np.uint8 if quantization_bits <= 8 else np.uint16
+        quantization_bounds = {
+            key: (
+                scale * (min_coords[key] - minimum) / diff,
+                scale * (max_coords[key] - minimum) / diff,
+            )
+            for key in ["x", "y", "z"]
+        }
+        layer["meta"]["quantization"] = {
+            "bits": quantization_bits,
+            "offset": [],
+            "step": [],
+        }
+
+    columns = {}
+    for key in ["x", "y", "z"]:
+        columns[key] = create_column(key, coord_dtype, (n,))
+
+    if has_s:
+        columns["s"] = create_column("s", np.float32, (n_size_series, n))
+
+    # Series without per-point saturation can be stored as indices into a
+    # palette (categorical) or a lookup table (continuous)
+    channels = [["r", "g", "b"] for _ in range(n_series)]
+    palettes = [None] * n_series
+
+    for s in range(n_series):
+        if color_encoding == "lut" and not categorical[s] and not has_cs:
+            channels[s] = ["index"]
+            _, palettes[s] = Faerun.map_lut(cmaps[s], [], missing=has_nan[s])
+            layer["meta"]["palettes"][s] = palettes[s].tolist()
+            layer["meta"]["lut_bins"][s] = len(Faerun.create_lut(cmaps[s]))
+        elif (
+            color_encoding != "rgb"
+            and categorical[s]
+            and is_integer[s]
+            and not has_cs
+            and min_c[s] >= 0
+            and max_c[s] < cmaps[s].N
+        ):
+            channels[s] = ["index"]
+            palettes[s] = Faerun.map_colors(
+                cmaps[s], np.arange(int(max_c[s]) + 1)
+            ).astype(np.uint8)
+            layer["meta"]["palettes"][s] = palettes[s].tolist()
+
+        if keep_values:
+            columns[(s, "values")] = create_column(
+                "values." + str(s), value_dtypes[s], (n,)
+            )
+
+        for channel in channels[s]:
+            dtype = np.uint8
+            if channel == "index":
+                dtype = Faerun.index_dtype(len(palettes[s]))
+
+            columns[(s, channel)] = create_column(
+                "colors." + str(s) + "." + channel, dtype, (n,)
+            )
+
+    if has_labels:
+        labels_name = prefix + ".labels"
+        labels_file = open(os.path.join(path, labels_name + ".bin"), "wb+")
+        labels_offsets = np.lib.format.open_memmap(
+            os.path.join(path, labels_name + ".offsets.npy"),
+            mode="w+",
+            dtype=np.int64,
+            shape=(n + 1,),
+        )
+        labels_offsets[0] = 0
+
+    start = 0
+    for chunk in get_chunks():
+        c = _columns(chunk, mapping["c"])
+        end = start + len(c[0])
+
+        for key in ["x", "y", "z"]:
+            if key == "z" and not has_z:
+                values = np.zeros(end - start)
+            else:
+                values = np.asarray(_column(chunk, mapping[key]), dtype=np.float64)
+
+            values = scale * (values - minimum) / diff
+
+            if quantization_bits is not None:
+                values, _, _ = Faerun.quantize(
+                    values, quantization_bits, quantization_bounds[key]
+                )
+
+            columns[key][1][start:end] = values
+
+        if has_s:
+            columns["s"][1][:, start:end] = _columns(chunk, mapping["s"])
+
+        if has_cs:
+            cs = _columns(chunk, mapping["cs"])
+
+        for s in range(n_series):
+            values = c[s]
+            if keep_values:
+                columns[(s, "values")][1][start:end] = values
+
+            if not categorical[s]:
+                values = (values - min_c[s]) / ((max_c[s] - min_c[s]) or 1.0)
+
+            if palettes[s] is not None:
+                if not categorical[s]:
+                    values, _ = Faerun.map_lut(cmaps[s], values, missing=has_nan[s])
+
+                columns[(s, "index")][1][start:end] = values
+                continue
+
+            saturation = None
+            if has_cs and s < len(cs):
+                saturation = 1.0 - np.maximum(
+                    saturation_limit[s],
+                    (cs[s] - min_cs[s]) / ((max_cs[s] - min_cs[s]) or 1.0),
+                )
+
+            colors = Faerun.map_colors(cmaps[s], values, saturation)
+            for i, channel in enumerate(["r", "g", "b"]):
+                columns[(s, channel)][1][start:end] = colors[:, i]
+
+        if has_labels:
+            encoded = [
+                str(label).encode("utf8") for label in _column(chunk, mapping["labels"])
+            ]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+            labels_offsets[start + 1 : end + 1] = labels_offsets[start] + np.cumsum(
+                lengths
+            )
+            labels_file.write(b"".join(encoded))
+
+        start = end
+
+    if start != n:
+        raise ValueError("The chunks changed between the two passes.")
+
+    if quantization_bits is not None:
+        for key in ["x", "y", "z"]:
+            _, offset, step = Faerun.quantize(
+                [], quantization_bits, quantization_bounds[key]
+            )
+            layer["meta"]["quantization"]["offset"].append(offset)
+            layer["meta"]["quantization"]["step"].append(step)
+
+    for key in ["x", "y", "z", "s"]:
+        if key in columns:
+            columns[key][1].flush()
+            layer[key] = ArrayRef(columns[key][0])
+
+    if keep_values:
+        layer["values"] = []
+        for s in range(n_series):
+            columns[(s, "values")][1].flush()
+            layer["values"].append(ArrayRef(columns[(s, "values")][0]))
+
+    layer["colors"] = [{} for _ in range(n_series)]
+    for s in range(n_series):
+        for channel in channels[s]:
+            columns[(s, channel)][1].flush()
+            layer["colors"][s][channel] = ArrayRef(columns[(s, channel)][0])
+
+        if palettes[s] is not None:
+            file_name = prefix + ".colors." + str(s) + ".palette.npy"
+            np.save(os.path.join(path, file_name), palettes[s])
+            layer["colors"][s]["palette"] = ArrayRef(file_name)
+
+    if has_labels:
+        labels_file.close()
+        labels_offsets.flush()
+        layer["labels"] = LabelsRef(labels_name)
+
+    meta[name] = layer
+    write_meta(meta, path)
+
+
+def _parquet_chunks(path: str, mapping: Dict) -> Callable[[], Iterable[Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow.")
+
+    columns = []
+    for value in mapping.values():
+        columns.extend(value if isinstance(value, list) else [value])
+
+    schema_names = pq.read_schema(path).names
+    columns = [c for c in dict.fromkeys(columns) if c in schema_names]
+
+    def get_chunks():
+        parquet_file = pq.ParquetFile(path)
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i, columns=columns)
+
+    return get_chunks
+
+
+def _has(chunk: Any, key: Any) -> bool:
+    if isinstance(key, list):
+        return len(key) > 0 and all(_has(chunk, k) for k in key)
+
+    if isinstance(chunk, np.ndarray):
+        return chunk.dtype.names is not None and key in chunk.dtype.names
+
+    if hasattr(chunk, "schema"):
+        return key in chunk.schema.names
+
+    return key in chunk
+
+
+def _column(chunk: Any, key: str) -> np.ndarray:
+    if hasattr(chunk, "schema"):
+        return np.asarray(chunk.column(key))
+
+    return np.asarray(chunk[key])
+
+
+def _columns(chunk: Any, key: Union[str, List[str]]) -> List[np.ndarray]:
+    # Multiple series are either stored in a list of columns or in one
+    # column containing a 2D array of shape (n_series, n). The columns are
+    # not stacked to keep integer (categorical) values intact.
+    if isinstance(key, list):
+        return [_column(chunk, k) for k in key]
+
+    return list(np.atleast_2d(_column(chunk, key)))
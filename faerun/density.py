@@ -0,0 +1,315 @@
+"""
+density.py
+====================================
+A module for aggregating the points of very large scatter layers into multi-resolution
+density grids, which are served as tiles instead of the individual points.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from faerun.faerun import Faerun
+
+
+def create_density(
+    data: Dict,
+    name: str,
+    tile_size: int = 256,
+    levels: int = 5,
+    series: int = 0,
+    point_threshold: int = 1000000,
+) -> Dict:
+    """Creates a density layer from a scatter layer. The points are binned into square
+    grids, the finest of which has tile_size * 2^(levels - 1) bins per side, and each
+    coarser level halves the resolution. Each level is split into tiles of tile_size
+    by tile_size bins, of which only the non-empty bins are stored. Every bin holds the
+    number of points and, depending on the series, the dominant category (series
+    exported as palette indices), the mean of the raw values (data created with
+    keep_values) or the mean color of its points.
+
+    Arguments:
+        data (:obj:`Dict`): Faerun data, as returned by :obj:`faerun.Faerun.create_python_data` or :obj:`faerun.load_data`
+        name (:obj:`str`): The name of the scatter layer
+
+    Keyword Arguments:
+        tile_size (:obj:`int`, optional): The number of bins per side of a tile (at most 256)
+        levels (:obj:`int`, optional): The number of resolution levels
+        series (:obj:`int`, optional): The series used to color the bins
+        point_threshold (:obj:`int`, optional): The maximum number of points, below which the individual points of the visible tiles are loaded instead of their bins
+
+    Returns:
+        :obj:`Dict`: The density layer, which can be added to the data
+    """
+    layer = data[name]
+
+    if layer["type"] != "scatter":
+        raise ValueError("Density layers can only be created from scatter layers.")
+
+    if tile_size < 1 or tile_size > 256:
+        raise ValueError("The tile size has to be between 1 and 256.")
+
+    if levels < 1:
+        raise ValueError("A density layer needs at least one level.")
+
+    x, y, z = dequantize(layer)
+    n = len(x)
+    size = tile_size << (levels - 1)
+
+    # The grid is square, so that bins are square as well
+    x0 = float(x.min()) if n > 0 else 0.0
+    y0 = float(y.min()) if n > 0 else 0.0
+    extent = max(float(x.max()) - x0, float(y.max()) - y0) if n > 0 else 0.0
+    extent = extent if extent > 0 else 1.0
+
+    bx = np.minimum(((x - x0) * (size / extent)).astype(np.int64), size - 1)
+    by = np.minimum(((y - y0) * (size / extent)).astype(np.int64), size - 1)
+    keys = bin_keys(bx, by, tile_size, levels - 1)
+    point_tiles = keys // (tile_size * tile_size)
+    del bx, by
+
+    mode, channels, meta = _series(layer, series)
+
+    # Sorting the points by their bins (and categories) groups them by tile as well
+    categories = 1
+    if mode == "category":
+        categories = len(meta["palette"])
+        keys = keys * categories + np.asarray(channels[0], dtype=np.int64)
+        channels = []
+
+    order = np.argsort(keys)
+    keys = keys[order]
+
+    # The points are grouped by tile as well, so that the points of a tile can be
+    # loaded once they are few enough to be drawn
+    point_offsets = np.searchsorted(
+        point_tiles[order], np.arange(4 ** (levels - 1) + 1)
+    )
+    del point_tiles
+
+    starts = _group_starts(keys)
+    counts = np.diff(np.r_[starts, n]).astype(np.float64)
+    keys = keys[starts]
+    sums = [
+        _reduce(np.asarray(channel, dtype=np.float64)[order], starts)
+        for channel in channels
+    ]
+
+    tiles = []
+    max_counts = []
+
+    for level in reversed(range(levels)):
+        if level < levels - 1:
+            keys, counts, sums = _coarsen(
+                keys, counts, sums, tile_size, level, categories
+            )
+
+        tile = _tile(keys, counts, sums, tile_size, level, mode, categories)
+        tiles.append(tile)
+        max_counts.append(int(tile["counts"].max()) if len(tile["counts"]) else 0)
+
+    tiles.reverse()
+    max_counts.reverse()
+
+    meta.update(
+        {
+            "source": name,
+            "series": series,
+            "mode": mode,
+            "tile_size": tile_size,
+            "levels": levels,
+            "bounds": [x0, y0, extent],
+            "z": float(z.min()) if n > 0 else 0.0,
+            "max_counts": max_counts,
+            "tile_points": np.diff(point_offsets).tolist(),
+            "point_threshold": point_threshold,
+        }
+    )
+
+    return {
+        "type": "density",
+        "meta": meta,
+        "tiles": tiles,
+        "points": {
+            "offsets": point_offsets.astype(np.int64),
+            "positions": order.astype(np.uint32 if n < 2**32 else np.uint64),
+        },
+    }
+
+
+def bin_keys(bx: np.ndarray, by: np.ndarray, tile_size: int, level: int) -> np.ndarray:
+    """Computes the keys of bins, which sort the bins by tile (row by row) and, within
+    a tile, row by row.
+
+    Arguments:
+        bx (:obj:`np.ndarray`): The column of each bin
+        by (:obj:`np.ndarray`): The row of each bin
+        tile_size (:obj:`int`): The number of bins per side of a tile
+        level (:obj:`int`): The level, which has 2^level tiles per side
+
+    Returns:
+        :obj:`np.ndarray`: The keys, the tile index times tile_size^2 plus the index of the bin in its tile
+    """
+    tiles = 1 << level
+    tile = (by // tile_size) * tiles + bx // tile_size
+    local = (by % tile_size) * tile_size + bx % tile_size
+
+    return tile * (tile_size * tile_size) + local
+
+
+def dequantize(
+    layer: Dict, positions: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Gets the (dequantized) x, y and z coordinates of the points of a layer.
+
+    Arguments:
+        layer (:obj:`Dict`): The layer
+
+    Keyword Arguments:
+        positions (:obj:`np.ndarray`, optional): The positions of the points to get. Defaults to all points
+
+    Returns:
+        :obj:`Tuple[np.ndarray, np.ndarray, np.ndarray]`: The x, y and z coordinates as float32
+    """
+    quantization = layer["meta"].get("quantization")
+    coords = []
+
+    for i, coord in enumerate("xyz"):
+        values = layer[coord] if positions is None else layer[coord][positions]
+
+        if quantization is None:
+            coords.append(np.asarray(values, dtype=np.float32))
+        else:
+            coords.append(
+                (
+                    quantization["offset"][i]
+                    + quantization["step"][i] * np.asarray(values, dtype=np.float64)
+                ).astype(np.float32)
+            )
+
+    return coords[0], coords[1], coords[2]
+
+
+def _series(layer: Dict, series: int) -> Tuple[str, List[np.ndarray], Dict]:
+    colors = layer["colors"][series]
+    meta = layer["meta"]
+
+    if "index" in colors and meta["categorical"][series]:
+        palette = np.asarray(colors["palette"])
+        return "category", [colors["index"]], {"palette": palette.tolist()}
+
+    if "values" in layer and not meta["categorical"][series]:
+        values = np.asarray(layer["values"][series], dtype=np.float64)
+        cmap = Faerun.get_cmap(meta["colormap"][series])
+        palette = Faerun.map_colors(cmap, np.linspace(0.0, 1.0, 256)).astype(np.uint8)
+        value_range = (
+            [float(np.nanmin(values)), float(np.nanmax(values))] if len(values) else []
+        )
+
+        return "mean", [values], {"palette": palette.tolist(), "range": value_range}
+
+    if "index" in colors:
+        palette = np.asarray(colors["palette"])
+        rgb = [palette[np.asarray(colors["index"]), channel] for channel in range(3)]
+    else:
+        rgb = [colors[channel] for channel in "rgb"]
+
+    return "rgb", rgb, {}
+
+
+def _coarsen(
+    keys: np.ndarray,
+    counts: np.ndarray,
+    sums: List[np.ndarray],
+    tile_size: int,
+    level: int,
+    categories: int,
+) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    # The bins of a level are computed from the bins of the next finer level, which
+    # are a lot fewer than the points
+    codes = keys % categories
+    keys = keys // categories
+
+    area = tile_size * tile_size
+    tiles = 2 << level
+    tile = keys // area
+    local = keys % area
+    bx = (tile % tiles) * tile_size + local % tile_size
+    by = (tile // tiles) * tile_size + local // tile_size
+    keys = bin_keys(bx // 2, by // 2, tile_size, level) * categories + codes
+
+    # Small grids are summed up densely, which avoids sorting the keys
+    space = 4**level * area * categories
+    if space <= 4 * len(keys):
+        dense = np.bincount(keys, weights=counts, minlength=space)
+        nonempty = np.flatnonzero(dense)
+        sums = [np.bincount(keys, weights=s, minlength=space)[nonempty] for s in sums]
+        keys = nonempty
+        counts = dense[nonempty]
+    else:
+        keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(keys))
+        sums = [np.bincount(inverse, weights=s, minlength=len(keys)) for s in sums]
+
+    return keys, counts, sums
+
+
+def _tile(
+    keys: np.ndarray,
+    counts: np.ndarray,
+    sums: List[np.ndarray],
+    tile_size: int,
+    level: int,
+    mode: str,
+    categories: int,
+) -> Dict:
+    area = tile_size * tile_size
+    tile = {}
+
+    if mode == "category":
+        bins = keys // categories
+        codes = keys % categories
+
+        # The keys are sorted, so the categories of a bin are next to each other and
+        # the dominant one is the first with the highest count
+        starts = _group_starts(bins)
+        lengths = np.diff(np.r_[starts, len(bins)])
+        groups = np.repeat(np.arange(len(starts)), lengths)
+        dominant = np.flatnonzero(
+            counts == np.repeat(_reduce(counts, starts, np.maximum), lengths)
+        )
+        dominant = dominant[_group_starts(groups[dominant])]
+
+        dtype = np.uint8 if categories <= 256 else np.uint16
+        tile["index"] = codes[dominant].astype(dtype)
+        counts = _reduce(counts, starts)
+        keys = bins[starts]
+    elif mode == "mean":
+        tile["values"] = (sums[0] / np.maximum(counts, 1)).astype(np.float32)
+    else:
+        for channel, s in zip("rgb", sums):
+            tile[channel] = np.round(s / np.maximum(counts, 1)).astype(np.uint8)
+
+    tile["offsets"] = np.searchsorted(keys, np.arange(4**level + 1) * area)
+    tile["bins"] = (keys % area).astype(np.uint16)
+    tile["counts"] = counts.astype(np.uint32)
+
+    return tile
+
+
+def _group_starts(values: np.ndarray) -> np.ndarray:
+    # The first index of each run of equal values
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+
+
+def _reduce(
+    values: np.ndarray, starts: np.ndarray, ufunc: np.ufunc = np.add
+) -> np.ndarray:
+    # The sums (or e.g. maxima) of the runs starting at starts
+    if len(starts) == 0:
+        return np.zeros(0, dtype=values.dtype)
+
+    return ufunc.reduceat(values, starts)
@@ -0,0 +1,204 @@
+"""
+export.py
+====================================
+A module for exporting the labels and properties of data points as CSV, NDJSON or
+Parquet, written in chunks so that large selections can be streamed with bounded memory.
+"""
+
+import csv
+import io
+from typing import Callable, Iterator, List, Union
+
+import numpy as np
+import ujson
+
+from faerun.store import LabelStore
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_rows(
+    indices: np.ndarray,
+    labels: Union[LabelStore, List[str]],
+    values: List[np.ndarray] = None,
+    series_titles: List[str] = None,
+    positions: np.ndarray = None,
+    file_format: str = "csv",
+    label_formatter: Callable[[str, int], str] = None,
+    chunk_size: int = 65536,
+    formatted: bool = False,
+) -> Iterator[bytes]:
+    """Exports the labels and raw values of data points. Without a label formatter,
+    labels are split on '__' into a label (the first field) and an id (the second field)
+    column, unless they are already formatted. Requesting Parquet without pyarrow
+    raises an ImportError right away, before any chunk is written.
+
+    Arguments:
+        indices (:obj:`np.ndarray`): The original indices of the data points to export
+        labels (:obj:`LabelStore` or :obj:`List[str]`): The labels of the layer
+
+    Keyword Arguments:
+        values (:obj:`List[np.ndarray]`, optional): The raw values of each series of the layer
+        series_titles (:obj:`List[str]`, optional): The titles of the series, used as column names
+        positions (:obj:`np.ndarray`, optional): The positions of the data points in the (spatially ordered) data by original index
+        file_format (:obj:`str`, optional): The format, 'csv', 'ndjson' or 'parquet' (requires pyarrow)
+        label_formatter (:obj:`Callable[[str, int], str]`, optional): A function formatting a label given the label and the index of the data point
+        chunk_size (:obj:`int`, optional): The number of data points written at once
+        formatted (:obj:`bool`, optional): Whether the labels are already formatted (see :obj:`faerun.format_labels`), in which case they are exported as they are in a single label column
+
+    Returns:
+        :obj:`Iterator[bytes]`: The chunks of the exported file
+    """
+    if file_format not in CONTENT_TYPES:
+        raise ValueError("Unknown format: " + str(file_format))
+
+    if values is None:
+        values = []
+
+    if series_titles is None:
+        series_titles = [None] * len(values)
+
+    single = label_formatter is not None or formatted
+    columns = ["index", "label"] if single else ["index", "label", "id"]
+    columns += [
+        "series_" + str(s) if title is None else str(title)
+        for s, title in enumerate(series_titles)
+    ]
+
+    chunks = _chunks(
+        indices,
+        labels,
+        values,
+        positions,
+        label_formatter,
+        formatted,
+        max(1, chunk_size),
+    )
+
+    if file_format == "csv":
+        return _csv(columns, chunks)
+
+    if file_format == "ndjson":
+        return _ndjson(columns, chunks)
+
+    # The writer is a generator, so a missing pyarrow is checked for beforehand
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Writing Parquet files requires pyarrow.")
+
+    return _parquet(columns, chunks)
+
+
+def _chunks(
+    indices: np.ndarray,
+    labels: Union[LabelStore, List[str]],
+    values: List[np.ndarray],
+    positions: np.ndarray,
+    label_formatter: Callable[[str, int], str],
+    formatted: bool,
+    chunk_size: int,
+) -> Iterator[List[Union[list, np.ndarray]]]:
+    for start in range(0, max(len(indices), 1), chunk_size):
+        chunk = np.asarray(indices[start : start + chunk_size], dtype=np.int64)
+        chunk_positions = chunk if positions is None else positions[chunk]
+
+        if isinstance(labels, LabelStore):
+            chunk_labels = labels.take(chunk_positions)
+        else:
+            chunk_labels = [str(labels[p]) for p in chunk_positions]
+
+        if formatted:
+            label_columns = [chunk_labels]
+        elif label_formatter:
+            label_columns = [list(map(label_formatter, chunk_labels, chunk.tolist()))]
+        else:
+            parts = [label.split("__") for label in chunk_labels]
+            label_columns = [
+                [p[0] for p in parts],
+                [p[1] if len(p) > 1 else "" for p in parts],
+            ]
+
+        yield [chunk] + label_columns + [
+            np.asarray(column[chunk_positions]) for column in values
+        ]
+
+
+def _csv(
+    columns: List[str], chunks: Iterator[List[Union[list, np.ndarray]]]
+) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+
+    for chunk in chunks:
+        writer.writerows(zip(*_lists(chunk)))
+        yield output.getvalue().encode("utf8")
+        output.seek(0)
+        output.truncate()
+
+
+def _ndjson(
+    columns: List[str], chunks: Iterator[List[Union[list, np.ndarray]]]
+) -> Iterator[bytes]:
+    for chunk in chunks:
+        rows = [
+            ujson.dumps(dict(zip(columns, row))) + "\n" for row in zip(*_lists(chunk))
+        ]
+        yield "".join(rows).encode("utf8")
+
+
+def _parquet(
+    columns: List[str], chunks: Iterator[List[Union[list, np.ndarray]]]
+) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Sink()
+    writer = None
+
+    # Each chunk is written as a row group, which is sent as soon as it is complete
+    for chunk in chunks:
+        table = pa.Table.from_arrays([pa.array(column) for column in chunk], columns)
+
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+
+        writer.write_table(table.cast(writer.schema))
+        yield sink.pop()
+
+    writer.close()
+    yield sink.pop()
+
+
+def _lists(chunk: List[Union[list, np.ndarray]]) -> List[list]:
+    return [c.tolist() if isinstance(c, np.ndarray) else c for c in chunk]
+
+
+class _Sink(io.RawIOBase):
+    # A write-only file that hands out the written bytes, while keeping track of the
+    # position in the whole file
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b))
+        self.position += len(self.chunks[-1])
+        return len(self.chunks[-1])
+
+    def tell(self) -> int:
+        return self.position
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
@@ -4,23 +4,97 @@ faerun.py
 The main module containing the Faerun class.
 """
 
+import base64
+import json
 import math
 import os
 import copy
-from typing import Union, Dict, Any, List, Tuple
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Union, Dict, Any, Callable, Iterator, List, Tuple
 from collections.abc import Iterable
 
-import colour
-import jinja2
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
 from matplotlib.colors import Colormap
-from pandas import DataFrame
 
-try:
-    from IPython.display import display, IFrame, FileLink
-except Exception:
-    pass
+from faerun.cache import ExportCache, MemoryCache, hash_values
+from faerun.instrumentation import NULL_STAGE, ExportProfiler, StageRecord
+
+# jinja2, pandas, pyplot and IPython are slow to import and only needed on some code
+# paths, so they are imported where they are used
+if TYPE_CHECKING:
+    import jinja2
+    from pandas import DataFrame
+
+
+@lru_cache(maxsize=None)
+def _template_environment(path: str) -> "jinja2.Environment":
+    import jinja2
+
+    # The environment caches the compiled templates (and recompiles them when changed)
+    return jinja2.Environment(loader=jinja2.FileSystemLoader(path))
+
+
+# Prepended to the exported data when it contains binary (base64) arrays,
+# quantized coordinates or palette-encoded colors
+DATA_DECODER = """function faerunDecode(base64, type) {
+  const binary = atob(base64);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+  return new type(bytes.buffer);
+}
+
+function faerunDequantize(data) {
+  Object.values(data).forEach(layer => {
+    if (!layer.quantization) return;
+    ["x", "y", "z"].forEach((coord, i) => {
+      const values = layer[coord];
+      const offset = layer.quantization.offset[i];
+      const step = layer.quantization.step[i];
+      layer[coord] = new Float32Array(values.length);
+      for (let j = 0; j < values.length; j++)
+        layer[coord][j] = offset + step * values[j];
+    });
+  });
+}
+
+function faerunExpandPalette(colors) {
+  const n = colors.index.length;
+  colors.r = new Uint8Array(n);
+  colors.g = new Uint8Array(n);
+  colors.b = new Uint8Array(n);
+  for (let i = 0; i < n; i++) {
+    const j = 3 * colors.index[i];
+    colors.r[i] = colors.palette[j];
+    colors.g[i] = colors.palette[j + 1];
+    colors.b[i] = colors.palette[j + 2];
+  }
+}
+
+function faerunExpandPalettes(data) {
+  Object.values(data).forEach(layer => {
+    (layer.colors || []).forEach(colors => {
+      if (colors.palette) faerunExpandPalette(colors);
+    });
+  });
+}
+
+// Replaces the colors of the bins of a lookup table (the color of missing values
+// is kept) with a list of [r, g, b] colors, resampled to the number of bins
+function faerunSetLut(colors, lut) {
+  const palette = new Uint8Array(colors.palette);
+  for (let i = 0; i < colors.bins; i++) {
+    const color = lut[Math.min(lut.length - 1, Math.floor((i + 0.5) * lut.length / colors.bins))];
+    palette[3 * i] = color[0];
+    palette[3 * i + 1] = color[1];
+    palette[3 * i + 2] = color[2];
+  }
+  colors.palette = palette;
+  faerunExpandPalette(colors);
+}
+
+"""
 
 
 class Faerun(object):
@@ -53,6 +127,11 @@ class Faerun(object):
         impress: str = None,
         thumbnail_width: int = 250,
         thumbnail_fixed: bool = False,
+        color_encoding: str = "rgb",
+        quantization_bits: int = None,
+        cache: Union[str, ExportCache] = None,
+        spatial_order: bool = False,
+        keep_values: bool = False,
     ):
         """Constructor for Faerun.
 
@@ -81,7 +160,18 @@ class Faerun(object):
             impress (:obj:`str`, optional): A short message that is shown on the HTML page
             thumbnail_width (:obj:`int`, optional): The width of the thumbnail images. Defaults to 250.
             thumbnail_fixed (:obj:`bool`, optional): Whather to show the thumbnail on the top instead as next to the mouse Mainly used for reactions. Defaults to False.
+            color_encoding (:obj:`str`, optional): How colors are exported ('rgb', 'palette' or 'lut'). With 'palette', categorical series are exported as indices into a small palette, which are expanded when the data is loaded. With 'lut', continuous series are additionally exported as uint8 indices into a lookup table of 256 colors sampled from the colormap, which can be replaced in the browser to change the colormap without exporting the data again. Series with per-point saturation are always exported as rgb. Defaults to 'rgb'.
+            quantization_bits (:obj:`int`, optional): If set, the coordinates are exported as unsigned integers with this bit depth (1 to 16) over the bounding box of each layer, and dequantized when the data is loaded. 16 bits are visually lossless at the default scale. Defaults to None.
+            cache (:obj:`str` or :obj:`ExportCache`, optional): An export cache (or the path of its directory). If set, the exported data of each layer is cached, so that plotting again only recomputes the layers whose data or export options changed. Defaults to None.
+            spatial_order (:obj:`bool`, optional): Whether to export the points of each scatter layer sorted along a Morton (Z-order) curve over their coordinates instead of in input order, which improves compression and locality. The hosted data contains the permutation, so that the web server still accepts and returns the original indices. Defaults to False.
+            keep_values (:obj:`bool`, optional): Whether the data created by :obj:`Faerun.create_python_data` retains the raw values of each series (as "values"), so that the hosted data can be filtered and aggregated by the web server. Defaults to False.
         """
+        if color_encoding not in ["rgb", "palette", "lut"]:
+            raise ValueError('color_encoding has to be "rgb", "palette" or "lut".')
+
+        if quantization_bits is not None and not 1 <= quantization_bits <= 16:
+            raise ValueError("quantization_bits has to be between 1 and 16.")
+
         self.title = title
         self.clear_color = clear_color
         self.coords = coords
@@ -106,11 +196,19 @@ class Faerun(object):
         self.impress = impress
         self.thumbnail_width = thumbnail_width
         self.thumbnail_fixed = thumbnail_fixed
+        self.color_encoding = color_encoding
+        self.quantization_bits = quantization_bits
+        self.profiler = None
+        self.cache = ExportCache(cache) if isinstance(cache, str) else cache
+        self.spatial_order = spatial_order
+        self.keep_values = keep_values
+        self.orders = {}
 
         self.trees = {}
         self.trees_data = {}
         self.scatters = {}
         self.scatters_data = {}
+        self.scatters_values = {}
 
         # Defining the default style (css values)
         default_style = {
@@ -181,7 +279,7 @@ class Faerun(object):
     def add_tree(
         self,
         name: str,
-        data: Union[dict, DataFrame],
+        data: Union[dict, "DataFrame", str],
         mapping: dict = {
             "from": "from",
             "to": "to",
@@ -199,7 +297,7 @@ class Faerun(object):
 
         Arguments:
             name (:obj:`str`): The name of the layer
-            data (:obj:`dict` or :obj:`DataFrame`): A Python dict or Pandas DataFrame containing the data
+            data (:obj:`dict`, :obj:`DataFrame`, :obj:`str` or :obj:`pyarrow.Table`): A Python dict, Pandas DataFrame, path to a Parquet file or Arrow table containing the data
 
         Keyword Arguments:
             mapping (:obj:`dict`, optional): The keys which contain the data in the input dict or DataFrame
@@ -208,8 +306,11 @@ class Faerun(object):
             fog_intensity (:obj:`float`, optional): The intensity of the distance fog
             point_helper (:obj:`str`, optional): The name of the scatter layer to associate with this tree layer (the source of the coordinates)
         """
+        with self.stage("read", name):
+            data, mapping = Faerun.read_columns(data, mapping)
+
         if point_helper is None and mapping["z"] not in data:
-            data[mapping["z"]] = [0] * len(data[mapping["x"]])
+            data[mapping["z"]] = np.zeros(len(data[mapping["x"]]))
 
         self.trees[name] = {
             "name": name,
@@ -224,7 +325,7 @@ class Faerun(object):
     def add_scatter(
         self,
         name: str,
-        data: Union[Dict, DataFrame],
+        data: Union[Dict, "DataFrame", str],
         mapping: Dict = {
             "x": "x",
             "y": "y",
@@ -259,10 +360,10 @@ class Faerun(object):
 
         Arguments:
             name (:obj:`str`): The name of the layer
-            data (:obj:`dict` or :obj:`DataFrame`): A Python dict or Pandas DataFrame containing the data
+            data (:obj:`dict`, :obj:`DataFrame`, :obj:`str` or :obj:`pyarrow.Table`): A Python dict, Pandas DataFrame, path to a Parquet file or Arrow table containing the data. Only the columns in :obj:`mapping` are read
 
         Keyword Arguments:
-            mapping (:obj:`dict`, optional): The keys which contain the data in the input dict or the column names in the pandas :obj:`DataFrame`
+            mapping (:obj:`dict`, optional): The keys which contain the data in the input dict or the column names in the pandas :obj:`DataFrame`, Parquet file or Arrow table. The value for "c" can be a list of column names when visualizing multiple series
             colormap (:obj:`str`, :obj:`Colormap`, :obj:`List[str]`, or :obj:`List[Colormap]` optional): The name of the colormap (can also be a matplotlib Colormap object). A list when visualizing multiple series
             shader (:obj:`str`, optional): The name of the shader to use for the data point visualization
             point_scale (:obj:`float`, optional): The relative size of the data points
@@ -283,11 +384,11 @@ class Faerun(object):
             title_index: (:obj:`int` or :obj:`List[int]`, optional): The index of the label value to use as the selected title (when __ is used to specify multiple values). A list when visualizing multiple series
         """
 
-        if mapping["z"] not in data:
-            data[mapping["z"]] = [0] * len(data[mapping["x"]])
+        with self.stage("read", name):
+            data, mapping = Faerun.read_columns(data, mapping)
 
-        if "pandas" in type(data).__module__:
-            data = data.to_dict("list")
+        if mapping["z"] not in data:
+            data[mapping["z"]] = np.zeros(len(data[mapping["x"]]))
 
         data_c = data[mapping["c"]]
         data_cs = data[mapping["c"]] if mapping["cs"] in data else None
@@ -301,9 +402,16 @@ class Faerun(object):
         n_series = 1
         if isinstance(data_c[0], Iterable):
             n_series = len(data_c)
+            data_c = list(data_c)
         else:
             data_c = [data_c]
 
+        # The values are normalized below, so the raw values are kept beforehand
+        if self.keep_values:
+            self.scatters_values[name] = [np.asarray(values) for values in data_c]
+        else:
+            self.scatters_values.pop(name, None)
+
         if data_cs is not None and not isinstance(data_cs[0], Iterable):
             data_cs = [data_cs]
 
@@ -356,8 +464,8 @@ class Faerun(object):
         max_c = [None] * n_series
 
         for s in range(n_series):
-            min_c[s] = float(min(data_c[s]))
-            max_c[s] = float(max(data_c[s]))
+            min_c[s] = float(np.min(data_c[s]))
+            max_c[s] = float(np.max(data_c[s]))
             len_c = len(data_c[s])
 
             if min_legend_label[s] is None:
@@ -379,7 +487,9 @@ class Faerun(object):
                     if legend_labels[s]:
                         legend_values = legend_labels[s]
                     else:
-                        legend_values = [(i, str(i)) for i in sorted(set(data_c[s]))]
+                        legend_values = [
+                            (i, str(i)) for i in np.unique(data_c[s]).tolist()
+                        ]
                 else:
                     if legend_labels[s]:
                         legend_labels[s].reverse()
@@ -394,30 +504,39 @@ class Faerun(object):
                                 [val, str(data_c[s][int(math.floor(len_c / 100 * i))])]
                             )
 
-                cmap = None
-                if isinstance(colormap[s], str):
-                    cmap = plt.cm.get_cmap(colormap[s])
-                else:
-                    cmap = colormap[s]
+                cmap = Faerun.get_cmap(colormap[s])
 
+                # Continuous legends keep the positions of their colors, so that
+                # they can be recolored along with a lookup table
                 for value, label in legend_values:
-                    legend[s].append([list(cmap(value)), label])
-
-            # Normalize the data to later get the correct colour maps
-            if not categorical[s]:
-                data_c[s] = np.array(data_c[s])
-                data_c[s] = (data_c[s] - min_c[s]) / (max_c[s] - min_c[s])
-
-            if mapping["cs"] in data and len(data_cs) > s:
-                data_cs[s] = np.array(data_cs[s])
-                min_cs = min(data_cs[s])
-                max_cs = max(data_cs[s])
-                # Avoid zero saturation by limiting the lower bound to 0.1
-
-                data_cs[s] = 1.0 - np.maximum(
-                    saturation_limit[s],
-                    np.array((data_cs[s] - min_cs) / (max_cs - min_cs)),
-                )
+                    if categorical[s]:
+                        legend[s].append([list(cmap(value)), label])
+                    else:
+                        legend[s].append([list(cmap(value)), label, float(value)])
+
+            with self.stage("normalize", name, len_c):
+                # Normalize the data to later get the correct colour maps, while
+                # categorical integer values are stored as compact codes
+                if categorical[s]:
+                    data_c[s] = np.asarray(data_c[s])
+                    if data_c[s].dtype.kind in "iu" and min_c[s] >= 0:
+                        data_c[s] = data_c[s].astype(
+                            Faerun.index_dtype(int(max_c[s]) + 1), copy=False
+                        )
+                else:
+                    data_c[s] = np.array(data_c[s])
+                    data_c[s] = (data_c[s] - min_c[s]) / (max_c[s] - min_c[s])
+
+                if mapping["cs"] in data and len(data_cs) > s:
+                    data_cs[s] = np.array(data_cs[s])
+                    min_cs = np.min(data_cs[s])
+                    max_cs = np.max(data_cs[s])
+                    # Avoid zero saturation by limiting the lower bound to 0.1
+
+                    data_cs[s] = 1.0 - np.maximum(
+                        saturation_limit[s],
+                        np.array((data_cs[s] - min_cs) / (max_cs - min_cs)),
+                    )
 
             # Format numbers if parameters are indeed numbers
             if isinstance(min_legend_label[s], (int, float)):
@@ -463,6 +582,7 @@ class Faerun(object):
         }
 
         self.scatters_data[name] = data
+        self.orders.pop(name, None)
 
     def plot(
         self,
@@ -470,6 +590,7 @@ class Faerun(object):
         path: str = "./",
         template: str = "default",
         notebook_height: int = 500,
+        preview: bool = False,
     ):
         """Plots the data to an HTML / JS file.
 
@@ -478,19 +599,76 @@ class Faerun(object):
             path (:obj:`str`, optional): The path to which to write the HTML / JS file
             template (:obj:`str`, optional): The name or path of the template to use
             notebook_height: (:obj`int`, optional): The height of the plot when displayed in a jupyter notebook
+            preview (:obj:`bool`, optional): Whether to render a PNG preview of the plot, which is shown while the data is loading and used as the image of shared links
         """
         self.notebook_height = notebook_height
 
-        script_path = os.path.dirname(os.path.abspath(__file__))
-        if template in ["default", "reaction_smiles", "smiles", "url_image"]:
-            template = "template_" + template + ".j2"
-        else:
-            script_path = os.path.dirname(template)
-
         html_path = os.path.join(path, file_name + ".html")
         js_path = os.path.join(path, file_name + ".js")
-        jenv = jinja2.Environment(loader=jinja2.FileSystemLoader(script_path))
+        model = self.create_model(file_name + ".js")
+
+        # The preview is rendered from the arrays computed while exporting the data
+        preview_data = {} if preview else None
+        data = self.create_data(preview=preview_data)
+
+        if preview:
+            # Imported here, as the rasterizer depends on this module
+            from faerun.preview import encode_png, render_preview
+
+            with self.stage("preview", items=1) as record:
+                png = encode_png(
+                    render_preview(preview_data, background=self.clear_color)
+                )
+
+                with open(os.path.join(path, file_name + ".png"), "wb") as f:
+                    f.write(png)
+
+                record.bytes = len(png)
+
+            model["preview"] = file_name + ".png"
+
+        if Faerun.in_notebook():
+            model["data"] = data
+        else:
+            with self.stage("write", items=1) as record:
+                # With a cache, the data usually stays the same when re-plotting
+                if self.cache is None or not Faerun.file_equals(js_path, data):
+                    with open(js_path, "w") as f:
+                        f.write(data)
+
+                    record.bytes = len(data)
+
+        with self.stage("template") as record:
+            output_text = Faerun.load_template(template).render(model)
+            record.bytes = len(output_text)
+
+        with self.stage("write", items=1) as record:
+            with open(html_path, "w") as result_file:
+                result_file.write(output_text)
+
+            record.bytes = len(output_text)
+
+        if Faerun.in_notebook():
+            from IPython.display import display, IFrame, FileLink
+
+            display(IFrame(html_path, width="100%", height=self.notebook_height))
+            display(FileLink(html_path))
+
+    def create_model(
+        self, data_file_name: str, part_file_names: List[str] = None
+    ) -> Dict[str, Any]:
+        """Creates the model passed to the template, which contains the options of the
+        plot and its layers, but not the data.
+
+        Arguments:
+            data_file_name (:obj:`str`): The name of the JavaScript file containing the data, relative to the HTML file
+
+        Keyword Arguments:
+            part_file_names (:obj:`List[str]`, optional): The names of the JavaScript files containing parts of the data, which are loaded before the data file (see :obj:`faerun.plot_batch`)
 
+        Returns:
+            :obj:`Dict[str, Any]`: The model
+        """
         has_legend = False
 
         for _, value in self.scatters.items():
@@ -514,7 +692,8 @@ class Faerun(object):
 
         model = {
             "title": self.title,
-            "file_name": file_name + ".js",
+            "file_name": data_file_name,
+            "part_files": part_file_names or [],
             "clear_color": self.clear_color,
             "view": self.view,
             "coords": str(self.coords).lower(),
@@ -539,22 +718,71 @@ class Faerun(object):
             "in_notebook": Faerun.in_notebook(),
             "thumbnail_width": self.thumbnail_width,
             "thumbnail_fixed": str(self.thumbnail_fixed).lower(),
+            "preview": None,
         }
 
-        if Faerun.in_notebook():
-            model["data"] = self.create_data()
+        return model
+
+    @staticmethod
+    def load_template(template: str) -> "jinja2.Template":
+        """Loads and compiles a template. Compiled templates are cached, so that plotting
+        repeatedly does not parse the template again (unless it changed).
+
+        Arguments:
+            template (:obj:`str`): The name or path of the template
+
+        Returns:
+            :obj:`jinja2.Template`: The compiled template
+        """
+        script_path = os.path.dirname(os.path.abspath(__file__))
+        if template in ["default", "reaction_smiles", "smiles", "url_image"]:
+            template = "template_" + template + ".j2"
         else:
-            with open(js_path, "w") as f:
-                f.write(self.create_data())
+            script_path = os.path.dirname(template)
+            template = os.path.basename(template)
 
-        output_text = jenv.get_template(template).render(model)
+        return _template_environment(script_path).get_template(template)
 
-        with open(html_path, "w") as result_file:
-            result_file.write(output_text)
+    def stage(self, stage: str, layer: str = None, items: int = None) -> Any:
+        """Creates a context manager measuring a stage of an export with the profiler
+        of this Faerun instance. Does nothing if no profiler is set.
 
-        if Faerun.in_notebook():
-            display(IFrame(html_path, width="100%", height=self.notebook_height))
-            display(FileLink(html_path))
+        Arguments:
+            stage (:obj:`str`): The name of the stage
+
+        Keyword Arguments:
+            layer (:obj:`str`, optional): The name of the layer processed in this stage
+            items (:obj:`int`, optional): The number of items processed in this stage
+
+        Returns:
+            :obj:`Any`: A context manager returning the :obj:`StageRecord` of the stage
+        """
+        if self.profiler is None:
+            return NULL_STAGE
+
+        return self.profiler.stage(stage, layer, items)
+
+    @contextmanager
+    def instrument(
+        self, callback: Callable[[StageRecord], None] = None, memory: bool = False
+    ) -> Iterator[ExportProfiler]:
+        """Measures the stages (bounds, coordinates, labels, sizes, colors, template and
+        write) of the exports run within the context, per layer.
+
+        Keyword Arguments:
+            callback (:obj:`Callable[[StageRecord], None]`, optional): A function called with the record of each finished stage (e.g. to update a progress bar)
+            memory (:obj:`bool`, optional): Whether to record the peak memory allocated during each stage
+
+        Returns:
+            :obj:`Iterator[ExportProfiler]`: The profiler, containing the records and a summary
+        """
+        previous = self.profiler
+        self.profiler = ExportProfiler(callback, memory)
+
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
 
     def get_min_max(self) -> tuple:
         """Get the minimum an maximum coordinates from this plotter instance
@@ -576,16 +804,16 @@ class Faerun(object):
             max_z = float("-inf")
 
             if mapping["x"] in data:
-                min_x = min(data[mapping["x"]])
-                max_x = max(data[mapping["x"]])
+                min_x = np.min(data[mapping["x"]])
+                max_x = np.max(data[mapping["x"]])
 
             if mapping["y"] in data:
-                min_y = min(data[mapping["y"]])
-                max_y = max(data[mapping["y"]])
+                min_y = np.min(data[mapping["y"]])
+                max_y = np.max(data[mapping["y"]])
 
             if mapping["z"] in data:
-                min_z = min(data[mapping["z"]])
-                max_z = max(data[mapping["z"]])
+                min_z = np.min(data[mapping["z"]])
+                max_z = np.max(data[mapping["z"]])
 
             minimum = min(minimum, min([min_x, min_y, min_z]))
             maximum = max(maximum, max([max_x, max_y, max_z]))
@@ -601,30 +829,34 @@ class Faerun(object):
                 max_z = float("-inf")
 
                 if mapping["x"] in data:
-                    min_x = min(data[mapping["x"]])
-                    max_x = max(data[mapping["x"]])
+                    min_x = np.min(data[mapping["x"]])
+                    max_x = np.max(data[mapping["x"]])
 
                 if mapping["y"] in data:
-                    min_y = min(data[mapping["y"]])
-                    max_y = max(data[mapping["y"]])
+                    min_y = np.min(data[mapping["y"]])
+                    max_y = np.max(data[mapping["y"]])
 
                 if mapping["z"] in data:
-                    min_z = min(data[mapping["z"]])
-                    max_z = max(data[mapping["z"]])
+                    min_z = np.min(data[mapping["z"]])
+                    max_z = np.max(data[mapping["z"]])
 
                 minimum = min(minimum, min([min_x, min_y, min_z]))
                 maximum = max(maximum, max([max_x, max_y, max_z]))
 
         return minimum, maximum
 
-    def create_python_data(self) -> dict:
+    def create_python_data(self, labels: bool = True) -> dict:
         """Returns a Python dict containing the data
 
+        Keyword Arguments:
+            labels (:obj:`bool`, optional): Whether to include the labels of the scatter layers
+
         Returns:
             :obj:`dict`: The data defined in this Faerun instance
         """
         s = self.scale
-        minimum, maximum = self.get_min_max()
+        with self.stage("bounds"):
+            minimum, maximum = self.get_min_max()
         diff = maximum - minimum
 
         output = {}
@@ -633,67 +865,91 @@ class Faerun(object):
         for name, data in self.scatters_data.items():
             mapping = self.scatters[name]["mapping"]
             colormaps = self.scatters[name]["colormap"]
-            cmaps = [None] * len(colormaps)
-
-            for i, colormap in enumerate(colormaps):
-                if isinstance(colormap, str):
-                    cmaps[i] = plt.cm.get_cmap(colormap)
-                else:
-                    cmaps[i] = colormap
+            cmaps = [Faerun.get_cmap(colormap) for colormap in colormaps]
 
             output[name] = {}
-            output[name]["meta"] = self.scatters[name]
+            output[name]["meta"] = dict(self.scatters[name])
+            output[name]["meta"]["palettes"] = [None] * len(data[mapping["c"]])
+            output[name]["meta"]["lut_bins"] = [None] * len(data[mapping["c"]])
             output[name]["type"] = "scatter"
 
-            output[name]["x"] = np.array(
-                [s * (x - minimum) / diff for x in data[mapping["x"]]], dtype=np.float32
-            )
-            output[name]["y"] = np.array(
-                [s * (y - minimum) / diff for y in data[mapping["y"]]], dtype=np.float32
-            )
-            output[name]["z"] = np.array(
-                [s * (z - minimum) / diff for z in data[mapping["z"]]], dtype=np.float32
-            )
-
-            if mapping["labels"] in data:
-                # Make sure that the labels are always strings
-                output[name]["labels"] = list(map(str, data[mapping["labels"]]))
-
-            if mapping["s"] in data:
-                output[name]["s"] = np.array(data[mapping["s"]], dtype=np.float32)
+            order = self.point_order(name)
+            if order is not None:
+                output[name]["meta"]["spatial_order"] = "morton"
+                output[name]["permutation"] = order.astype(
+                    Faerun.index_dtype(len(order))
+                )
 
-            output[name]["colors"] = [{}] * len(data[mapping["c"]])
-            for s in range(len(data[mapping["c"]])):
-                if mapping["cs"] in data:
-                    colors = np.array([cmaps[s](x) for x in data[mapping["c"]][s]])
+            with self.stage("coordinates", name, len(data[mapping["x"]])) as record:
+                for coord in ["x", "y", "z"]:
+                    values = Faerun.permute(
+                        np.asarray(data[mapping[coord]], dtype=np.float64), order
+                    )
+                    output[name][coord] = (s * (values - minimum) / diff).astype(
+                        np.float32
+                    )
 
-                    for i, c in enumerate(colors):
-                        hsl = np.array(colour.rgb2hsl(c[:3]))
-                        hsl[1] = hsl[1] - hsl[1] * data[mapping["cs"]][s][i]
-                        colors[i] = np.append(np.array(colour.hsl2rgb(hsl)), 1.0)
+                quantization = self.quantize_coords(output[name])
+                if quantization is not None:
+                    output[name]["meta"]["quantization"] = quantization
 
-                    colors = np.round(colors * 255.0)
+                record.bytes = sum(output[name][coord].nbytes for coord in "xyz")
 
-                    output[name]["colors"][s]["r"] = np.array(
-                        colors[:, 0], dtype=np.float32
-                    )
-                    output[name]["colors"][s]["g"] = np.array(
-                        colors[:, 1], dtype=np.float32
-                    )
-                    output[name]["colors"][s]["b"] = np.array(
-                        colors[:, 2], dtype=np.float32
-                    )
-                else:
-                    colors = np.array([cmaps[s](x) for x in data[mapping["c"]][s]])
-                    colors = np.round(colors * 255.0)
-                    output[name]["colors"][s]["r"] = np.array(
-                        colors[:, 0], dtype=np.float32
-                    )
-                    output[name]["colors"][s]["g"] = np.array(
-                        colors[:, 1], dtype=np.float32
+            if labels and mapping["labels"] in data:
+                with self.stage("labels", name, len(data[mapping["labels"]])):
+                    # Make sure that the labels are always strings
+                    output[name]["labels"] = list(
+                        map(str, Faerun.permute(data[mapping["labels"]], order))
                     )
-                    output[name]["colors"][s]["b"] = np.array(
-                        colors[:, 2], dtype=np.float32
+
+            if mapping["s"] in data:
+                with self.stage("sizes", name, len(data[mapping["x"]])) as record:
+                    output[name]["s"] = np.array(data[mapping["s"]], dtype=np.float32)
+                    if order is not None:
+                        output[name]["s"] = output[name]["s"][..., order]
+                    record.bytes = output[name]["s"].nbytes
+
+            if name in self.scatters_values:
+                output[name]["values"] = [
+                    Faerun.permute(values, order)
+                    for values in self.scatters_values[name]
+                ]
+
+            output[name]["colors"] = [{} for _ in range(len(data[mapping["c"]]))]
+            for series in range(len(data[mapping["c"]])):
+                values = data[mapping["c"]][series]
+                with self.stage("colors", name, len(values)) as record:
+                    if self.use_palette(name, series):
+                        with self.stage("colormap", name, len(values)):
+                            index, palette = self.encode_palette(
+                                name, series, cmaps[series]
+                            )
+                        output[name]["colors"][series]["index"] = Faerun.permute(
+                            index, order
+                        )
+                        output[name]["colors"][series]["palette"] = palette
+                        output[name]["meta"]["palettes"][series] = palette.tolist()
+                        output[name]["meta"]["lut_bins"][series] = self.lut_bins(
+                            name, series, cmaps[series]
+                        )
+                    else:
+                        saturation = None
+                        if mapping["cs"] in data:
+                            saturation = data[mapping["cs"]][series]
+
+                        colors = self.colorize(name, cmaps[series], values, saturation)
+                        colors = Faerun.permute(colors, order)
+
+                        output[name]["colors"][series].update(
+                            {
+                                "r": colors[:, 0].astype(np.float32),
+                                "g": colors[:, 1].astype(np.float32),
+                                "b": colors[:, 2].astype(np.float32),
+                            }
+                        )
+
+                    record.bytes = sum(
+                        v.nbytes for v in output[name]["colors"][series].values()
                     )
 
         for name, data in self.trees_data.items():
@@ -701,218 +957,528 @@ class Faerun(object):
             point_helper = self.trees[name]["point_helper"]
 
             output[name] = {}
-            output[name]["meta"] = self.trees[name]
+            output[name]["meta"] = dict(self.trees[name])
             output[name]["type"] = "tree"
 
-            if point_helper is not None and point_helper in self.scatters_data:
-                scatter = self.scatters_data[point_helper]
-                scatter_mapping = self.scatters[point_helper]["mapping"]
+            with self.stage("coordinates", name) as record:
+                if point_helper is not None and point_helper in self.scatters_data:
+                    scatter = self.scatters_data[point_helper]
+                    scatter_mapping = self.scatters[point_helper]["mapping"]
+
+                    # Each edge is drawn from the "from" to the "to" vertex
+                    edges = np.empty(2 * len(data[mapping["from"]]), dtype=np.int64)
+                    edges[0::2] = data[mapping["from"]]
+                    edges[1::2] = data[mapping["to"]]
+
+                    for coord in ["x", "y", "z"]:
+                        values = np.asarray(
+                            scatter[scatter_mapping[coord]], dtype=np.float64
+                        )[edges]
+                        output[name][coord] = (s * (values - minimum) / diff).astype(
+                            np.float32
+                        )
+                else:
+                    for coord in ["x", "y", "z"]:
+                        values = np.asarray(data[mapping[coord]], dtype=np.float64)
+                        output[name][coord] = (s * (values - minimum) / diff).astype(
+                            np.float32
+                        )
 
-                x_t = []
-                y_t = []
-                z_t = []
+                quantization = self.quantize_coords(output[name])
+                if quantization is not None:
+                    output[name]["meta"]["quantization"] = quantization
 
-                for i in range(len(data[mapping["from"]])):
-                    x_t.append(scatter[scatter_mapping["x"]][data[mapping["from"]][i]])
-                    x_t.append(scatter[scatter_mapping["x"]][data[mapping["to"]][i]])
-                    y_t.append(scatter[scatter_mapping["y"]][data[mapping["from"]][i]])
-                    y_t.append(scatter[scatter_mapping["y"]][data[mapping["to"]][i]])
-                    z_t.append(scatter[scatter_mapping["z"]][data[mapping["from"]][i]])
-                    z_t.append(scatter[scatter_mapping["z"]][data[mapping["to"]][i]])
+                record.items = len(output[name]["x"])
+                record.bytes = sum(output[name][coord].nbytes for coord in "xyz")
 
-                output[name]["x"] = np.array(
-                    [s * (x - minimum) / diff for x in x_t], dtype=np.float32
-                )
-                output[name]["y"] = np.array(
-                    [s * (y - minimum) / diff for y in y_t], dtype=np.float32
-                )
-                output[name]["z"] = np.array(
-                    [s * (z - minimum) / diff for z in z_t], dtype=np.float32
-                )
-            else:
-                output[name]["x"] = np.array(
-                    [s * (x - minimum) / diff for x in data[mapping["x"]]],
-                    dtype=np.float32,
-                )
-                output[name]["y"] = np.array(
-                    [s * (y - minimum) / diff for y in data[mapping["y"]]],
-                    dtype=np.float32,
-                )
-                output[name]["z"] = np.array(
-                    [s * (z - minimum) / diff for z in data[mapping["z"]]],
-                    dtype=np.float32,
-                )
+            # The vertex indices refer to the (possibly reordered) points of the helper
+            if point_helper is not None and point_helper in self.scatters_data:
+                order = self.point_order(point_helper)
+                helper_mapping = self.scatters[point_helper]["mapping"]
+                n = len(self.scatters_data[point_helper][helper_mapping["x"]])
 
-            if mapping["c"] in data:
-                colormap = self.trees[name]["colormap"]
-                cmap = None
-                if isinstance(colormap, str):
-                    cmap = plt.cm.get_cmap(colormap)
-                else:
-                    cmap = colormap
+                for key in ["from", "to"]:
+                    indices = np.asarray(data[mapping[key]], dtype=np.int64)
+                    if order is not None:
+                        indices = Faerun.inverse_permutation(order)[indices]
+                    output[name][key] = indices.astype(Faerun.index_dtype(n))
 
-                colors = np.array([cmap(x) for x in data[mapping["c"]]])
-                colors = np.round(colors * 255.0)
-                output[name]["r"] = np.array(colors[:, 0], dtype=np.float32)
-                output[name]["g"] = np.array(colors[:, 1], dtype=np.float32)
-                output[name]["b"] = np.array(colors[:, 2], dtype=np.float32)
+            if mapping["c"] in data:
+                with self.stage("colors", name, len(data[mapping["c"]])):
+                    cmap = Faerun.get_cmap(self.trees[name]["colormap"])
+                    colors = self.colorize(name, cmap, data[mapping["c"]])
+                    output[name]["r"] = colors[:, 0].astype(np.float32)
+                    output[name]["g"] = colors[:, 1].astype(np.float32)
+                    output[name]["b"] = colors[:, 2].astype(np.float32)
 
         return output
 
-    def create_data(self) -> str:
+    def create_data(
+        self, cache: Union[ExportCache, MemoryCache] = None, preview: Dict = None
+    ) -> str:
         """Returns a JavaScript string defining a JavaScript object containing the data.
 
+        Keyword Arguments:
+            cache (:obj:`ExportCache` or :obj:`MemoryCache`, optional): The cache to look up the exported layers in. Defaults to the cache of this Faerun instance
+            preview (:obj:`Dict`, optional): A dict to which the coordinates and the colors of the first series of the scatter layers are added, in the format of :obj:`Faerun.create_python_data`, e.g. to render a preview (see :obj:`faerun.preview.render_preview`)
+
         Returns:
             :obj:`str`: JavaScript code defining an object containing the data
         """
-        s = self.scale
-        mini, maxi = self.get_min_max()
-        diff = maxi - mini
+        with self.stage("bounds"):
+            mini, maxi = self.get_min_max()
+
+        if cache is None:
+            cache = self.cache
 
         output = "const data = {\n"
 
         # Create the data for the scatters
         # TODO: If it's not interactive, labels shouldn't be exported.
-        for name, data in self.scatters_data.items():
-            mapping = self.scatters[name]["mapping"]
-            colormaps = self.scatters[name]["colormap"]
-            cmaps = [None] * len(colormaps)
+        for name in self.scatters_data:
+            output += self.export_layer(
+                name,
+                lambda name, mini, maxi: self.scatter_to_js(name, mini, maxi, preview),
+                mini,
+                maxi,
+                cache,
+            )
 
-            for i, colormap in enumerate(colormaps):
-                if isinstance(colormap, str):
-                    cmaps[i] = plt.cm.get_cmap(colormap)
-                else:
-                    cmaps[i] = colormap
+            # Cached layers are not exported, so only their preview data is computed
+            if preview is not None and name not in preview:
+                preview[name] = self.preview_layer(name, mini, maxi)
 
-            output += name + ": {\n"
-            x_norm = [round(s * (x - mini) / diff, 3) for x in data[mapping["x"]]]
-            output += "x: [" + ",".join(map(str, x_norm)) + "],\n"
+        for name in self.trees_data:
+            output += self.export_layer(name, self.tree_to_js, mini, maxi, cache)
 
-            y_norm = [round(s * (y - mini) / diff, 3) for y in data[mapping["y"]]]
-            output += "y: [" + ",".join(map(str, y_norm)) + "],\n"
+        output += "};\n"
 
-            z_norm = [round(s * (z - mini) / diff, 3) for z in data[mapping["z"]]]
-            output += "z: [" + ",".join(map(str, z_norm)) + "],\n"
+        # Binary arrays (quantized coordinates, palettes) are decoded by the prelude
+        if 'faerunDecode("' in output:
+            output = (
+                DATA_DECODER
+                + output
+                + "faerunDequantize(data);\nfaerunExpandPalettes(data);\n"
+            )
 
-            if mapping["labels"] in data:
-                fmt_labels = ["'{0}'".format(s) for s in data[mapping["labels"]]]
-                output += "labels: [" + ",".join(fmt_labels) + "],\n"
+        return output
 
-            if mapping["s"] in data:
-                output += "s: ["
+    def create_parts(
+        self, cache: Union[ExportCache, MemoryCache] = None
+    ) -> Dict[str, Dict[str, List[str]]]:
+        """Creates the parts of the data of all layers (see
+        :obj:`Faerun.scatter_parts` and :obj:`Faerun.tree_parts`), which
+        :obj:`faerun.plot_batch` writes to files shared by figures.
+
+        Keyword Arguments:
+            cache (:obj:`ExportCache` or :obj:`MemoryCache`, optional): The cache to look up the exported layers in. Defaults to the cache of this Faerun instance
+
+        Returns:
+            :obj:`Dict[str, Dict[str, List[str]]]`: The parts of the data by the names of the layers
+        """
+        with self.stage("bounds"):
+            mini, maxi = self.get_min_max()
+
+        if cache is None:
+            cache = self.cache
+
+        layers = {}
+
+        for name in self.scatters_data:
+            layers[name] = self.export_layer(
+                name,
+                lambda name, mini, maxi: json.dumps(
+                    self.scatter_parts(name, mini, maxi)
+                ),
+                mini,
+                maxi,
+                cache,
+                "parts",
+            )
+
+        for name in self.trees_data:
+            layers[name] = self.export_layer(
+                name,
+                lambda name, mini, maxi: json.dumps(self.tree_parts(name, mini, maxi)),
+                mini,
+                maxi,
+                cache,
+                "parts",
+            )
+
+        return {name: json.loads(parts) for name, parts in layers.items()}
+
+    def export_layer(
+        self,
+        name: str,
+        to_js: Callable[[str, float, float], str],
+        mini: float,
+        maxi: float,
+        cache: Union[ExportCache, MemoryCache] = None,
+        variant: str = None,
+    ) -> str:
+        """Creates the JavaScript object property containing the data of a layer. If a
+        cache is passed, the property is only created if the data of the layer or
+        the options affecting it changed since it was cached.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            to_js (:obj:`Callable[[str, float, float], str]`): The function creating the property (:obj:`Faerun.scatter_to_js` or :obj:`Faerun.tree_to_js`)
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
+
+        Keyword Arguments:
+            cache (:obj:`ExportCache` or :obj:`MemoryCache`, optional): The cache to look up the layer in
+            variant (:obj:`str`, optional): The name of the kind of output created by to_js, if not the JavaScript object property (e.g. "parts"), which is cached separately
+
+        Returns:
+            :obj:`str`: The JavaScript object property
+        """
+        if cache is None:
+            return to_js(name, mini, maxi)
+
+        with self.stage("cache", name) as record:
+            key = self.layer_key(name, mini, maxi)
+            if variant is not None:
+                key = hash_values(key, variant)
+            output = cache.get(key)
+
+            if output is not None:
+                record.bytes = len(output)
+                return output
+
+        output = to_js(name, mini, maxi)
+        cache.put(key, output)
+
+        return output
+
+    def layer_key(self, name: str, mini: float, maxi: float) -> str:
+        """Creates the export cache key of a layer from its data and all options affecting its exported data.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
+
+        Returns:
+            :obj:`str`: The key
+        """
+        values = [
+            name,
+            float(mini),
+            float(maxi),
+            self.scale,
+            self.color_encoding,
+            self.quantization_bits,
+            self.spatial_order,
+        ]
+
+        if name in self.scatters:
+            scatter = self.scatters[name]
+            values += [
+                "scatter",
+                scatter["mapping"],
+                scatter["categorical"],
+                [Faerun.get_cmap(colormap) for colormap in scatter["colormap"]],
+                self.scatters_data[name],
+            ]
+        else:
+            tree = self.trees[name]
+            values += [
+                "tree",
+                tree["mapping"],
+                Faerun.get_cmap(tree["colormap"]),
+                self.trees_data[name],
+            ]
+
+            # The coordinates of the edges are read from the point helper
+            if tree["point_helper"] in self.scatters_data:
+                scatter = self.scatters[tree["point_helper"]]
+                scatter_data = self.scatters_data[tree["point_helper"]]
+                values += [
+                    scatter_data[scatter["mapping"][coord]] for coord in ["x", "y", "z"]
+                ]
+
+        return hash_values(*values)
+
+    def scatter_to_js(
+        self, name: str, mini: float, maxi: float, preview: Dict = None
+    ) -> str:
+        """Creates the JavaScript object property containing the data of a scatter layer.
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
+
+        Keyword Arguments:
+            preview (:obj:`Dict`, optional): A dict to which the coordinates and the colors of the first series are added (see :obj:`Faerun.create_data`)
+
+        Returns:
+            :obj:`str`: The JavaScript object property
+        """
+        return Faerun.join_parts(name, self.scatter_parts(name, mini, maxi, preview))
+
+    def scatter_parts(
+        self, name: str, mini: float, maxi: float, preview: Dict = None
+    ) -> Dict[str, List[str]]:
+        """Creates the parts of the JavaScript object containing the data of a scatter
+        layer, so that figures can share the parts they have in common (see
+        :obj:`faerun.plot_batch`).
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
+
+        Keyword Arguments:
+            preview (:obj:`Dict`, optional): A dict to which the coordinates and the colors of the first series are added (see :obj:`Faerun.create_data`)
+
+        Returns:
+            :obj:`Dict[str, List[str]]`: The JavaScript object properties containing the coordinates, the labels and the sizes ("properties") and the object properties of each series of colors ("colors")
+        """
+        s = self.scale
+        diff = maxi - mini
+        data = self.scatters_data[name]
+        mapping = self.scatters[name]["mapping"]
+        colormaps = self.scatters[name]["colormap"]
+        cmaps = [Faerun.get_cmap(colormap) for colormap in colormaps]
+
+        order = self.point_order(name)
+        parts = {"properties": [], "colors": []}
+
+        with self.stage("coordinates", name, len(data[mapping["x"]])) as record:
+            coords = {}
+            for coord in ["x", "y", "z"]:
+                values = Faerun.permute(
+                    np.asarray(data[mapping[coord]], dtype=np.float64), order
+                )
+                coords[coord] = s * (values - mini) / diff
+
+            quantization = self.quantize_coords(coords)
+            parts["properties"].append(Faerun.coords_to_js(coords, quantization))
+            record.bytes = len(parts["properties"][-1])
+
+        if preview is not None:
+            preview[name] = dict(coords, type="scatter", colors=[])
+            preview[name]["meta"] = {"quantization": quantization}
+
+        if mapping["labels"] in data:
+            with self.stage("labels", name, len(data[mapping["labels"]])) as record:
+                fmt_labels = [
+                    "'{0}'".format(s)
+                    for s in Faerun.permute(data[mapping["labels"]], order)
+                ]
+                parts["properties"].append("labels: [" + ",".join(fmt_labels) + "],\n")
+                record.bytes = len(parts["properties"][-1])
+
+        if mapping["s"] in data:
+            with self.stage("sizes", name, len(data[mapping["x"]])) as record:
+                output = "s: ["
 
                 for series in range(len(data[mapping["s"]])):
                     output += (
                         "["
-                        + ",".join(map(str, np.round(data[mapping["s"]][series], 3)))
+                        + ",".join(
+                            map(
+                                str,
+                                np.round(
+                                    Faerun.permute(
+                                        np.asarray(data[mapping["s"]][series]), order
+                                    ),
+                                    3,
+                                ),
+                            )
+                        )
                         + "],\n"
                     )
 
                 output += "],\n"
+                parts["properties"].append(output)
+                record.bytes = len(output)
+
+        for series in range(len(data[mapping["c"]])):
+            values = data[mapping["c"]][series]
+            with self.stage("colors", name, len(values)) as record:
+                output = ""
+                if self.use_palette(name, series):
+                    with self.stage("colormap", name, len(values)):
+                        index, palette = self.encode_palette(
+                            name, series, cmaps[series]
+                        )
+                    index = Faerun.permute(index, order)
+                    output += "index: " + Faerun.to_js_typed_array(index) + ",\n"
+                    output += "palette: " + Faerun.to_js_typed_array(palette) + ",\n"
+
+                    bins = self.lut_bins(name, series, cmaps[series])
+                    if bins is not None:
+                        output += "bins: " + str(bins) + ",\n"
+
+                    if preview is not None and series == 0:
+                        preview[name]["colors"].append(
+                            {"index": index, "palette": palette}
+                        )
+                else:
+                    saturation = None
+                    if mapping["cs"] in data:
+                        saturation = data[mapping["cs"]][series]
 
-            output += "colors: [\n"
-            for series in range(len(data[mapping["c"]])):
-                output += "{\n"
-                if mapping["cs"] in data:
-                    colors = np.array(
-                        [cmaps[series](x) for x in data[mapping["c"]][series]]
-                    )
+                    colors = self.colorize(
+                        name, cmaps[series], values, saturation
+                    ).astype(int)
+                    colors = Faerun.permute(colors, order)
 
-                    for i, c in enumerate(colors):
-                        hsl = np.array(colour.rgb2hsl(c[:3]))
-                        hsl[1] = hsl[1] - hsl[1] * data[mapping["cs"]][series][i]
-                        colors[i] = np.append(np.array(colour.hsl2rgb(hsl)), 1.0)
+                    output += "r: [" + ",".join(map(str, colors[:, 0])) + "],\n"
+                    output += "g: [" + ",".join(map(str, colors[:, 1])) + "],\n"
+                    output += "b: [" + ",".join(map(str, colors[:, 2])) + "],\n"
 
-                    colors = np.round(colors * 255.0)
+                    if preview is not None and series == 0:
+                        preview[name]["colors"].append(
+                            {channel: colors[:, i] for i, channel in enumerate("rgb")}
+                        )
 
-                    output += (
-                        "r: [" + ",".join(map(str, map(int, colors[:, 0]))) + "],\n"
-                    )
-                    output += (
-                        "g: [" + ",".join(map(str, map(int, colors[:, 1]))) + "],\n"
-                    )
-                    output += (
-                        "b: [" + ",".join(map(str, map(int, colors[:, 2]))) + "],\n"
-                    )
-                elif mapping["c"] in data:
-                    colors = np.array(
-                        [cmaps[series](x) for x in data[mapping["c"]][series]]
-                    )
-                    colors = np.round(colors * 255.0)
-                    output += (
-                        "r: [" + ",".join(map(str, map(int, colors[:, 0]))) + "],\n"
-                    )
-                    output += (
-                        "g: [" + ",".join(map(str, map(int, colors[:, 1]))) + "],\n"
-                    )
-                    output += (
-                        "b: [" + ",".join(map(str, map(int, colors[:, 2]))) + "],\n"
-                    )
-                output += "},\n"
+                parts["colors"].append(output)
+                record.bytes = len(output)
 
-            output += "]"
-            output += "},\n"
+        return parts
 
-        for name, data in self.trees_data.items():
-            mapping = self.trees[name]["mapping"]
-            point_helper = self.trees[name]["point_helper"]
+    def preview_layer(self, name: str, mini: float, maxi: float) -> Dict:
+        """Computes the coordinates and the colors of the first series of a scatter
+        layer as exported by :obj:`Faerun.scatter_to_js`, e.g. to render a preview of a
+        layer that was not exported as it was cached.
 
-            output += name + ": {\n"
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
 
-            if point_helper is not None and point_helper in self.scatters_data:
-                scatter = self.scatters_data[point_helper]
-                scatter_mapping = self.scatters[point_helper]["mapping"]
+        Returns:
+            :obj:`Dict`: The layer in the format of :obj:`Faerun.create_python_data`
+        """
+        data = self.scatters_data[name]
+        mapping = self.scatters[name]["mapping"]
+        cmap = Faerun.get_cmap(self.scatters[name]["colormap"][0])
+        order = self.point_order(name)
+
+        coords = {}
+        for coord in ["x", "y", "z"]:
+            values = Faerun.permute(
+                np.asarray(data[mapping[coord]], dtype=np.float64), order
+            )
+            coords[coord] = self.scale * (values - mini) / (maxi - mini)
 
-                x_t = []
-                y_t = []
-                z_t = []
+        layer = dict(coords, type="scatter")
+        layer["meta"] = {"quantization": self.quantize_coords(layer)}
 
-                for i in range(len(data[mapping["from"]])):
-                    x_t.append(scatter[scatter_mapping["x"]][data[mapping["from"]][i]])
-                    x_t.append(scatter[scatter_mapping["x"]][data[mapping["to"]][i]])
-                    y_t.append(scatter[scatter_mapping["y"]][data[mapping["from"]][i]])
-                    y_t.append(scatter[scatter_mapping["y"]][data[mapping["to"]][i]])
-                    z_t.append(scatter[scatter_mapping["z"]][data[mapping["from"]][i]])
-                    z_t.append(scatter[scatter_mapping["z"]][data[mapping["to"]][i]])
+        if self.use_palette(name, 0):
+            index, palette = self.encode_palette(name, 0, cmap)
+            layer["colors"] = [
+                {"index": Faerun.permute(index, order), "palette": palette}
+            ]
+        else:
+            saturation = data[mapping["cs"]][0] if mapping["cs"] in data else None
+            colors = Faerun.permute(
+                self.colorize(name, cmap, data[mapping["c"]][0], saturation), order
+            )
+            layer["colors"] = [
+                {channel: colors[:, i] for i, channel in enumerate("rgb")}
+            ]
 
-                x_norm = [round(s * (x - mini) / diff, 3) for x in x_t]
-                output += f"x: [" + ",".join(map(str, x_norm)) + "],\n"
+        return layer
 
-                y_norm = [round(s * (y - mini) / diff, 3) for y in y_t]
-                output += "y: [" + ",".join(map(str, y_norm)) + "],\n"
+    def tree_to_js(self, name: str, mini: float, maxi: float) -> str:
+        """Creates the JavaScript object property containing the data of a tree layer.
 
-                z_norm = [round(s * (z - mini) / diff, 3) for z in z_t]
-                output += "z: [" + ",".join(map(str, z_norm)) + "],\n"
-            else:
-                x_norm = [round(s * (x - mini) / diff, 3) for x in data[mapping["x"]]]
-                output += "x: [" + ",".join(map(str, x_norm)) + "],\n"
+        Arguments:
+            name (:obj:`str`): The name of the tree layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
 
-                y_norm = [round(s * (y - mini) / diff, 3) for y in data[mapping["y"]]]
-                output += "y: [" + ",".join(map(str, y_norm)) + "],\n"
+        Returns:
+            :obj:`str`: The JavaScript object property
+        """
+        return Faerun.join_parts(name, self.tree_parts(name, mini, maxi))
 
-                z_norm = [round(s * (z - mini) / diff, 3) for z in data[mapping["z"]]]
+    def tree_parts(self, name: str, mini: float, maxi: float) -> Dict[str, List[str]]:
+        """Creates the parts of the JavaScript object containing the data of a tree
+        layer (see :obj:`Faerun.scatter_parts`).
 
-                output += "z: [" + ",".join(map(str, z_norm)) + "],\n"
+        Arguments:
+            name (:obj:`str`): The name of the tree layer
+            mini (:obj:`float`): The minimum of the coordinates of all layers
+            maxi (:obj:`float`): The maximum of the coordinates of all layers
 
-            if mapping["c"] in data:
-                colormap = self.trees[name]["colormap"]
-                cmap = None
-                if isinstance(colormap, str):
-                    cmap = plt.cm.get_cmap(colormap)
-                else:
-                    cmap = colormap
+        Returns:
+            :obj:`Dict[str, List[str]]`: The JavaScript object properties containing the coordinates and the colors ("properties")
+        """
+        s = self.scale
+        diff = maxi - mini
+        data = self.trees_data[name]
+        mapping = self.trees[name]["mapping"]
+        point_helper = self.trees[name]["point_helper"]
+
+        parts = {"properties": []}
+
+        with self.stage("coordinates", name) as record:
+            coords = {}
+
+            if point_helper is not None and point_helper in self.scatters_data:
+                scatter = self.scatters_data[point_helper]
+                scatter_mapping = self.scatters[point_helper]["mapping"]
 
-                colors = np.array([cmap(x) for x in data[mapping["c"]]])
-                colors = np.round(colors * 255.0)
-                output += "r: [" + ",".join(map(str, colors[:, 0])) + "],\n"
+                # Each edge is drawn from the "from" to the "to" vertex
+                edges = np.empty(2 * len(data[mapping["from"]]), dtype=np.int64)
+                edges[0::2] = data[mapping["from"]]
+                edges[1::2] = data[mapping["to"]]
+
+                for coord in ["x", "y", "z"]:
+                    values = np.asarray(
+                        scatter[scatter_mapping[coord]], dtype=np.float64
+                    )[edges]
+                    coords[coord] = s * (values - mini) / diff
+            else:
+                for coord in ["x", "y", "z"]:
+                    values = np.asarray(data[mapping[coord]], dtype=np.float64)
+                    coords[coord] = s * (values - mini) / diff
+
+            quantization = self.quantize_coords(coords)
+            parts["properties"].append(Faerun.coords_to_js(coords, quantization))
+
+            record.items = len(coords["x"])
+            record.bytes = len(parts["properties"][-1])
+
+        if mapping["c"] in data:
+            with self.stage("colors", name, len(data[mapping["c"]])) as record:
+                cmap = Faerun.get_cmap(self.trees[name]["colormap"])
+                colors = self.colorize(name, cmap, data[mapping["c"]])
+                output = "r: [" + ",".join(map(str, colors[:, 0])) + "],\n"
                 output += "g: [" + ",".join(map(str, colors[:, 1])) + "],\n"
                 output += "b: [" + ",".join(map(str, colors[:, 2])) + "],\n"
+                parts["properties"].append(output)
+                record.bytes = len(output)
 
-            output += "},\n"
+        return parts
 
-        output += "};\n"
+    @staticmethod
+    def join_parts(name: str, parts: Dict[str, List[str]]) -> str:
+        """Joins the parts of the data of a layer (see :obj:`Faerun.scatter_parts` and
+        :obj:`Faerun.tree_parts`) into a JavaScript object property.
 
-        return output
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            parts (:obj:`Dict[str, List[str]]`): The parts of the data of the layer
+
+        Returns:
+            :obj:`str`: The JavaScript object property
+        """
+        output = name + ": {\n" + "".join(parts["properties"])
+
+        if "colors" in parts:
+            output += "colors: [\n"
+            output += "".join("{\n" + colors + "},\n" for colors in parts["colors"])
+            output += "]"
+
+        return output + "},\n"
 
     @staticmethod
     def quickplot(
@@ -1092,12 +1658,537 @@ class Faerun(object):
             :obj:`Colormap`: The discrete colormap
         """
         # https://gist.github.com/jakevdp/91077b0cae40f8f8244a
-        base = plt.cm.get_cmap(base_cmap)
+        base = Faerun.get_cmap(base_cmap)
         color_list = base(np.linspace(0, 1, n_colors))
         cmap_name = base.name + str(n_colors)
 
         return base.from_list(cmap_name, color_list, n_colors)
 
+    @staticmethod
+    def read_columns(data: Any, mapping: Dict) -> Tuple[Dict, Dict]:
+        """Reads the columns referenced in a mapping from a Python dict, a Pandas DataFrame,
+        a Parquet file or an Arrow table. Columns are kept as NumPy arrays (zero-copy where
+        possible) and Parquet files are read with column projection. A list of column names
+        in the mapping is combined into a single entry containing a list of columns.
+
+        Arguments:
+            data (:obj:`dict`, :obj:`DataFrame`, :obj:`str` or :obj:`pyarrow.Table`): The data
+            mapping (:obj:`dict`): The keys which contain the data
+
+        Returns:
+            :obj:`Tuple[Dict, Dict]`: The data as a dict and the (updated) mapping
+        """
+        columns = []
+        for value in mapping.values():
+            columns.extend(value if isinstance(value, list) else [value])
+
+        if isinstance(data, str):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet files requires pyarrow.")
+
+            schema_names = pq.read_schema(data).names
+            data = pq.read_table(
+                data, columns=[c for c in dict.fromkeys(columns) if c in schema_names]
+            )
+
+        if "pyarrow" in type(data).__module__:
+            data = {
+                c: np.asarray(data.column(c))
+                for c in dict.fromkeys(columns)
+                if c in data.schema.names
+            }
+        elif "pandas" in type(data).__module__:
+            data = {c: data[c].to_numpy() for c in dict.fromkeys(columns) if c in data}
+        else:
+            data = dict(data)
+
+        mapping = dict(mapping)
+        for key, value in mapping.items():
+            if isinstance(value, list):
+                mapping[key] = key
+                data[key] = [data[c] for c in value]
+
+        return data, mapping
+
+    @staticmethod
+    def get_cmap(colormap: Union[str, Colormap]) -> Colormap:
+        """Gets a matplotlib colormap by name. Colormap objects are returned as is.
+
+        Arguments:
+            colormap (:obj:`str` or :obj:`Colormap`): The name of the colormap (can also be a matplotlib Colormap object)
+
+        Returns:
+            :obj:`Colormap`: The colormap
+        """
+        if not isinstance(colormap, str):
+            return colormap
+
+        try:
+            return matplotlib.colormaps[colormap]
+        except AttributeError:
+            # matplotlib < 3.5 has no colormap registry
+            import matplotlib.pyplot as plt
+
+            return plt.cm.get_cmap(colormap)
+
+    @staticmethod
+    def map_colors(
+        cmap: Colormap, values: Iterable, saturation: Iterable = None
+    ) -> np.ndarray:
+        """Maps values to RGB colors in the range [0, 255] using a colormap.
+
+        Arguments:
+            cmap (:obj:`Colormap`): A matplotlib colormap
+            values (:obj:`Iterable`): The (normalized or, when categorical, integer) values to map
+
+        Keyword Arguments:
+            saturation (:obj:`Iterable`, optional): Per-value amounts in [0, 1] by which the HSL saturation of the colors is reduced
+
+        Returns:
+            :obj:`np.ndarray`: An array of shape (n, 3) containing the rounded RGB values
+        """
+        colors = cmap(np.asarray(values))[:, :3]
+
+        if saturation is not None:
+            colors = Faerun.desaturate(colors, saturation)
+
+        return np.round(colors * 255.0)
+
+    @staticmethod
+    def desaturate(colors: np.ndarray, saturation: Iterable) -> np.ndarray:
+        """Reduces the HSL saturation of RGB colors.
+
+        Arguments:
+            colors (:obj:`np.ndarray`): An array of shape (n, 3) containing RGB colors in the range [0, 1]
+            saturation (:obj:`Iterable`): Per-color amounts in [0, 1] by which the saturation is reduced
+
+        Returns:
+            :obj:`np.ndarray`: An array of shape (n, 3) containing the RGB colors in the range [0, 1]
+        """
+        # Scaling the HSL saturation while keeping hue and lightness
+        # constant moves each channel linearly towards the lightness
+        lightness = (colors.max(axis=1) + colors.min(axis=1)) / 2.0
+        factor = 1.0 - np.asarray(saturation, dtype=np.float64)
+
+        return lightness[:, None] + (colors - lightness[:, None]) * factor[:, None]
+
+    def colorize(
+        self, name: str, cmap: Colormap, values: Iterable, saturation: Iterable = None
+    ) -> np.ndarray:
+        """Maps values to RGB colors like :obj:`Faerun.map_colors`, timing the colormap
+        lookup ("colormap") and the saturation adjustment ("hsl") as separate stages.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            cmap (:obj:`Colormap`): A matplotlib colormap
+            values (:obj:`Iterable`): The (normalized or, when categorical, integer) values to map
+
+        Keyword Arguments:
+            saturation (:obj:`Iterable`, optional): Per-value amounts in [0, 1] by which the HSL saturation of the colors is reduced
+
+        Returns:
+            :obj:`np.ndarray`: An array of shape (n, 3) containing the rounded RGB values
+        """
+        with self.stage("colormap", name, len(values)):
+            colors = cmap(np.asarray(values))[:, :3]
+
+        if saturation is not None:
+            with self.stage("hsl", name, len(values)):
+                colors = Faerun.desaturate(colors, saturation)
+
+        return np.round(colors * 255.0)
+
+    def use_palette(self, name: str, series: int) -> bool:
+        """Checks whether the colors of a series of a scatter layer are exported as
+        indices into a palette (categorical series) or a lookup table (continuous series).
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            series (:obj:`int`): The index of the series
+
+        Returns:
+            :obj:`bool`: Whether the series is exported as indices into a palette
+        """
+        if self.color_encoding == "rgb":
+            return False
+
+        scatter = self.scatters[name]
+        data = self.scatters_data[name]
+        values = np.asarray(data[scatter["mapping"]["c"]][series])
+
+        # Per-point saturation results in a color per data point
+        if scatter["mapping"]["cs"] in data:
+            return False
+
+        if not scatter["categorical"][series]:
+            return self.color_encoding == "lut"
+
+        return (
+            values.dtype.kind in "iu"
+            and scatter["min_c"][series] >= 0
+            and scatter["max_c"][series]
+            < Faerun.get_cmap(scatter["colormap"][series]).N
+        )
+
+    def encode_palette(
+        self, name: str, series: int, cmap: Colormap
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Encodes the colors of a series of a scatter layer as indices into a palette
+        (categorical series) or a lookup table (continuous series).
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            series (:obj:`int`): The index of the series
+            cmap (:obj:`Colormap`): The colormap of the series
+
+        Returns:
+            :obj:`Tuple[np.ndarray, np.ndarray]`: The indices and the palette of shape (k, 3) as uint8
+        """
+        scatter = self.scatters[name]
+        values = self.scatters_data[name][scatter["mapping"]["c"]][series]
+
+        if scatter["categorical"][series]:
+            return Faerun.map_palette(cmap, values)
+
+        return Faerun.map_lut(cmap, values)
+
+    @staticmethod
+    def map_palette(cmap: Colormap, values: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """Maps integer values to indices into a palette of RGB colors sampled from a colormap.
+
+        Arguments:
+            cmap (:obj:`Colormap`): A matplotlib colormap
+            values (:obj:`Iterable`): The non-negative integer values to map
+
+        Returns:
+            :obj:`Tuple[np.ndarray, np.ndarray]`: The indices (uint8 or uint16) and the palette of shape (k, 3) as uint8
+        """
+        values = np.asarray(values)
+        n_colors = int(values.max()) + 1 if len(values) > 0 else 0
+        palette = Faerun.map_colors(cmap, np.arange(n_colors)).astype(np.uint8)
+
+        return values.astype(Faerun.index_dtype(n_colors), copy=False), palette
+
+    def lut_bins(self, name: str, series: int, cmap: Colormap) -> Union[int, None]:
+        """Gets the number of colors in the lookup table of a continuous series of a
+        scatter layer exported with the color encoding 'lut' (see :obj:`Faerun.map_lut`).
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+            series (:obj:`int`): The index of the series
+            cmap (:obj:`Colormap`): The colormap of the series
+
+        Returns:
+            :obj:`Union[int, None]`: The number of colors (without the color of missing values) or None if the series is not exported with a lookup table
+        """
+        if self.scatters[name]["categorical"][series] or not self.use_palette(
+            name, series
+        ):
+            return None
+
+        return len(Faerun.create_lut(cmap))
+
+    @staticmethod
+    def create_lut(cmap: Union[str, Colormap], size: int = 256) -> np.ndarray:
+        """Samples a lookup table of RGB colors from a colormap. In the browser, series
+        exported with the color encoding 'lut' can be recolored with such a lookup
+        table (as a list) without exporting the data again, e.g. by calling
+        f.setColormap(name, series, lut) in a plot.
+
+        Arguments:
+            cmap (:obj:`str` or :obj:`Colormap`): The name of a matplotlib colormap or a matplotlib colormap
+
+        Keyword Arguments:
+            size (:obj:`int`, optional): The maximum number of colors in the lookup table
+
+        Returns:
+            :obj:`np.ndarray`: The lookup table of shape (k, 3) as uint8
+        """
+        if isinstance(cmap, str):
+            cmap = Faerun.get_cmap(cmap)
+
+        size = min(cmap.N, size)
+
+        if size == cmap.N:
+            lut = Faerun.map_colors(cmap, np.arange(size))
+        else:
+            lut = Faerun.map_colors(cmap, (np.arange(size) + 0.5) / size)
+
+        return lut.astype(np.uint8)
+
+    @staticmethod
+    def map_lut(
+        cmap: Colormap, values: Iterable, size: int = 256, missing: bool = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Maps normalized values to indices into a lookup table of RGB colors sampled
+        from a colormap (see :obj:`Faerun.create_lut`). For colormaps with at most size
+        colors, the result is identical to mapping the values with the colormap
+        directly. Missing values (NaN) are mapped to an additional color at the end of
+        the lookup table, the "bad" color of the colormap.
+
+        Arguments:
+            cmap (:obj:`Colormap`): A matplotlib colormap
+            values (:obj:`Iterable`): The values in the range [0, 1] to map
+
+        Keyword Arguments:
+            size (:obj:`int`, optional): The maximum number of colors in the lookup table
+            missing (:obj:`bool`, optional): Whether to add the color of missing values to the lookup table. Defaults to whether any value is missing
+
+        Returns:
+            :obj:`Tuple[np.ndarray, np.ndarray]`: The indices and the lookup table of shape (k, 3) or, with the color of missing values, (k + 1, 3) as uint8
+        """
+        lut = Faerun.create_lut(cmap, size)
+        values = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(values)
+
+        if missing is None:
+            missing = bool(np.any(nan))
+        elif not missing and np.any(nan):
+            raise ValueError("Missing values require the color of missing values.")
+
+        # The same binning as used by matplotlib colormaps
+        index = np.clip(np.floor(values * len(lut)), 0, len(lut) - 1)
+
+        if missing:
+            index[nan] = len(lut)
+            lut = np.concatenate(
+                [lut, Faerun.map_colors(cmap, [np.nan]).astype(np.uint8)]
+            )
+
+        return index.astype(Faerun.index_dtype(len(lut))), lut
+
+    @staticmethod
+    def to_js_typed_array(values: np.ndarray) -> str:
+        """Creates a JavaScript expression decoding a base64 encoded typed array
+        (requires the decoder functions that are prepended to the data).
+
+        Arguments:
+            values (:obj:`np.ndarray`): A uint8, uint16, uint32 or float32 array
+
+        Returns:
+            :obj:`str`: The JavaScript expression
+        """
+        types = {
+            "uint8": "Uint8Array",
+            "uint16": "Uint16Array",
+            "uint32": "Uint32Array",
+            "float32": "Float32Array",
+        }
+        values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+        encoded = base64.b64encode(values.tobytes()).decode("ascii")
+
+        return 'faerunDecode("' + encoded + '", ' + types[values.dtype.name] + ")"
+
+    def quantize_coords(self, coords: Dict[str, np.ndarray]) -> Union[Dict, None]:
+        """Quantizes the normalized x, y and z coordinates of a layer in place, if
+        quantization is enabled for this Faerun instance.
+
+        Arguments:
+            coords (:obj:`Dict[str, np.ndarray]`): A dict containing the normalized coordinates as "x", "y" and "z"
+
+        Returns:
+            :obj:`Union[Dict, None]`: The bit depth and the offsets and steps needed to dequantize the coordinates or None if quantization is disabled
+        """
+        if self.quantization_bits is None:
+            return None
+
+        quantization = {"bits": self.quantization_bits, "offset": [], "step": []}
+
+        for coord in ["x", "y", "z"]:
+            coords[coord], offset, step = Faerun.quantize(
+                coords[coord], self.quantization_bits
+            )
+            quantization["offset"].append(offset)
+            quantization["step"].append(step)
+
+        return quantization
+
+    @staticmethod
+    def quantize(
+        values: Iterable, bits: int, bounds: Tuple[float, float] = None
+    ) -> Tuple[np.ndarray, float, float]:
+        """Quantizes values to unsigned integers with the given bit depth over their range.
+        The original values are approximated by offset + step * quantized.
+
+        Arguments:
+            values (:obj:`Iterable`): The values to quantize
+            bits (:obj:`int`): The bit depth (1 to 16)
+
+        Keyword Arguments:
+            bounds (:obj:`Tuple[float, float]`, optional): The range to quantize over. Computed from the values if not supplied
+
+        Returns:
+            :obj:`Tuple[np.ndarray, float, float]`: The quantized values (uint8 or uint16), the offset and the step
+        """
+        values = np.asarray(values, dtype=np.float64)
+        dtype = np.uint8 if bits <= 8 else np.uint16
+
+        if bounds is None:
+            bounds = (0.0, 0.0)
+            if len(values) > 0:
+                bounds = (np.min(values), np.max(values))
+
+        offset = float(bounds[0])
+        step = float(bounds[1] - bounds[0]) / (2**bits - 1)
+
+        if step == 0.0:
+            return np.zeros(len(values), dtype=dtype), offset, step
+
+        return np.round((values - offset) / step).astype(dtype), offset, step
+
+    @staticmethod
+    def coords_to_js(coords: Dict[str, np.ndarray], quantization: Dict = None) -> str:
+        """Creates the JavaScript object properties containing the coordinates of a layer.
+
+        Arguments:
+            coords (:obj:`Dict[str, np.ndarray]`): A dict containing the normalized (or quantized) coordinates as "x", "y" and "z"
+
+        Keyword Arguments:
+            quantization (:obj:`Dict`, optional): The dequantization parameters if the coordinates are quantized
+
+        Returns:
+            :obj:`str`: The JavaScript object properties
+        """
+        output = ""
+
+        for coord in ["x", "y", "z"]:
+            if quantization is None:
+                values = np.round(coords[coord], 3).tolist()
+                output += coord + ": [" + ",".join(map(str, values)) + "],\n"
+            else:
+                output += coord + ": " + Faerun.to_js_typed_array(coords[coord]) + ",\n"
+
+        if quantization is not None:
+            output += "quantization: " + json.dumps(quantization) + ",\n"
+
+        return output
+
+    def point_order(self, name: str) -> Union[np.ndarray, None]:
+        """Gets the order in which the points of a scatter layer are exported. The order
+        is computed once per layer and kept until the layer is replaced.
+
+        Arguments:
+            name (:obj:`str`): The name of the scatter layer
+
+        Returns:
+            :obj:`Union[np.ndarray, None]`: The original indices of the points in export order or None if the points are exported in input order
+        """
+        if not self.spatial_order:
+            return None
+
+        if name not in self.orders:
+            data = self.scatters_data[name]
+            mapping = self.scatters[name]["mapping"]
+
+            with self.stage("order", name, len(data[mapping["x"]])):
+                self.orders[name] = Faerun.morton_order(
+                    [data[mapping[coord]] for coord in ["x", "y", "z"]]
+                )
+
+        return self.orders[name]
+
+    @staticmethod
+    def morton_order(coords: List[Iterable], bits: int = 16) -> np.ndarray:
+        """Gets the permutation sorting points along a Morton (Z-order) curve. The
+        coordinates are quantized over their range per axis, and the bits of the
+        quantized coordinates are interleaved into a single key.
+
+        Arguments:
+            coords (:obj:`List[Iterable]`): The coordinates per axis (up to three axes)
+
+        Keyword Arguments:
+            bits (:obj:`int`, optional): The number of bits per axis (1 to 21)
+
+        Returns:
+            :obj:`np.ndarray`: The indices of the points sorted by their keys
+        """
+        keys = None
+
+        for axis, values in enumerate(coords):
+            quantized, _, _ = Faerun.quantize(values, bits)
+            spread = Faerun.spread_bits(quantized.astype(np.uint64)) << np.uint64(axis)
+            keys = spread if keys is None else keys | spread
+
+        return np.argsort(keys, kind="stable")
+
+    @staticmethod
+    def spread_bits(values: np.ndarray) -> np.ndarray:
+        """Inserts two zero bits between each of the lowest 21 bits of unsigned integers.
+
+        Arguments:
+            values (:obj:`np.ndarray`): The unsigned integers (uint64)
+
+        Returns:
+            :obj:`np.ndarray`: The spread integers (uint64)
+        """
+        values = values & np.uint64(0x1FFFFF)
+        for shift, mask in [
+            (32, 0x1F00000000FFFF),
+            (16, 0x1F0000FF0000FF),
+            (8, 0x100F00F00F00F00F),
+            (4, 0x10C30C30C30C30C3),
+            (2, 0x1249249249249249),
+        ]:
+            values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+
+        return values
+
+    @staticmethod
+    def permute(values: Any, order: Union[np.ndarray, None]) -> Any:
+        """Reorders the values of the points of a layer.
+
+        Arguments:
+            values (:obj:`Any`): An array (permuted along its first axis), list or label store
+            order (:obj:`Union[np.ndarray, None]`): The original indices in the new order or None to keep the order
+
+        Returns:
+            :obj:`Any`: The reordered values
+        """
+        if order is None:
+            return values
+
+        if isinstance(values, np.ndarray):
+            return values[order]
+
+        return [values[i] for i in order]
+
+    @staticmethod
+    def inverse_permutation(order: np.ndarray) -> np.ndarray:
+        """Gets the inverse of a permutation, i.e. the new index of each original index.
+
+        Arguments:
+            order (:obj:`np.ndarray`): The original indices in the new order
+
+        Returns:
+            :obj:`np.ndarray`: The new indices by original index
+        """
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[order] = np.arange(len(order))
+
+        return inverse
+
+    @staticmethod
+    def file_equals(path: str, text: str) -> bool:
+        """Checks whether a file exists and contains a text.
+
+        Arguments:
+            path (:obj:`str`): The path of the file
+            text (:obj:`str`): The text
+
+        Returns:
+            :obj:`bool`: Whether the file contains exactly the text
+        """
+        try:
+            if os.path.getsize(path) != len(text.encode()):
+                return False
+
+            with open(path, "r") as f:
+                return f.read() == text
+        except OSError:
+            return False
+
     @staticmethod
     def in_notebook() -> bool:
         """Checks whether the code is running in an ipython notebook.
@@ -1117,22 +2208,68 @@ class Faerun(object):
             return False
 
     @staticmethod
-    def create_categories(values: List[str]) -> Tuple[List[Tuple[int, str]], List[int]]:
+    def create_categories(
+        values: Union[List[str], np.ndarray],
+        as_array: bool = False,
+        missing_label: str = "Missing",
+    ) -> Tuple[List[Tuple[int, str]], Union[List[int], np.ndarray]]:
         """Creates a object which can be used as legend_labels and a list of
-        the values as integers (after mapping strings to integers).
+        the values as integers (after mapping strings to integers). Values are
+        encoded in a single vectorized pass. The codes of pandas categoricals are
+        used as they are, and missing values (code -1) are mapped to an additional
+        category labeled missing_label.
 
             Arguments:
-                values (:obj:`List[str]`): A list of strings
+                values (:obj:`List[str]` or :obj:`np.ndarray`): A list of strings, a pandas categorical or a categorical pandas Series
+
+            Keyword Arguments:
+                as_array (:obj:`bool`, optional): Whether to return the integers as an array of the smallest unsigned integer type able to hold all codes (without copying the codes of pandas categoricals if possible) instead of a list
+                missing_label (:obj:`str`, optional): The legend label of missing values of pandas categoricals
 
             Returns:
-                :obj:`Tuple[List[Tuple[int, str]], List[int]]`: A legend_labels object and a list of integers.
+                :obj:`Tuple[List[Tuple[int, str]], Union[List[int], np.ndarray]]`: A legend_labels object and a list (or an array) of integers.
         """
-        string_map = {}
-        for i, value in enumerate(sorted(set(values))):
-            string_map[value] = i
+        if hasattr(values, "cat"):
+            values = values.cat
+
+        if hasattr(values, "categories") and hasattr(values, "codes"):
+            categories = values.categories.tolist()
+            codes = np.asarray(values.codes)
+
+            # Negative codes would index the palette from its end
+            if np.any(codes < 0):
+                codes = np.where(codes < 0, len(categories), codes)
+                categories.append(missing_label)
+
+            dtype = Faerun.index_dtype(len(categories))
+            if codes.dtype.itemsize == dtype.itemsize:
+                codes = codes.view(dtype)
+            else:
+                codes = codes.astype(dtype)
+        else:
+            categories, codes = np.unique(np.asarray(values), return_inverse=True)
+            categories = categories.tolist()
+            codes = codes.reshape(-1).astype(Faerun.index_dtype(len(categories)))
+
+        legend_labels = list(enumerate(categories))
+
+        if not as_array:
+            codes = codes.tolist()
 
-        legend_labels = []
-        for key, value in string_map.items():
-            legend_labels.append((value, key))
+        return (legend_labels, codes)
+
+    @staticmethod
+    def index_dtype(n: int) -> np.dtype:
+        """Gets the smallest unsigned integer type that can hold the indices 0 to n - 1.
+
+        Arguments:
+            n (:obj:`int`): The number of indices
+
+        Returns:
+            :obj:`np.dtype`: The integer type (uint8, uint16 or uint32)
+        """
+        for dtype in [np.uint8, np.uint16, np.uint32]:
+            if n <= np.iinfo(dtype).max + 1:
+                return np.dtype(dtype)
 
-        return (legend_labels, [string_map[s] for s in values])
+        return np.dtype(np.uint64)
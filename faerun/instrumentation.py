@@ -0,0 +1,227 @@
+"""
+instrumentation.py
+====================================
+A module for timing the stages of faerun exports.
+"""
+
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+
+class StageRecord:
+    """The measurements of a single stage of an export. Stages can be nested, in which
+    case the time of a stage includes the time of the stages within it, and its
+    exclusive time does not."""
+
+    __slots__ = [
+        "stage",
+        "layer",
+        "items",
+        "bytes",
+        "seconds",
+        "exclusive_seconds",
+        "peak_bytes",
+        "parent",
+    ]
+
+    def __init__(self, stage: str, layer: Optional[str] = None, items: int = None):
+        self.stage = stage
+        self.layer = layer
+        self.items = items
+        self.bytes = None
+        self.seconds = None
+        self.exclusive_seconds = None
+        self.peak_bytes = None
+        self.parent = None
+
+    def to_dict(self) -> Dict:
+        """Returns the measurements as a dict.
+
+        Returns:
+            :obj:`Dict`: The measurements
+        """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class _Stage:
+    def __init__(self, profiler: "ExportProfiler", record: StageRecord):
+        self.profiler = profiler
+        self.record = record
+        self.start = None
+        self.memory_start = None
+        self.child_peak = 0
+        self.child_seconds = 0.0
+
+    def __enter__(self) -> StageRecord:
+        if self.profiler.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.profiler._started_tracing = True
+
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+
+        return self.record
+
+    def __exit__(self, *exc) -> None:
+        self.record.seconds = time.perf_counter() - self.start
+        self.record.exclusive_seconds = self.record.seconds - self.child_seconds
+        self.profiler._stack.pop()
+
+        if self.profiler._stack:
+            parent = self.profiler._stack[-1]
+            parent.child_seconds += self.record.seconds
+            self.record.parent = parent.record.stage
+
+        if self.profiler.memory:
+            # Nested stages reset the peak, so their peaks are passed on
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            self.record.peak_bytes = peak - self.memory_start
+
+            if self.profiler._stack:
+                parent = self.profiler._stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+            elif self.profiler._started_tracing:
+                tracemalloc.stop()
+                self.profiler._started_tracing = False
+
+        self.profiler.records.append(self.record)
+
+        if self.profiler.callback is not None:
+            self.profiler.callback(self.record)
+
+
+class _NullStage:
+    """Returned when instrumentation is disabled, so that stages cost (next to) nothing"""
+
+    def __init__(self):
+        self.record = StageRecord("")
+
+    def __enter__(self) -> StageRecord:
+        return self.record
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class ExportProfiler:
+    """Collects the timings, item counts, output sizes and (optionally) memory peaks
+    of the stages of faerun exports, per stage and layer."""
+
+    def __init__(
+        self, callback: Callable[[StageRecord], None] = None, memory: bool = False
+    ):
+        """Constructor for ExportProfiler.
+
+        Keyword Arguments:
+            callback (:obj:`Callable[[StageRecord], None]`, optional): A function called with the record of each finished stage (e.g. to update a progress bar)
+            memory (:obj:`bool`, optional): Whether to record the peak memory allocated during each stage using tracemalloc. Slows down the export
+        """
+        self.callback = callback
+        self.memory = memory
+        self.records: List[StageRecord] = []
+        self._stack = []
+        self._started_tracing = False
+
+    def stage(
+        self, stage: str, layer: Optional[str] = None, items: int = None
+    ) -> _Stage:
+        """Creates a context manager measuring a stage. The bytes produced by the
+        stage can be set on the record returned by the context manager.
+
+        Arguments:
+            stage (:obj:`str`): The name of the stage
+
+        Keyword Arguments:
+            layer (:obj:`str`, optional): The name of the layer processed in this stage
+            items (:obj:`int`, optional): The number of items (e.g. data points) processed in this stage
+
+        Returns:
+            :obj:`_Stage`: The context manager returning the :obj:`StageRecord`
+        """
+        return _Stage(self, StageRecord(stage, layer, items))
+
+    def totals(self) -> Dict[str, Dict]:
+        """Sums up the measurements per stage.
+
+        Returns:
+            :obj:`Dict[str, Dict]`: The number of calls, seconds (including nested stages), exclusive seconds, items, bytes and the largest peak per stage
+        """
+        totals = {}
+
+        for record in self.records:
+            total = totals.setdefault(
+                record.stage,
+                {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "exclusive_seconds": 0.0,
+                    "items": 0,
+                    "bytes": 0,
+                    "peak_bytes": None,
+                },
+            )
+            total["calls"] += 1
+            total["seconds"] += record.seconds
+            total["exclusive_seconds"] += record.exclusive_seconds
+            total["items"] += record.items or 0
+            total["bytes"] += record.bytes or 0
+
+            if record.peak_bytes is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, record.peak_bytes)
+
+        return totals
+
+    def summary(self) -> str:
+        """Creates a report of the time spent in each stage, sorted by exclusive time.
+        The percentages are the exclusive time of each stage (without the stages
+        nested within it) relative to the time of the outermost stages, so they add up
+        to 100%.
+
+        Returns:
+            :obj:`str`: The report
+        """
+        totals = self.totals()
+        total_seconds = (
+            sum(record.seconds for record in self.records if record.parent is None)
+            or 1.0
+        )
+
+        lines = [
+            "{:<16} {:>6} {:>10} {:>10} {:>7} {:>12} {:>14} {:>14}".format(
+                "stage",
+                "calls",
+                "seconds",
+                "exclusive",
+                "%",
+                "items",
+                "bytes",
+                "peak bytes",
+            )
+        ]
+
+        for stage, total in sorted(
+            totals.items(), key=lambda item: item[1]["exclusive_seconds"], reverse=True
+        ):
+            lines.append(
+                "{:<16} {:>6} {:>10.4f} {:>10.4f} {:>6.1f}% {:>12} {:>14} {:>14}".format(
+                    stage,
+                    total["calls"],
+                    total["seconds"],
+                    total["exclusive_seconds"],
+                    100.0 * total["exclusive_seconds"] / total_seconds,
+                    total["items"],
+                    total["bytes"],
+                    "" if total["peak_bytes"] is None else total["peak_bytes"],
+                )
+            )
+
+        return "\n".join(lines)
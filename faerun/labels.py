@@ -0,0 +1,149 @@
+"""
+labels.py
+====================================
+A module for formatting the labels and links of data points once, when the data is
+built, instead of calling the formatters whenever a label is requested.
+"""
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from faerun.store import LabelStore
+
+
+def default_label_formatter(label: str, index: int, name: str) -> str:
+    """The default label formatter, which keeps the label up to the first '__'.
+
+    Arguments:
+        label (:obj:`str`): The label
+        index (:obj:`int`): The original index of the data point
+        name (:obj:`str`): The name of the layer
+
+    Returns:
+        :obj:`str`: The formatted label
+    """
+    return label.split("__")[0]
+
+
+def default_link_formatter(label: str, index: int, name: str) -> str:
+    """The default link formatter, which returns no link.
+
+    Arguments:
+        label (:obj:`str`): The label
+        index (:obj:`int`): The original index of the data point
+        name (:obj:`str`): The name of the layer
+
+    Returns:
+        :obj:`str`: An empty string
+    """
+    return ""
+
+
+def format_labels(
+    data: Dict,
+    name: str,
+    label_formatter: Callable[[str, int, str], str] = None,
+    link_formatter: Callable[[str, int, str], str] = None,
+    max_workers: int = None,
+    chunk_size: int = 65536,
+) -> Dict[str, LabelStore]:
+    """Formats the labels and links of all data points of a scatter layer. The
+    formatters are called with the same arguments as when hosting (see
+    :obj:`faerun.host`), in chunks spread over a pool of processes. Formatters that
+    cannot be pickled (e.g. lambdas) are called in this process. The result is added
+    to the layer, e.g. data[name].update(format_labels(data, name, formatter)),
+    before the data is saved, and the server then looks up the formatted labels and
+    links instead of calling the formatters.
+
+    Arguments:
+        data (:obj:`Dict`): Faerun data, as returned by :obj:`faerun.Faerun.create_python_data` or :obj:`faerun.load_data`
+        name (:obj:`str`): The name of the scatter layer
+
+    Keyword Arguments:
+        label_formatter (:obj:`Callable[[str, int, str], str]`, optional): A function formatting a label given the label, the original index of the data point and the name of the layer. Defaults to :obj:`default_label_formatter`
+        link_formatter (:obj:`Callable[[str, int, str], str]`, optional): A function formatting a link, like the label formatter. Defaults to no links
+        max_workers (:obj:`int`, optional): The maximum number of processes. Defaults to the default of :obj:`concurrent.futures.ProcessPoolExecutor`
+        chunk_size (:obj:`int`, optional): The number of labels formatted at once by a process
+
+    Returns:
+        :obj:`Dict[str, LabelStore]`: The formatted labels ("formatted_labels") and links ("links"), in the order of the labels
+    """
+    layer = data[name]
+    labels = layer["labels"]
+    n = len(labels)
+    chunk_size = max(1, chunk_size)
+
+    if label_formatter is None:
+        label_formatter = default_label_formatter
+
+    # Empty links are not worth calling a function for
+    if link_formatter is default_link_formatter:
+        link_formatter = None
+
+    # The formatters are called with the original indices of the data points
+    indices = np.asarray(layer.get("permutation", np.arange(n)), dtype=np.int64)
+
+    chunks = (
+        (
+            label_formatter,
+            link_formatter,
+            name,
+            _take(labels, start, min(start + chunk_size, n)),
+            indices[start : start + chunk_size].tolist(),
+        )
+        for start in range(0, n, chunk_size)
+    )
+
+    if (
+        n <= chunk_size
+        or max_workers == 1
+        or not _picklable(label_formatter, link_formatter)
+    ):
+        results = list(map(_format_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_format_chunk, chunks))
+
+    formatted = LabelStore.from_list(
+        label for chunk_labels, _ in results for label in chunk_labels
+    )
+
+    if link_formatter is None:
+        links = LabelStore(np.zeros(0, dtype=np.uint8), np.zeros(n + 1, np.int64))
+    else:
+        links = LabelStore.from_list(
+            link for _, chunk_links in results for link in chunk_links
+        )
+
+    return {"formatted_labels": formatted, "links": links}
+
+
+def _format_chunk(
+    chunk: Tuple[Callable, Callable, str, List[str], List[int]],
+) -> Tuple[List[str], List[str]]:
+    label_formatter, link_formatter, name, labels, indices = chunk
+    formatted = list(map(label_formatter, labels, indices, [name] * len(labels)))
+
+    if link_formatter is None:
+        return formatted, []
+
+    return formatted, list(map(link_formatter, labels, indices, [name] * len(labels)))
+
+
+def _take(labels: List[str], start: int, end: int) -> List[str]:
+    if isinstance(labels, LabelStore):
+        return labels.take(np.arange(start, end))
+
+    return [str(label) for label in labels[start:end]]
+
+
+def _picklable(*values: Callable) -> bool:
+    try:
+        pickle.dumps(values)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+
+    return True
@@ -0,0 +1,249 @@
+"""
+metrics.py
+====================================
+A module for collecting request metrics of the faerun web server and exposing them
+in the Prometheus text exposition format.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from faerun.store import LabelStore
+
+# The default latency buckets of the Prometheus client libraries (in seconds)
+LATENCY_BUCKETS = [
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+]
+
+
+class Histogram:
+    """A histogram of observed values with fixed bucket boundaries"""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        """Constructor for Histogram.
+
+        Keyword Arguments:
+            buckets (:obj:`List[float]`, optional): The (sorted) upper bounds of the buckets
+        """
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Adds a value to the histogram.
+
+        Arguments:
+            value (:obj:`float`): The observed value
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Gets the cumulative counts per bucket, as used by Prometheus.
+
+        Returns:
+            :obj:`List[Tuple[str, int]]`: The upper bounds (including "+Inf") and the number of values less or equal
+        """
+        result = []
+        total = 0
+
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            total += count
+            result.append((str(bound), total))
+
+        return result
+
+
+class Metrics:
+    """Thread-safe collection of the request counts, latencies, bytes served and cache
+    hit rates per endpoint, as well as the memory used by each layer."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.latencies = {}
+        self.bytes_served = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self.layer_bytes = {}
+
+    def observe_request(
+        self, endpoint: str, seconds: float, size: int, error: bool = False
+    ) -> None:
+        """Records a finished request.
+
+        Arguments:
+            endpoint (:obj:`str`): The name of the endpoint
+            seconds (:obj:`float`): The time needed to handle the request
+            size (:obj:`int`): The size of the response body in bytes
+
+        Keyword Arguments:
+            error (:obj:`bool`, optional): Whether the request failed
+        """
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_served[endpoint] = self.bytes_served.get(endpoint, 0) + size
+
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+            if endpoint not in self.latencies:
+                self.latencies[endpoint] = Histogram()
+
+            self.latencies[endpoint].observe(seconds)
+
+    def observe_cache(self, cache: str, hit: bool) -> None:
+        """Records a cache lookup.
+
+        Arguments:
+            cache (:obj:`str`): The name of the cache
+            hit (:obj:`bool`): Whether the value was found in the cache
+        """
+        counter = self.cache_hits if hit else self.cache_misses
+
+        with self.lock:
+            counter[cache] = counter.get(cache, 0) + 1
+
+    def set_layer_bytes(self, layer: str, size: int) -> None:
+        """Sets the memory used by a layer.
+
+        Arguments:
+            layer (:obj:`str`): The name of the layer
+            size (:obj:`int`): The number of bytes used by the data of the layer
+        """
+        with self.lock:
+            self.layer_bytes[layer] = size
+
+    def render(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format.
+
+        Returns:
+            :obj:`str`: The metrics
+        """
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append("# HELP " + name + " " + description)
+            lines.append("# TYPE " + name + " " + kind)
+            for suffix, labels, value in samples:
+                lines.append(name + suffix + _labels(labels) + " " + str(value))
+
+        with self.lock:
+            metric(
+                "faerun_requests_total",
+                "counter",
+                "Number of handled requests.",
+                [("", {"endpoint": k}, v) for k, v in sorted(self.requests.items())],
+            )
+            metric(
+                "faerun_request_errors_total",
+                "counter",
+                "Number of failed requests.",
+                [("", {"endpoint": k}, v) for k, v in sorted(self.errors.items())],
+            )
+
+            samples = []
+            for endpoint, histogram in sorted(self.latencies.items()):
+                for bound, count in histogram.cumulative():
+                    samples.append(
+                        ("_bucket", {"endpoint": endpoint, "le": bound}, count)
+                    )
+                samples.append(("_sum", {"endpoint": endpoint}, histogram.sum))
+                samples.append(("_count", {"endpoint": endpoint}, histogram.count))
+
+            metric(
+                "faerun_request_duration_seconds",
+                "histogram",
+                "Time needed to handle a request.",
+                samples,
+            )
+            metric(
+                "faerun_response_bytes_total",
+                "counter",
+                "Number of bytes served.",
+                [
+                    ("", {"endpoint": k}, v)
+                    for k, v in sorted(self.bytes_served.items())
+                ],
+            )
+            metric(
+                "faerun_cache_hits_total",
+                "counter",
+                "Number of cache hits.",
+                [("", {"cache": k}, v) for k, v in sorted(self.cache_hits.items())],
+            )
+            metric(
+                "faerun_cache_misses_total",
+                "counter",
+                "Number of cache misses.",
+                [("", {"cache": k}, v) for k, v in sorted(self.cache_misses.items())],
+            )
+            metric(
+                "faerun_layer_bytes",
+                "gauge",
+                "Number of bytes used by the data of a layer (including memory-mapped data).",
+                [("", {"layer": k}, v) for k, v in sorted(self.layer_bytes.items())],
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+def data_size(value: Any) -> int:
+    """Estimates the number of bytes used by (nested) faerun data.
+
+    Arguments:
+        value (:obj:`Any`): The data, e.g. a layer as returned by :obj:`faerun.Faerun.create_python_data`
+
+    Returns:
+        :obj:`int`: The number of bytes used by arrays, label stores, strings and bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    if isinstance(value, LabelStore):
+        return value.buffer.nbytes + value.offsets.nbytes
+
+    if isinstance(value, (str, bytes)):
+        return len(value)
+
+    if isinstance(value, dict):
+        return sum(data_size(v) for v in value.values())
+
+    if isinstance(value, (list, tuple)):
+        return sum(data_size(v) for v in value)
+
+    return 0
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    escaped = [
+        k
+        + '="'
+        + str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        + '"'
+        for k, v in labels.items()
+    ]
+
+    return "{" + ",".join(escaped) + "}"
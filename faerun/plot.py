@@ -1,9 +1,29 @@
-from cProfile import label
-from typing import Union, List, Iterable, Optional
-from tmap.core import TMAPEmbedding
+from typing import TYPE_CHECKING, Union, List, Iterable, Optional
+import numpy as np
 from faerun import Faerun
 from matplotlib.colors import Colormap
 
+if TYPE_CHECKING:
+    from tmap.core import TMAPEmbedding
+
+
+def _to_array(values: Iterable, dtype: type = None) -> np.ndarray:
+    # tmap vectors (and other objects supporting the buffer protocol) are wrapped
+    # without copying, everything else is converted once instead of being iterated
+    # element by element on every pass over the data
+    if isinstance(values, np.ndarray):
+        return np.ascontiguousarray(values)
+
+    try:
+        return np.ascontiguousarray(memoryview(values))
+    except TypeError:
+        pass
+
+    if dtype is not None and not isinstance(values, (list, tuple)):
+        return np.fromiter(values, dtype=dtype, count=len(values))
+
+    return np.asarray(values)
+
 
 class FaerunPlot:
     def __init__(
@@ -41,7 +61,7 @@ class FaerunPlot:
         legend_title: str = "",
         name: Optional[str] = None,
     ) -> str:
-        multiple_c = any(isinstance(el, list) for el in c)
+        multiple_c = len(c) > 0 and isinstance(c[0], (list, np.ndarray))
         n_c = 1
 
         if multiple_c:
@@ -56,14 +76,19 @@ class FaerunPlot:
         if name is None:
             name = "Series" + str(len(self.f.scatters) + 1)
 
+        if multiple_c:
+            c = [_to_array(series) for series in c]
+        else:
+            c = _to_array(c)
+
         data = {
-            "x": x,
-            "y": y,
+            "x": _to_array(x, np.float64),
+            "y": _to_array(y, np.float64),
             "c": c,
         }
 
         if z is not None:
-            data["z"] = z
+            data["z"] = _to_array(z, np.float64)
 
         if labels is not None:
             data["labels"] = labels
@@ -113,12 +138,15 @@ class FaerunPlot:
 
     def add_tree(self, target: str, s: Iterable, t: Iterable, color: str = "#666666"):
         self.f.add_tree(
-            target + "Tree", {"from": s, "to": t}, point_helper=target, color=color
+            target + "Tree",
+            {"from": _to_array(s, np.int64), "to": _to_array(t, np.int64)},
+            point_helper=target,
+            color=color,
         )
 
     def add_tmap_series(
         self,
-        tmap_embedding: TMAPEmbedding,
+        tmap_embedding: "TMAPEmbedding",
         c: Union[List, List[List]],
         z: Optional[Iterable] = None,
         labels: Optional[List] = None,
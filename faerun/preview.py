@@ -0,0 +1,142 @@
+"""
+preview.py
+====================================
+A module for rendering preview images of faerun data without a browser, e.g. to show
+while the data of a large plot is loading or as the image of shared links.
+"""
+
+import struct
+import zlib
+from typing import Dict
+
+import numpy as np
+from matplotlib.colors import to_rgb
+
+from faerun.density import dequantize
+
+
+def render_preview(
+    data: Dict,
+    width: int = 1024,
+    height: int = 1024,
+    background: str = "#ffffff",
+    point_size: int = 1,
+    margin: float = 0.05,
+) -> np.ndarray:
+    """Renders the scatter layers of faerun data as seen from the front by splatting
+    each point onto a square of pixels. The color of a pixel is the mean color of the
+    points of the topmost layer covering it.
+
+    Arguments:
+        data (:obj:`Dict`): Faerun data, as returned by :obj:`faerun.Faerun.create_python_data` or :obj:`faerun.load_data`
+
+    Keyword Arguments:
+        width (:obj:`int`, optional): The width of the image in pixels
+        height (:obj:`int`, optional): The height of the image in pixels
+        background (:obj:`str`, optional): The background color
+        point_size (:obj:`int`, optional): The width and height of a point in pixels
+        margin (:obj:`float`, optional): The margin around the points as a fraction of the image size
+
+    Returns:
+        :obj:`np.ndarray`: The image as an array of shape (height, width, 3) of uint8
+    """
+    image = np.empty((height * width, 3), dtype=np.uint8)
+    image[:] = np.round(np.array(to_rgb(background)) * 255.0)
+
+    layers = [layer for layer in data.values() if layer["type"] == "scatter"]
+    coords = [dequantize(layer)[:2] for layer in layers]
+
+    points = [(x, y) for x, y in coords if len(x) > 0]
+    if len(points) == 0:
+        return image.reshape(height, width, 3)
+
+    min_x = min(float(x.min()) for x, _ in points)
+    max_x = max(float(x.max()) for x, _ in points)
+    min_y = min(float(y.min()) for _, y in points)
+    max_y = max(float(y.max()) for _, y in points)
+
+    # The points are centered and scaled equally along both axes
+    scale = min(
+        (1.0 - 2.0 * margin) * width / max(max_x - min_x, 1e-9),
+        (1.0 - 2.0 * margin) * height / max(max_y - min_y, 1e-9),
+    )
+    center_x = (min_x + max_x) / 2.0
+    center_y = (min_y + max_y) / 2.0
+
+    for layer, (x, y) in zip(layers, coords):
+        if len(x) == 0:
+            continue
+
+        px = ((x - center_x) * scale + width / 2.0).astype(np.int64)
+        py = ((center_y - y) * scale + height / 2.0).astype(np.int64)
+        rgb = _colors(layer)
+
+        counts = np.zeros(height * width)
+        sums = np.zeros((3, height * width))
+
+        # The pixels are counted by offset, so that only one offset is held in memory
+        lo = -(point_size // 2)
+        for dx in range(lo, lo + point_size):
+            for dy in range(lo, lo + point_size):
+                qx = px + dx
+                qy = py + dy
+                inside = (qx >= 0) & (qx < width) & (qy >= 0) & (qy < height)
+                pixels = (qy * width + qx)[inside]
+
+                counts += np.bincount(pixels, minlength=height * width)
+                for channel in range(3):
+                    sums[channel] += np.bincount(
+                        pixels, weights=rgb[channel][inside], minlength=height * width
+                    )
+
+        covered = counts > 0
+        image[covered] = np.round(sums[:, covered] / counts[covered]).T
+
+    return image.reshape(height, width, 3)
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encodes an RGB image as a PNG file.
+
+    Arguments:
+        image (:obj:`np.ndarray`): The image as an array of shape (height, width, 3) of uint8
+
+    Returns:
+        :obj:`bytes`: The PNG file
+    """
+    height, width, _ = image.shape
+
+    # Every row starts with its filter type, here 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+            _chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)),
+            _chunk(b"IEND", b""),
+        ]
+    )
+
+
+def _colors(layer: Dict) -> np.ndarray:
+    # The colors of the first series, in the range [0, 255]
+    colors = layer["colors"][0]
+
+    if "index" in colors:
+        palette = np.asarray(colors["palette"], dtype=np.float64)
+        return palette[np.asarray(colors["index"])].T
+
+    return np.array([np.asarray(colors[c], dtype=np.float64) for c in "rgb"])
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return b"".join(
+        [
+            struct.pack(">I", len(data)),
+            chunk_type,
+            data,
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF),
+        ]
+    )
@@ -0,0 +1,100 @@
+"""
+search.py
+====================================
+A module for indexing the '__'-separated fields of labels, so that data points can be
+found by the values of their labels quickly.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+from faerun.store import LabelStore
+
+
+class LabelIndex:
+    """An index of the fields of labels, which are separated by '__' (e.g.
+    'smiles__id__name'). The labels are split into fields once, and for each indexed
+    field the (case-insensitive) values are mapped to the positions of the labels that
+    contain them, stored as a CSR structure. Labels consisting of a single field are
+    indexed by their whole label for every field."""
+
+    def __init__(self, labels: Iterable[str], fields: Iterable[int] = (1,)):
+        """Constructor for LabelIndex.
+
+        Arguments:
+            labels (:obj:`Iterable[str]`): The labels (a list or a :obj:`faerun.LabelStore`)
+
+        Keyword Arguments:
+            fields (:obj:`Iterable[int]`, optional): The indices of the fields to index
+        """
+        if isinstance(labels, LabelStore):
+            labels = labels.take(np.arange(len(labels)))
+
+        tokens = [str(label).lower().split("__") for label in labels]
+
+        self.n = len(tokens)
+        self.fields = list(fields)
+        self.terms = {}
+        self.offsets = {}
+        self.positions = {}
+
+        for field in self.fields:
+            terms = {}
+            codes = np.fromiter(
+                (
+                    terms.setdefault(
+                        t[field] if field < len(t) else (t[0] if len(t) == 1 else ""),
+                        len(terms),
+                    )
+                    for t in tokens
+                ),
+                dtype=np.int64,
+                count=self.n,
+            )
+
+            # Positions are sorted by term and, within a term, ascending
+            self.terms[field] = terms
+            self.offsets[field] = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(codes, minlength=len(terms)), out=self.offsets[field][1:]
+            )
+            self.positions[field] = np.argsort(codes, kind="stable").astype(
+                np.int32 if self.n < 2**31 else np.int64
+            )
+
+    def lookup(self, term: str, field: int = None) -> np.ndarray:
+        """Gets the positions of the labels with a value in a field.
+
+        Arguments:
+            term (:obj:`str`): The value (case-insensitive)
+
+        Keyword Arguments:
+            field (:obj:`int`, optional): The index of the field. Defaults to the first indexed field
+
+        Returns:
+            :obj:`np.ndarray`: The ascending positions of the labels
+        """
+        if field is None:
+            field = self.fields[0]
+
+        if field not in self.terms:
+            raise ValueError("Field " + str(field) + " is not indexed.")
+
+        code = self.terms[field].get(term.strip().lower())
+
+        # Labels lacking the field are stored with an empty value, which is not found
+        if code is None or term.strip() == "":
+            return np.zeros(0, dtype=self.positions[field].dtype)
+
+        return self.positions[field][
+            self.offsets[field][code] : self.offsets[field][code + 1]
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the arrays of the index (without the terms)."""
+        return sum(
+            self.offsets[field].nbytes + self.positions[field].nbytes
+            for field in self.fields
+        )
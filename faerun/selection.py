@@ -0,0 +1,218 @@
+"""
+selection.py
+====================================
+A module for selecting data points by the values of their properties and encoding
+selections compactly.
+"""
+
+import base64
+from numbers import Real
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def filter_mask(
+    values: List[np.ndarray], predicates: List[Dict], series_titles: List[str] = None
+) -> np.ndarray:
+    """Evaluates range predicates over the raw values of the series of a layer. A data
+    point is selected if it satisfies all predicates.
+
+    Arguments:
+        values (:obj:`List[np.ndarray]`): The raw values of each series
+        predicates (:obj:`List[Dict]`): The predicates, each a dict containing the "series" (index or title) and a "min" and / or "max" (inclusive) or a list of accepted "values". Predicates with other keys, without constraints or with constraints of a type not matching the series raise a ValueError
+
+    Keyword Arguments:
+        series_titles (:obj:`List[str]`, optional): The titles of the series, to reference series by title
+
+    Returns:
+        :obj:`np.ndarray`: The boolean mask of the selected data points
+    """
+    mask = np.ones(len(values[0]) if values else 0, dtype=bool)
+
+    for predicate in predicates:
+        # Misspelled or missing constraints would otherwise select all data points
+        unknown = set(predicate) - {"series", "min", "max", "values"}
+        if unknown:
+            raise ValueError("Unknown predicate keys: " + ", ".join(sorted(unknown)))
+
+        if "series" not in predicate:
+            raise ValueError('A predicate needs a "series".')
+
+        if all(predicate.get(key) is None for key in ["min", "max", "values"]):
+            raise ValueError('A predicate needs a "min", "max" or "values".')
+
+        series = predicate["series"]
+        if isinstance(series, str):
+            if series_titles is None or series not in series_titles:
+                raise ValueError("Unknown series: " + series)
+            series = series_titles.index(series)
+
+        if int(series) < 0 or int(series) >= len(values):
+            raise ValueError("Unknown series: " + str(series))
+
+        column = values[int(series)]
+
+        for key in ["min", "max"]:
+            if predicate.get(key) is not None:
+                _check_type(column, predicate[key], key)
+
+        if predicate.get("values") is not None:
+            if not isinstance(predicate["values"], list):
+                raise ValueError('"values" needs to be a list.')
+
+            for value in predicate["values"]:
+                _check_type(column, value, "values")
+
+        if predicate.get("min") is not None:
+            mask &= column >= predicate["min"]
+
+        if predicate.get("max") is not None:
+            mask &= column <= predicate["max"]
+
+        if predicate.get("values") is not None:
+            mask &= np.isin(column, predicate["values"])
+
+    return mask
+
+
+def encode_bitset(mask: np.ndarray) -> bytes:
+    """Encodes a selection as a bitset, in which bit i (least significant bit first)
+    is set if data point i is selected.
+
+    Arguments:
+        mask (:obj:`np.ndarray`): The boolean mask of the selected data points
+
+    Returns:
+        :obj:`bytes`: The bitset
+    """
+    return np.packbits(mask, bitorder="little").tobytes()
+
+
+def encode_runs(mask: np.ndarray) -> bytes:
+    """Encodes a selection as the lengths of alternating runs of unselected and
+    selected data points, starting with unselected data points.
+
+    Arguments:
+        mask (:obj:`np.ndarray`): The boolean mask of the selected data points
+
+    Returns:
+        :obj:`bytes`: The run lengths as little-endian uint32
+    """
+    mask = np.asarray(mask, dtype=bool)
+    changes = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    runs = np.diff(np.concatenate([[0], changes, [len(mask)]]))
+
+    if len(mask) > 0 and mask[0]:
+        runs = np.concatenate([[0], runs])
+
+    return runs.astype("<u4").tobytes()
+
+
+def decode_selection(selection: Dict, n: int) -> np.ndarray:
+    """Decodes a selection of data points given as a list of "indices", a list of
+    half-open index "ranges", a base64 encoded "bitset" or base64 encoded "runs" (see
+    :obj:`encode_bitset` and :obj:`encode_runs`).
+
+    Arguments:
+        selection (:obj:`Dict`): The selection
+        n (:obj:`int`): The number of data points
+
+    Returns:
+        :obj:`np.ndarray`: The sorted, unique indices of the selected data points
+    """
+    if "indices" in selection:
+        indices = np.unique(np.asarray(selection["indices"], dtype=np.int64))
+    elif "ranges" in selection:
+        ranges = np.asarray(selection["ranges"], dtype=np.int64).reshape(-1, 2)
+        mask = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(mask, np.clip(ranges[:, 0], 0, n), 1)
+        np.add.at(mask, np.clip(ranges[:, 1], 0, n), -1)
+        indices = np.flatnonzero(np.cumsum(mask[:-1]) > 0)
+    elif "bitset" in selection:
+        bitset = np.frombuffer(_decode_base64(selection["bitset"]), dtype=np.uint8)
+        mask = np.unpackbits(bitset, count=min(n, 8 * len(bitset)), bitorder="little")
+        indices = np.flatnonzero(mask)
+    elif "runs" in selection:
+        runs = np.frombuffer(_decode_base64(selection["runs"]), dtype="<u4")
+        mask = np.repeat(np.arange(len(runs)) % 2 == 1, runs)
+        indices = np.flatnonzero(mask[:n])
+    else:
+        raise ValueError('A selection needs "indices", "ranges", "bitset" or "runs".')
+
+    if len(indices) > 0 and (indices[0] < 0 or indices[-1] >= n):
+        raise ValueError("Selected index out of range.")
+
+    return indices
+
+
+def aggregate(
+    values: np.ndarray, categorical: bool = False, quantiles: List[float] = None
+) -> Dict[str, Any]:
+    """Computes aggregate statistics of the values of the selected data points.
+
+    Arguments:
+        values (:obj:`np.ndarray`): The values of the selected data points
+
+    Keyword Arguments:
+        categorical (:obj:`bool`, optional): Whether to compute a histogram of the categories instead of the quantiles
+        quantiles (:obj:`List[float]`, optional): The quantiles to compute. Defaults to the quartiles
+
+    Returns:
+        :obj:`Dict[str, Any]`: The count, mean, minimum, maximum and either the quantiles or the histogram of the categories
+    """
+    if quantiles is None:
+        quantiles = [0.25, 0.5, 0.75]
+
+    values = np.asarray(values)
+    result = {"count": len(values), "mean": None, "min": None, "max": None}
+
+    if categorical:
+        categories, counts = np.unique(values, return_counts=True)
+        result["histogram"] = [
+            [category, count]
+            for category, count in zip(categories.tolist(), counts.tolist())
+        ]
+    else:
+        result["quantiles"] = [[q, None] for q in quantiles]
+
+    if len(values) == 0:
+        return result
+
+    # Categories are not necessarily numbers, but they are sorted
+    if categorical:
+        result["min"] = categories[0].item()
+        result["max"] = categories[-1].item()
+    else:
+        result["min"] = np.min(values).item()
+        result["max"] = np.max(values).item()
+
+    if values.dtype.kind in "biuf":
+        result["mean"] = float(np.mean(values))
+
+    if not categorical:
+        result["quantiles"] = [
+            [q, float(v)] for q, v in zip(quantiles, np.quantile(values, quantiles))
+        ]
+
+    return result
+
+
+def _check_type(column: np.ndarray, value: Any, key: str):
+    # Comparing numbers to strings fails (or silently selects nothing) in numpy
+    if column.dtype.kind in "biuf":
+        valid = isinstance(value, Real) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, str)
+
+    if not valid:
+        raise ValueError(
+            'Invalid "' + key + '" for a series of type ' + column.dtype.name + "."
+        )
+
+
+def _decode_base64(value: str) -> bytes:
+    try:
+        return base64.b64decode(value, validate=True)
+    except ValueError:
+        raise ValueError("Invalid base64 encoded selection.")
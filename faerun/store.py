@@ -0,0 +1,277 @@
+"""
+store.py
+====================================
+A module for storing faerun data as a directory of binary columns that can be memory-mapped.
+"""
+
+import os
+import pickle
+from typing import Any, Iterable, Iterator, List, Union
+
+import numpy as np
+
+META_FILE = "meta.pickle"
+
+
+class ArrayRef:
+    """A reference to a binary column stored in a faerun data directory"""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+
+class LabelsRef:
+    """A reference to a label store saved in a faerun data directory"""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+
+class LabelStore:
+    """A compact, read-only sequence of strings, stored as a single UTF-8 buffer
+    and an array of offsets into that buffer."""
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        """Constructor for LabelStore.
+
+        Arguments:
+            buffer (:obj:`np.ndarray`): The UTF-8 encoded labels as an array of bytes (uint8)
+            offsets (:obj:`np.ndarray`): The n + 1 offsets of the labels in the buffer
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(
+        self, index: Union[int, slice, Iterable[int]]
+    ) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if isinstance(index, (list, tuple, np.ndarray)):
+            return [self[i] for i in index]
+
+        index = int(index)
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError("Label index out of range.")
+
+        start = self.offsets[index]
+        end = self.offsets[index + 1]
+
+        return self.buffer[start:end].tobytes().decode("utf8")
+
+    def take(self, indices: Iterable[int]) -> List[str]:
+        """Gets many labels at once, which is a lot faster than getting them one by one.
+
+        Arguments:
+            indices (:obj:`Iterable[int]`): The indices of the labels
+
+        Returns:
+            :obj:`List[str]`: The labels
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return []
+
+        starts = np.asarray(self.offsets[indices], dtype=np.int64)
+        lengths = np.asarray(self.offsets[indices + 1], dtype=np.int64) - starts
+        total = int(lengths.sum())
+
+        # The labels are copied into one buffer, each followed by a null byte, and
+        # decoded at once
+        firsts = np.cumsum(lengths) - lengths
+        targets = firsts + np.arange(len(indices))
+        steps = np.arange(total)
+        buffer = np.zeros(total + len(indices), dtype=np.uint8)
+        buffer[steps + np.repeat(targets - firsts, lengths)] = self.buffer[
+            steps + np.repeat(starts - firsts, lengths)
+        ]
+
+        return buffer[:-1].tobytes().decode("utf8").split("\0")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def save(self, path: str) -> None:
+        """Saves the label store to path.bin (the buffer) and path.offsets.npy (the offsets).
+
+        Arguments:
+            path (:obj:`str`): The path (without extension) of the files to write
+        """
+        np.asarray(self.buffer, dtype=np.uint8).tofile(path + ".bin")
+        np.save(path + ".offsets.npy", np.asarray(self.offsets, dtype=np.int64))
+
+    @staticmethod
+    def load(path: str, mmap: bool = True) -> "LabelStore":
+        """Loads a label store saved with :obj:`LabelStore.save`.
+
+        Arguments:
+            path (:obj:`str`): The path (without extension) of the label store
+
+        Keyword Arguments:
+            mmap (:obj:`bool`, optional): Whether to memory-map the files instead of reading them into memory
+
+        Returns:
+            :obj:`LabelStore`: The label store
+        """
+        mmap_mode = "r" if mmap else None
+        offsets = np.load(path + ".offsets.npy", mmap_mode=mmap_mode)
+
+        # Memory-mapping an empty file is not possible
+        if mmap and offsets[-1] > 0:
+            buffer = np.memmap(path + ".bin", dtype=np.uint8, mode="r")
+        else:
+            buffer = np.fromfile(path + ".bin", dtype=np.uint8)
+
+        return LabelStore(buffer, offsets)
+
+    @staticmethod
+    def from_list(labels: Iterable[Any]) -> "LabelStore":
+        """Creates a label store from a list of labels.
+
+        Arguments:
+            labels (:obj:`Iterable[Any]`): The labels (converted to strings)
+
+        Returns:
+            :obj:`LabelStore`: The label store
+        """
+        encoded = [str(label).encode("utf8") for label in labels]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(
+            np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+            out=offsets[1:],
+        )
+
+        return LabelStore(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+
+def save_data(data: dict, path: str) -> None:
+    """Saves faerun data (as returned by :obj:`Faerun.create_python_data`) to a
+    directory. Arrays are saved as .npy files and labels as label stores, so they
+    can be memory-mapped when hosting the data.
+
+    Arguments:
+        data (:obj:`dict`): The faerun data
+        path (:obj:`str`): The path of the directory to write the data to
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = read_meta(path)
+
+    for name, layer in data.items():
+        prefix = layer_prefix(meta, name)
+        meta[name] = {}
+
+        for key, value in layer.items():
+            if key in ["meta", "type"]:
+                meta[name][key] = value
+            else:
+                meta[name][key] = _dump(value, path, prefix + "." + key, key)
+
+    write_meta(meta, path)
+
+
+def load_data(path: str, mmap: bool = True) -> dict:
+    """Loads faerun data from a directory written by :obj:`save_data` or
+    :obj:`faerun.write_chunked`.
+
+    Arguments:
+        path (:obj:`str`): The path of the faerun data directory
+
+    Keyword Arguments:
+        mmap (:obj:`bool`, optional): Whether to memory-map the arrays and labels instead of reading them into memory
+
+    Returns:
+        :obj:`dict`: The faerun data
+    """
+    return _resolve(read_meta(path), path, mmap)
+
+
+def read_meta(path: str) -> dict:
+    """Reads the (unresolved) meta data of a faerun data directory.
+
+    Arguments:
+        path (:obj:`str`): The path of the faerun data directory
+
+    Returns:
+        :obj:`dict`: The meta data, an empty dict if the directory contains no data yet
+    """
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.isfile(meta_path):
+        return {}
+
+    with open(meta_path, "rb") as f:
+        return pickle.load(f)
+
+
+def write_meta(meta: dict, path: str) -> None:
+    """Writes the meta data of a faerun data directory.
+
+    Arguments:
+        meta (:obj:`dict`): The meta data containing references to the binary columns
+        path (:obj:`str`): The path of the faerun data directory
+    """
+    with open(os.path.join(path, META_FILE), "wb+") as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def layer_prefix(meta: dict, name: str) -> str:
+    """Gets the file name prefix of a layer in a faerun data directory.
+
+    Arguments:
+        meta (:obj:`dict`): The meta data of the faerun data directory
+        name (:obj:`str`): The name of the layer
+
+    Returns:
+        :obj:`str`: The prefix of the files belonging to the layer
+    """
+    if name in meta:
+        return str(list(meta).index(name))
+
+    return str(len(meta))
+
+
+def _dump(value: Any, path: str, file_name: str, key: str) -> Any:
+    if isinstance(value, np.ndarray):
+        np.save(os.path.join(path, file_name + ".npy"), value)
+        return ArrayRef(file_name + ".npy")
+
+    if key == "labels" and not isinstance(value, LabelStore):
+        value = LabelStore.from_list(value)
+
+    if isinstance(value, LabelStore):
+        value.save(os.path.join(path, file_name))
+        return LabelsRef(file_name)
+
+    if isinstance(value, dict):
+        return {k: _dump(v, path, file_name + "." + k, k) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [
+            _dump(v, path, file_name + "." + str(i), key) for i, v in enumerate(value)
+        ]
+
+    return value
+
+
+def _resolve(value: Any, path: str, mmap: bool) -> Any:
+    if isinstance(value, ArrayRef):
+        return np.load(
+            os.path.join(path, value.file_name), mmap_mode="r" if mmap else None
+        )
+
+    if isinstance(value, LabelsRef):
+        return LabelStore.load(os.path.join(path, value.file_name), mmap)
+
+    if isinstance(value, dict):
+        return {k: _resolve(v, path, mmap) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [_resolve(v, path, mmap) for v in value]
+
+    return value
@@ -0,0 +1,319 @@
+"""
+tree.py
+====================================
+A module for indexing the edges of tree layers, so that neighborhoods and subtrees
+of data points can be queried quickly.
+"""
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+
+class TreeIndex:
+    """An index of an undirected tree (or forest), stored as a CSR adjacency structure.
+    Each component is rooted at its first vertex (by default the one with the lowest
+    index), and the vertices are
+    additionally stored in depth-first preorder, so that every subtree is a contiguous
+    range of vertices. Jump pointers to ancestors allow finding lowest common ancestors
+    and paths in logarithmic time using linear memory."""
+
+    def __init__(
+        self,
+        sources: Iterable[int],
+        targets: Iterable[int],
+        n: int,
+        order: np.ndarray = None,
+    ):
+        """Constructor for TreeIndex.
+
+        Arguments:
+            sources (:obj:`Iterable[int]`): The first vertex of each edge
+            targets (:obj:`Iterable[int]`): The second vertex of each edge
+            n (:obj:`int`): The number of vertices
+
+        Keyword Arguments:
+            order (:obj:`np.ndarray`, optional): The order of the vertices, in which the roots of the components are chosen. Defaults to the order of the indices
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        dtype = np.int32 if n < 2**31 else np.int64
+
+        # Each edge is stored in both directions
+        ends = np.concatenate([sources, targets])
+        starts = np.concatenate([targets, sources])
+
+        self.n = n
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=n), out=self.indptr[1:])
+        self.indices = starts[np.argsort(ends, kind="stable")].astype(dtype)
+
+        self.parent = np.full(n, -1, dtype=dtype)
+        self.depth = np.full(n, -1, dtype=dtype)
+        self.root = np.arange(n, dtype=dtype)
+        self.size = np.ones(n, dtype=np.int64)
+        self.tin = np.zeros(n, dtype=np.int64)
+        self.preorder = np.zeros(n, dtype=dtype)
+        self.jump = np.arange(n, dtype=dtype)
+
+        if order is None:
+            order = np.arange(n)
+
+        roots, levels = self._traverse(np.asarray(order))
+        self._order(roots, levels)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the index."""
+        return sum(
+            array.nbytes
+            for array in [
+                self.indptr,
+                self.indices,
+                self.parent,
+                self.depth,
+                self.root,
+                self.size,
+                self.tin,
+                self.preorder,
+                self.jump,
+            ]
+        )
+
+    def neighbors(self, vertices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Gets the neighbors of vertices.
+
+        Arguments:
+            vertices (:obj:`np.ndarray`): The vertices
+
+        Returns:
+            :obj:`Tuple[np.ndarray, np.ndarray]`: The neighbors of all vertices (one after the other) and the vertex each neighbor belongs to
+        """
+        starts = self.indptr[vertices]
+        lengths = self.indptr[vertices + 1] - starts
+        total = int(lengths.sum())
+
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        neighbors = self.indices[np.arange(total) + offsets]
+
+        return neighbors, np.repeat(vertices, lengths)
+
+    def neighborhood(self, vertex: int, hops: int) -> np.ndarray:
+        """Gets the vertices within a number of edges of a vertex.
+
+        Arguments:
+            vertex (:obj:`int`): The vertex
+            hops (:obj:`int`): The maximum number of edges between the vertex and its neighbors
+
+        Returns:
+            :obj:`np.ndarray`: The vertices sorted by their distance to the vertex (starting with the vertex itself)
+        """
+        frontier = np.array([vertex], dtype=np.int64)
+        levels = [frontier]
+
+        for _ in range(hops):
+            neighbors, _ = self.neighbors(frontier)
+
+            # In a tree, the only visited neighbors are in the previous level
+            previous = levels[-2] if len(levels) > 1 else levels[-1]
+            frontier = np.unique(neighbors[~np.isin(neighbors, previous)])
+
+            if frontier.size == 0:
+                break
+
+            levels.append(frontier)
+
+        return np.concatenate(levels)
+
+    def subtree(self, vertex: int, exclude: int = None) -> np.ndarray:
+        """Gets the vertices of the subtree rooted at a vertex. If a neighbor to
+        exclude is given, the subtree contains all vertices that are connected to the
+        vertex without passing that neighbor, i.e. the tree is cut at their edge.
+
+        Arguments:
+            vertex (:obj:`int`): The root of the subtree
+
+        Keyword Arguments:
+            exclude (:obj:`int`, optional): A neighbor of the vertex. Defaults to the parent of the vertex
+
+        Returns:
+            :obj:`np.ndarray`: The vertices of the subtree in depth-first preorder
+        """
+        if exclude is None or self.parent[vertex] == exclude:
+            return self.range(vertex)
+
+        if self.parent[exclude] != vertex:
+            raise ValueError("The excluded vertex has to be a neighbor of the vertex.")
+
+        # The subtree is the component of the vertex, except the subtree of the neighbor
+        component = self.range(self.root[vertex])
+        start = self.tin[exclude] - self.tin[self.root[vertex]]
+
+        return np.concatenate(
+            [component[:start], component[start + self.size[exclude] :]]
+        )
+
+    def range(self, vertex: int) -> np.ndarray:
+        """Gets the vertices in the subtree of a vertex (in the rooting of the index).
+
+        Arguments:
+            vertex (:obj:`int`): The vertex
+
+        Returns:
+            :obj:`np.ndarray`: The vertices of the subtree in depth-first preorder
+        """
+        return self.preorder[self.tin[vertex] : self.tin[vertex] + self.size[vertex]]
+
+    def ancestor(self, vertex: int, depth: int) -> int:
+        """Gets the ancestor of a vertex at a depth.
+
+        Arguments:
+            vertex (:obj:`int`): The vertex
+            depth (:obj:`int`): The depth of the ancestor (at most the depth of the vertex)
+
+        Returns:
+            :obj:`int`: The ancestor
+        """
+        while self.depth[vertex] > depth:
+            if self.depth[self.jump[vertex]] >= depth:
+                vertex = self.jump[vertex]
+            else:
+                vertex = self.parent[vertex]
+
+        return int(vertex)
+
+    def lca(self, u: int, v: int) -> int:
+        """Gets the lowest common ancestor of two vertices.
+
+        Arguments:
+            u (:obj:`int`): The first vertex
+            v (:obj:`int`): The second vertex
+
+        Returns:
+            :obj:`int`: The lowest common ancestor or -1 if the vertices are not connected
+        """
+        if self.root[u] != self.root[v]:
+            return -1
+
+        depth = min(self.depth[u], self.depth[v])
+        u = self.ancestor(u, depth)
+        v = self.ancestor(v, depth)
+
+        # The jump pointers only depend on the depth, so both vertices jump equally far
+        while u != v:
+            if self.jump[u] != self.jump[v]:
+                u, v = self.jump[u], self.jump[v]
+            else:
+                u, v = self.parent[u], self.parent[v]
+
+        return int(u)
+
+    def path(self, u: int, v: int) -> np.ndarray:
+        """Gets the vertices on the path between two vertices.
+
+        Arguments:
+            u (:obj:`int`): The first vertex
+            v (:obj:`int`): The second vertex
+
+        Returns:
+            :obj:`np.ndarray`: The vertices on the path from the first to the second vertex (including both) or an empty array if the vertices are not connected
+        """
+        lca = self.lca(u, v)
+        if lca < 0:
+            return np.array([], dtype=np.int64)
+
+        path = np.empty(
+            self.depth[u] + self.depth[v] - 2 * self.depth[lca] + 1, dtype=np.int64
+        )
+
+        # Fill the path from both ends towards the lowest common ancestor
+        i = 0
+        while u != lca:
+            path[i] = u
+            u = self.parent[u]
+            i += 1
+
+        j = len(path) - 1
+        while v != lca:
+            path[j] = v
+            v = self.parent[v]
+            j -= 1
+
+        path[i] = lca
+
+        return path
+
+    def _traverse(self, order: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+        # Isolated vertices are roots of their own, all other components are
+        # traversed breadth-first from their first vertex
+        degree = np.diff(self.indptr)
+        isolated = np.flatnonzero(degree == 0)
+        self.depth[isolated] = 0
+
+        roots = [isolated]
+        levels = []
+        cursor = 0
+
+        while cursor < self.n:
+            unvisited = np.flatnonzero(self.depth[order[cursor : cursor + 65536]] < 0)
+
+            if unvisited.size == 0:
+                cursor += 65536
+                continue
+
+            cursor += unvisited[0]
+            root = order[cursor]
+            roots.append(np.array([root], dtype=np.int64))
+            self.depth[root] = 0
+
+            frontier = np.array([root], dtype=np.int64)
+            while frontier.size > 0:
+                neighbors, vertices = self.neighbors(frontier)
+                mask = self.depth[neighbors] < 0
+                neighbors, first = np.unique(neighbors[mask], return_index=True)
+                vertices = vertices[mask][first]
+
+                if neighbors.size == 0:
+                    break
+
+                self.parent[neighbors] = vertices
+                self.depth[neighbors] = self.depth[vertices] + 1
+                self.root[neighbors] = self.root[vertices]
+
+                levels.append(neighbors)
+                frontier = neighbors
+
+        return np.concatenate(roots), levels
+
+    def _order(self, roots: np.ndarray, levels: List[np.ndarray]) -> None:
+        # The sizes of the subtrees are summed up from the deepest level
+        for level in reversed(levels):
+            np.add.at(self.size, self.parent[level], self.size[level])
+
+        # Components are placed one after the other, the children of a vertex
+        # one after the other right after the vertex
+        self.tin[roots] = np.cumsum(self.size[roots]) - self.size[roots]
+
+        for level in levels:
+            level = level[np.argsort(self.parent[level], kind="stable")]
+            parents = self.parent[level]
+            sizes = self.size[level]
+
+            offsets = np.cumsum(sizes) - sizes
+            first = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+            offsets -= np.repeat(offsets[first], np.diff(np.r_[first, len(level)]))
+
+            self.tin[level] = self.tin[parents] + 1 + offsets
+
+        self.preorder[self.tin] = np.arange(self.n)
+
+        # The jump pointer of a vertex either points to its parent or, if the jumps of
+        # the parent and its target are equally long, twice as far as these jumps
+        for level in levels:
+            parents = self.parent[level]
+            jumps = self.jump[parents]
+            double = (
+                self.depth[parents] - self.depth[jumps]
+                == self.depth[jumps] - self.depth[self.jump[jumps]]
+            ) & (jumps != parents)
+            self.jump[level] = np.where(double, self.jump[jumps], parents)
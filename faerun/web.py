@@ -3,16 +3,37 @@ web.py
 ====================================
 An utility module containing all that's needed to host faerun data visualizations.
 """
+import base64
+import hashlib
 import os
 import pickle
 import sys
-from typing import Callable, IO
+import threading
+import time
+from numbers import Real
+from typing import Callable, IO, Iterator, List, Union
 
 import cherrypy
 import numpy as np
 import ujson
 
 import faerun
+from faerun.cache import DecayingCounter, ExportCache, LRUCache, hash_values
+from faerun.density import dequantize
+from faerun.export import CONTENT_TYPES, export_rows
+from faerun.labels import default_label_formatter, default_link_formatter, format_labels
+from faerun.metrics import Metrics, data_size
+from faerun.preview import encode_png, render_preview
+from faerun.search import LabelIndex
+from faerun.selection import (
+    aggregate,
+    decode_selection,
+    encode_bitset,
+    encode_runs,
+    filter_mask,
+)
+from faerun.store import load_data
+from faerun.tree import TreeIndex
 
 # def index_file(path, out_path):
 #     """Create an index for the faerun data file to provide quick access to labels
@@ -44,9 +65,29 @@ def json_handler(*args, **kwargs):
     return ujson.dumps(value).encode("utf8")
 
 
+def start_request():
+    """ Starts measuring a request and records its metrics once it has finished """
+    cherrypy.serving.request.faerun_start = time.perf_counter()
+    cherrypy.serving.request.hooks.attach("on_end_request", record_request)
+
+
+def record_request():
+    """ Records the metrics of a finished request handled by a FaerunWeb instance """
+    request = cherrypy.serving.request
+    root = request.app.root if request.app is not None else None
+
+    if isinstance(root, FaerunWeb):
+        root.record_request(request, cherrypy.serving.response)
+
+
+cherrypy.tools.faerun_metrics = cherrypy.Tool("on_start_resource", start_request)
+
+
 class FaerunWeb:
     """ A cherrypy controller class for hosting fearun visualizations """
 
+    _cp_config = {"tools.faerun_metrics.on": True}
+
     def __init__(
         self,
         path: str,
@@ -59,12 +100,18 @@ class FaerunWeb:
         legend: str = False,
         legend_title: str = "Legend",
         view: str = "front",
-        search_index: int = 1,
+        search_index: Union[int, List[int]] = 1,
+        slow_request_seconds: float = None,
+        thumbnail_renderer: Callable[[str, int, str], Union[bytes, str]] = None,
+        thumbnail_cache: Union[str, ExportCache] = None,
+        thumbnail_prerender: int = 0,
+        precompute_labels: bool = False,
+        label_workers: int = None,
     ):
         """The constructor for the Faerun web server.
         
         Arguments:
-            path (:obj:`str`) -- The path to the faerun data file
+            path (:obj:`str`) -- The path to the faerun data file or data directory (see :obj:`faerun.save_data`)
         
         Keyword Arguments:
             label_type (:obj:`str`): The type of the labels
@@ -76,50 +123,130 @@ class FaerunWeb:
             legend (:obj:`bool`): Whether or not to show the legend
             legend_title (:obj:`str`): The title of the legend
             view (:obj:`str`): The view type ('front', 'back', 'top', 'bottom', 'right', 'left', or 'free')
-            search_index (:obj:`int`): The index in the label values that is used for searching
+            search_index (:obj:`Union[int, List[int]]`): The index (or indices) of the '__'-separated label values that are indexed for searching (see :obj:`faerun.search.LabelIndex`), the first of which is searched by default
+            slow_request_seconds (:obj:`float`): If set, requests taking longer are logged with their layer name and payload size
+            thumbnail_renderer (:obj:`Callable[[str, int, str], Union[bytes, str]]`): A function rendering the label of a data point as an SVG, PNG or JPEG image, which is then shown on hover instead of rendering the label in the browser
+            thumbnail_cache (:obj:`Union[str, ExportCache]`): A directory or binary :obj:`faerun.cache.ExportCache` in which rendered thumbnails are kept across restarts
+            thumbnail_prerender (:obj:`int`): The number of most viewed data points whose thumbnails are rendered ahead of time (see :obj:`prerender_thumbnails`)
+            precompute_labels (:obj:`bool`): Whether to format all labels and links when the server starts (see :obj:`faerun.format_labels`) instead of on every request. Labels formatted when the data was built are always used
+            label_workers (:obj:`int`): The maximum number of processes formatting labels when they are precomputed
         """
-        if not os.path.isfile(path):
+        if not os.path.isfile(path) and not os.path.isdir(path):
             print("File not found: " + path)
             sys.exit(1)
 
+        # Exports skip the label formatter, unless a custom one is provided
+        self.export_labels_formatted = label_formatter is not None
+
         if label_formatter is None:
-            label_formatter = lambda label, index, name: label.split("__")[0]
+            label_formatter = default_label_formatter
 
         if link_formatter is None:
-            link_formatter = lambda label, index, name: ""
+            link_formatter = default_link_formatter
 
         self.label_type = label_type
         self.theme = theme
         self.title = title
-        self.data = pickle.load(open(path, "rb"))
-        self.ids = {}
+
+        if os.path.isdir(path):
+            self.data = load_data(path)
+        else:
+            self.data = pickle.load(open(path, "rb"))
+
         self.link_formatter = link_formatter
         self.label_formatter = label_formatter
         self.info = info
         self.legend = legend
         self.legend_title = legend_title
         self.view = view
-        self.search_index = search_index
+        self.search_index = (
+            [search_index] if isinstance(search_index, int) else list(search_index)
+        )
+        self.slow_request_seconds = slow_request_seconds
+        self.request_metrics = Metrics()
+        self.stats = LRUCache(256)
+        self.preview_image = None
+        self.preview_lock = threading.Lock()
+
+        # Rendered thumbnails are kept in memory and, optionally, on disk
+        if isinstance(thumbnail_cache, str):
+            thumbnail_cache = ExportCache(thumbnail_cache, binary=True)
+
+        self.thumbnail_renderer = thumbnail_renderer
+        self.thumbnail_cache = thumbnail_cache
+        self.thumbnail_prerender = thumbnail_prerender
+        self.thumbnails = LRUCache(max(1024, thumbnail_prerender))
+        self.views = DecayingCounter(max(4096, 4 * thumbnail_prerender))
+
+        # The colors of all series are kept encoded as bytes, ready to be sent, and
+        # the arrays of the colors are replaced by views of these bytes
+        self.series = {}
+        for name in self.data:
+            if self.data[name]["type"] == "scatter":
+                self.series[name] = []
+                for colors in self.data[name]["colors"]:
+                    encoded = FaerunWeb.encode_series(colors)
+                    colors.update(FaerunWeb.decode_series(colors, encoded))
+                    self.series[name].append(encoded)
 
+        # Spatially ordered layers are queried with the original indices of the points
+        self.permutations = {}
+        self.positions = {}
         for name in self.data:
-            if self.data[name]["type"] != "scatter":
-                continue
+            if "permutation" in self.data[name]:
+                permutation = np.asarray(self.data[name]["permutation"], dtype=np.int64)
+                self.permutations[name] = permutation
+                self.positions[name] = np.empty_like(permutation)
+                self.positions[name][permutation] = np.arange(len(permutation))
 
-            # This is currently implemented for two values:
-            # e.g. smiles and id
-            # seperated by __ in the label field
-            self.ids[name] = []
+        # Index the edges of the trees, so that neighborhoods and subtrees can be queried
+        self.trees = {}
+        for name in self.data:
+            if self.data[name]["type"] == "tree" and "from" in self.data[name]:
+                helper = self.data[name]["meta"]["point_helper"]
+                # Components are rooted at their lowest original index
+                self.trees[name] = TreeIndex(
+                    self.data[name]["from"],
+                    self.data[name]["to"],
+                    len(self.data[helper]["x"]),
+                    self.positions.get(helper),
+                )
 
+        # Formatted labels and links are looked up instead of calling the formatters
+        for name in self.data:
+            layer = self.data[name]
             if (
-                isinstance(self.data[name]["labels"][0], str)
-                and "__" in self.data[name]["labels"][0]
+                precompute_labels
+                and layer["type"] == "scatter"
+                and "formatted_labels" not in layer
             ):
-                for _, label in enumerate(self.data[name]["labels"]):
-                    vals = label.split("__")
-                    self.ids[name].append(vals[1].lower())
-            else:
-                for _, label in enumerate(self.data[name]["labels"]):
-                    self.ids[name].append(str(label).lower())
+                layer.update(
+                    format_labels(
+                        self.data,
+                        name,
+                        label_formatter,
+                        link_formatter,
+                        max_workers=label_workers,
+                    )
+                )
+
+        # The label values (e.g. smiles, id and name, separated by __) are split once
+        # and the searched ones are indexed
+        self.label_indexes = {}
+        for name in self.data:
+            if self.data[name]["type"] == "scatter":
+                self.label_indexes[name] = LabelIndex(
+                    self.data[name]["labels"], self.search_index
+                )
+
+        for name in self.data:
+            size = data_size(self.data[name])
+            if name in self.trees:
+                size += self.trees[name].nbytes
+            if name in self.label_indexes:
+                size += self.label_indexes[name].nbytes
+
+            self.request_metrics.set_layer_bytes(name, size)
 
     @cherrypy.expose
     def index(self, **params) -> IO:
@@ -148,6 +275,8 @@ class FaerunWeb:
         meta["legend"] = self.legend
         meta["legend_title"] = self.legend_title
         meta["view"] = self.view
+        meta["thumbnails"] = self.thumbnail_renderer is not None
+        meta["search_index"] = self.search_index
 
         for name in self.data:
             data_type = self.data[name]["type"]
@@ -161,7 +290,7 @@ class FaerunWeb:
     # @cherrypy.tools.json_out(handler=json_handler)
     @cherrypy.tools.json_in()
     def get_values(self) -> bytes:
-        """Get one set of coordinates or colors (x, y, z, r, g, b) for a faerun layer.
+        """Get one set of coordinates or colors (x, y, z, r, g, b or a palette index) for a faerun layer.
 
         Returns:
             bytes: An array of values encoded as bytes
@@ -175,18 +304,553 @@ class FaerunWeb:
             dtype = np.float32
         elif dtype == "uint8":
             dtype = np.uint8
+        elif dtype == "uint16":
+            dtype = np.uint16
+        elif dtype == "uint32":
+            dtype = np.uint32
+        else:
+            raise cherrypy.HTTPError(400, "Unknown dtype: " + str(dtype))
 
         if coord in self.data[name]:
             return bytes(np.array(self.data[name][coord], dtype=dtype))
         else:
-            if "series" in input_json and coord in ["r", "g", "b"]:
+            # Palette-encoded series contain an index instead of r, g and b
+            if "series" in input_json and coord in ["r", "g", "b", "index"]:
                 series = int(input_json["series"])
-                return bytes(
-                    np.array(self.data[name]["colors"][series][coord], dtype=dtype)
-                )
+                colors = self.data[name]["colors"][series]
+
+                if coord not in colors:
+                    raise cherrypy.HTTPError(
+                        400, "The series does not contain " + coord + " values."
+                    )
+
+                # The colors are views of the encoded series, which are not
+                # converted again if the requested type matches
+                return np.asarray(colors[coord]).astype(dtype, copy=False).tobytes()
             else:
                 return bytes(np.array([], dtype=dtype))
 
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def get_series(self) -> bytes:
+        """Get the colors of a series of a faerun layer in a single request. The
+        response contains the r, g and b values (uint8) one after the other or, for
+        palette-encoded series, the palette indices.
+
+        Returns:
+            bytes: The colors of the series encoded as bytes
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        series = int(input_json["series"])
+
+        return self.series[name][series]
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def get_tile(self) -> bytes:
+        """Get a tile of a density layer (see :obj:`faerun.density.create_density`)
+        by its level and its column (x) and row (y) in that level.
+
+        Returns:
+            bytes: The counts (uint32), mean values (float32, if the mode is "mean"), bins (uint16) and dominant categories (uint8 or uint16, if the mode is "category") or mean colors (r, g and b as uint8, if the mode is "rgb") of the non-empty bins of the tile, all little-endian
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        level = int(input_json["level"])
+
+        if self.data[name]["type"] != "density":
+            raise cherrypy.HTTPError(400, "The layer is not a density layer.")
+
+        if level < 0 or level >= len(self.data[name]["tiles"]):
+            raise cherrypy.HTTPError(400, "Level out of range.")
+
+        tile = self.data[name]["tiles"][level]
+        index = self.tile_index(level, input_json["x"], input_json["y"])
+        start, end = tile["offsets"][index], tile["offsets"][index + 1]
+
+        # Wider types first, so that the client can view every part in place
+        parts = [
+            tile[key][start:end]
+            for key in ["counts", "values", "bins", "index", "r", "g", "b"]
+            if key in tile
+        ]
+
+        return b"".join(
+            np.ascontiguousarray(part, dtype=part.dtype.newbyteorder("<")).tobytes()
+            for part in parts
+        )
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def get_tile_points(self) -> bytes:
+        """Get the points of a tile at the finest level of a density layer, which are
+        drawn instead of the bins once the visible tiles contain few enough points.
+
+        Returns:
+            bytes: The original indices (uint32), the x, y and z coordinates (float32) and the r, g and b values (uint8) of the points, all little-endian
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+
+        if self.data[name]["type"] != "density":
+            raise cherrypy.HTTPError(400, "The layer is not a density layer.")
+
+        meta = self.data[name]["meta"]
+        source = meta["source"]
+        series = int(input_json.get("series", meta["series"]))
+        index = self.tile_index(meta["levels"] - 1, input_json["x"], input_json["y"])
+
+        points = self.data[name]["points"]
+        start, end = points["offsets"][index], points["offsets"][index + 1]
+        positions = np.sort(points["positions"][start:end]).astype(np.int64)
+
+        colors = self.data[source]["colors"][series]
+        if "index" in colors:
+            palette = np.asarray(colors["palette"], dtype=np.uint8)
+            rgb = palette[np.asarray(colors["index"])[positions]].T
+        else:
+            rgb = [np.asarray(colors[c])[positions] for c in "rgb"]
+
+        coords = dequantize(self.data[source], positions)
+
+        return b"".join(
+            [self.encode_indices(source, positions)]
+            + [c.astype("<f4").tobytes() for c in coords]
+            + [np.asarray(c, dtype=np.uint8).tobytes() for c in rgb]
+        )
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def get_neighborhood(self) -> bytes:
+        """Get the indices of the data points within a number of edges of a data point on a tree layer.
+
+        Returns:
+            bytes: The indices (uint32) sorted by their distance to the data point, starting with the data point itself
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        helper = self.data[name]["meta"]["point_helper"]
+        position = self.to_position(helper, int(input_json["id"]))
+
+        neighborhood = self.trees[name].neighborhood(position, int(input_json["hops"]))
+
+        return self.encode_indices(helper, neighborhood)
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def get_subtree(self) -> bytes:
+        """Get the indices of the data points in the subtree of a data point on a tree
+        layer. If the index of a neighboring data point is passed as "exclude", the tree
+        is cut between the two data points instead.
+
+        Returns:
+            bytes: The indices (uint32) of the data points in the subtree, in depth-first order
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        helper = self.data[name]["meta"]["point_helper"]
+        position = self.to_position(helper, int(input_json["id"]))
+
+        exclude = input_json.get("exclude")
+        if exclude is not None:
+            exclude = self.to_position(helper, int(exclude))
+
+        try:
+            subtree = self.trees[name].subtree(position, exclude)
+        except ValueError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        return self.encode_indices(helper, subtree)
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_out(handler=json_handler)
+    @cherrypy.tools.json_in()
+    def get_path(self) -> dict:
+        """Get the data points on the path between two data points on a tree layer.
+
+        Returns:
+            dict: A dict containing the indices and the formatted labels of the data points on the path (empty if the data points are not connected)
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        helper = self.data[name]["meta"]["point_helper"]
+        source = self.to_position(helper, int(input_json["from"]))
+        target = self.to_position(helper, int(input_json["to"]))
+
+        path = self.trees[name].path(source, target)
+        indices = [self.to_index(helper, position) for position in path]
+
+        return {
+            "indices": indices,
+            "labels": [
+                self.format_label(helper, position, index)
+                for position, index in zip(path, indices)
+            ],
+        }
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def filter(self) -> bytes:
+        """Select the data points of a scatter layer by ranges of the raw values of its
+        series (see :obj:`faerun.selection.filter_mask`). Requires data created with
+        keep_values. The number of selected data points is sent in the X-Faerun-Selected header.
+
+        Returns:
+            bytes: The selection by original index, as a bitset or, if the encoding "runs" is requested, as run lengths
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+
+        if "values" not in self.data[name]:
+            raise cherrypy.HTTPError(400, "The layer does not contain raw values.")
+
+        try:
+            mask = filter_mask(
+                self.data[name]["values"],
+                input_json.get("predicates", []),
+                self.data[name]["meta"]["series_title"],
+            )
+        except (ValueError, TypeError, IndexError, KeyError) as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        # The selection is returned in the order of the original indices
+        if name in self.positions:
+            mask = mask[self.positions[name]]
+
+        selected = int(np.count_nonzero(mask))
+        cherrypy.response.headers["X-Faerun-Selected"] = str(selected)
+
+        if input_json.get("encoding", "bitset") == "runs":
+            return encode_runs(mask)
+
+        return encode_bitset(mask)
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_out(handler=json_handler)
+    @cherrypy.tools.json_in()
+    def get_stats(self) -> dict:
+        """Computes aggregate statistics of the raw values of the series of a scatter
+        layer over a selection of data points (see
+        :obj:`faerun.selection.decode_selection` and
+        :obj:`faerun.selection.aggregate`). Requires data created with keep_values.
+        Results are cached, so that repeatedly requesting the same selection is cheap.
+
+        Returns:
+            dict: The number of selected data points and the statistics of each series
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+
+        if "values" not in self.data[name]:
+            raise cherrypy.HTTPError(400, "The layer does not contain raw values.")
+
+        values = self.data[name]["values"]
+        titles = self.data[name]["meta"]["series_title"]
+        categorical = self.data[name]["meta"]["categorical"]
+        series = input_json.get("series", list(range(len(values))))
+        quantiles = input_json.get("quantiles", [0.25, 0.5, 0.75])
+
+        try:
+            series = [titles.index(s) if isinstance(s, str) else int(s) for s in series]
+            indices = decode_selection(input_json.get("selection", {}), len(values[0]))
+        except (ValueError, TypeError) as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        if any(s < 0 or s >= len(values) for s in series):
+            raise cherrypy.HTTPError(400, "Unknown series.")
+
+        if not isinstance(quantiles, list) or not all(
+            isinstance(q, Real) and not isinstance(q, bool) and 0 <= q <= 1
+            for q in quantiles
+        ):
+            raise cherrypy.HTTPError(
+                400, "Quantiles need to be a list of numbers in [0, 1]."
+            )
+
+        # Selections are large, so they are identified by a hash of their indices
+        key = (
+            name,
+            hashlib.blake2b(indices.tobytes(), digest_size=16).hexdigest(),
+            tuple(series),
+            tuple(quantiles),
+        )
+        result = self.stats.get(key)
+        self.request_metrics.observe_cache("stats", result is not None)
+
+        if result is not None:
+            return result
+
+        # Reading the (memory-mapped) values in order of their position touches
+        # every page at most once
+        positions = indices
+        if name in self.positions:
+            positions = np.sort(self.positions[name][indices])
+
+        try:
+            result = {
+                "count": len(indices),
+                "series": [
+                    dict(
+                        aggregate(values[s][positions], categorical[s], quantiles),
+                        title=titles[s],
+                    )
+                    for s in series
+                ],
+            }
+        except ValueError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        self.stats.put(key, result)
+
+        return result
+
+    @cherrypy.expose
+    @cherrypy.config(**{"response.stream": True})
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_in()
+    def export(self) -> IO:
+        """Download the labels (and raw values, if the data was created with keep_values)
+        of a selection of data points of a scatter layer (see
+        :obj:`faerun.selection.decode_selection`, all data points if no selection is
+        given) as 'csv', 'ndjson' or 'parquet'. The file is streamed in chunks (see
+        :obj:`faerun.export.export_rows`), so the memory used does not depend on the
+        size of the selection.
+
+        Returns:
+            IO: The exported file
+        """
+        input_json = cherrypy.request.json
+        name = input_json["name"]
+        file_format = input_json.get("format", "csv")
+
+        if file_format not in CONTENT_TYPES:
+            raise cherrypy.HTTPError(400, "Unknown format: " + str(file_format))
+
+        labels = self.data[name]["labels"]
+        if "selection" in input_json:
+            try:
+                indices = decode_selection(input_json["selection"], len(labels))
+            except (ValueError, TypeError) as e:
+                raise cherrypy.HTTPError(400, str(e))
+        else:
+            indices = np.arange(len(labels))
+
+        # Precomputed labels are taken as they are, without a call per data point
+        label_formatter = None
+        formatted = False
+        if self.export_labels_formatted and "formatted_labels" in self.data[name]:
+            labels = self.data[name]["formatted_labels"]
+            formatted = True
+        elif self.export_labels_formatted:
+            label_formatter = lambda label, index: self.label_formatter(
+                label, index, name
+            )
+
+        values = self.data[name].get("values")
+        titles = self.data[name]["meta"]["series_title"] if values else None
+
+        # Errors have to be raised before the headers of the stream are sent
+        try:
+            rows = export_rows(
+                indices,
+                labels,
+                values,
+                titles,
+                self.positions.get(name),
+                file_format,
+                label_formatter,
+                formatted=formatted,
+            )
+        except ImportError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        cherrypy.response.headers["Content-Type"] = CONTENT_TYPES[file_format]
+        cherrypy.response.headers[
+            "Content-Disposition"
+        ] = 'attachment; filename="{}.{}"'.format(name, file_format)
+        cherrypy.response.headers["X-Faerun-Selected"] = str(len(indices))
+
+        return FaerunWeb.count_bytes(rows)
+
+    @cherrypy.expose
+    def preview(self) -> bytes:
+        """GET a PNG preview of the scatter layers (see
+        :obj:`faerun.preview.render_preview`), which is shown while the data is
+        loading. It is rendered once, when it is first requested.
+
+        Returns:
+            bytes: The PNG image
+        """
+        with self.preview_lock:
+            if self.preview_image is None:
+                background = "#1f1f1f" if self.theme == "dark" else "#ffffff"
+                self.preview_image = encode_png(
+                    render_preview(self.data, background=background)
+                )
+
+        cherrypy.response.headers["Content-Type"] = "image/png"
+        return self.preview_image
+
+    @cherrypy.expose
+    def get_thumbnail(self, **params) -> bytes:
+        """GET the thumbnail of a data point based on the layer name and data point
+        index (the query parameters name and id), as rendered by the thumbnail
+        renderer.
+
+        Returns:
+            bytes: The SVG, PNG or JPEG image
+        """
+        name, index = self.thumbnail_request(params.get("name"), params.get("id"))
+        self.record_view(name, index)
+        image = self.thumbnail(name, index)
+
+        cherrypy.response.headers["Content-Type"] = FaerunWeb.thumbnail_type(image)
+        cherrypy.response.headers["Cache-Control"] = "public, max-age=86400"
+        return image
+
+    @cherrypy.expose
+    @cherrypy.tools.allow(methods=["POST"])
+    @cherrypy.tools.json_out(handler=json_handler)
+    @cherrypy.tools.json_in()
+    def get_thumbnails(self) -> dict:
+        """Get the thumbnails of up to 256 data points at once based on the layer name
+        and a list of data point indices (ids), e.g. to prefetch the thumbnails of a
+        search result.
+
+        Returns:
+            dict: A dict containing the thumbnails as data URLs, in the order of the ids
+        """
+        input_json = cherrypy.request.json
+        ids = input_json["ids"]
+
+        if len(ids) > 256:
+            raise cherrypy.HTTPError(400, "At most 256 thumbnails can be requested.")
+
+        thumbnails = []
+        for index in ids:
+            name, index = self.thumbnail_request(input_json["name"], index)
+            image = self.thumbnail(name, index)
+            thumbnails.append(
+                "data:{};base64,{}".format(
+                    FaerunWeb.thumbnail_type(image),
+                    base64.b64encode(image).decode("ascii"),
+                )
+            )
+
+        return {"thumbnails": thumbnails}
+
+    @cherrypy.expose
+    def metrics(self) -> str:
+        """GET the request metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics
+        """
+        cherrypy.response.headers["Content-Type"] = "text/plain; version=0.0.4"
+        return self.request_metrics.render()
+
+    def record_request(self, request, response) -> None:
+        """Records the duration and response size of a finished request and logs slow requests.
+
+        Arguments:
+            request (:obj:`cherrypy.Request`): The request
+            response (:obj:`cherrypy.Response`): The response
+        """
+        seconds = time.perf_counter() - request.faerun_start
+        endpoint = request.path_info.strip("/") or "index"
+
+        # Keep the number of label values bounded when unknown paths are requested
+        if not getattr(getattr(self, endpoint, None), "exposed", False):
+            endpoint = "other"
+        size = getattr(request, "faerun_bytes", None)
+        if size is None:
+            size = int(response.headers.get("Content-Length", 0) or 0)
+        error = not str(response.status).startswith(("2", "3"))
+
+        self.request_metrics.observe_request(endpoint, seconds, size, error)
+
+        if (
+            self.slow_request_seconds is not None
+            and seconds > self.slow_request_seconds
+        ):
+            payload = getattr(request, "json", None)
+            layer = payload.get("name") if isinstance(payload, dict) else None
+            cherrypy.log(
+                "Slow request: endpoint={} layer={} bytes={} seconds={:.3f}".format(
+                    endpoint, layer, size, seconds
+                ),
+                "FAERUN",
+            )
+
+    @staticmethod
+    def count_bytes(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Counts the bytes of a streamed response, which has no Content-Length, so
+        that they are recorded once the request has finished.
+
+        Arguments:
+            chunks (:obj:`Iterator[bytes]`): The chunks of the response
+
+        Returns:
+            Iterator[bytes]: The same chunks
+        """
+        request = cherrypy.serving.request
+        request.faerun_bytes = 0
+
+        def counted() -> Iterator[bytes]:
+            for chunk in chunks:
+                request.faerun_bytes += len(chunk)
+                yield chunk
+
+        return counted()
+
+    @staticmethod
+    def encode_series(colors: dict) -> bytes:
+        """Encodes the colors of a series as bytes.
+
+        Arguments:
+            colors (:obj:`dict`): The colors of a series (r, g and b or a palette index)
+
+        Returns:
+            bytes: The r, g and b values as uint8 or the little-endian palette indices
+        """
+        if "index" in colors:
+            index = np.asarray(colors["index"])
+            return index.astype(index.dtype.newbyteorder("<")).tobytes()
+
+        return np.concatenate(
+            [np.asarray(colors[channel], dtype=np.uint8) for channel in "rgb"]
+        ).tobytes()
+
+    @staticmethod
+    def decode_series(colors: dict, encoded: bytes) -> dict:
+        """Creates views of the colors of an encoded series (see
+        :obj:`FaerunWeb.encode_series`), so that the colors are not kept twice.
+
+        Arguments:
+            colors (:obj:`dict`): The colors of the series (r, g and b or a palette index)
+            encoded (:obj:`bytes`): The encoded colors of the series
+
+        Returns:
+            dict: The r, g and b values or the palette indices as read-only arrays
+        """
+        if "index" in colors:
+            dtype = np.asarray(colors["index"]).dtype.newbyteorder("<")
+            return {"index": np.frombuffer(encoded, dtype=dtype)}
+
+        n = len(encoded) // 3
+        values = np.frombuffer(encoded, dtype=np.uint8)
+
+        return {channel: values[i * n : (i + 1) * n] for i, channel in enumerate("rgb")}
+
     @cherrypy.expose
     @cherrypy.tools.allow(methods=["POST"])
     @cherrypy.tools.json_out(handler=json_handler)
@@ -200,11 +864,12 @@ class FaerunWeb:
         input_json = cherrypy.request.json
         index = input_json["id"]
         name = input_json["name"]
-        label = self.data[name]["labels"][index]
+        position = self.to_position(name, index)
+        self.record_view(name, index)
 
         return {
-            "label": self.label_formatter(label, index, name),
-            "link": self.link_formatter(label, index, name),
+            "label": self.format_label(name, position, index),
+            "link": self.format_link(name, position, index),
         }
 
     @cherrypy.expose
@@ -213,6 +878,8 @@ class FaerunWeb:
     @cherrypy.tools.json_in()
     def get_index(self) -> list:
         """Get the indices of one or more data point based their labels and layer name.
+        The comma-separated terms are looked up in the label value given by field (one
+        of search_index), by default the first one.
 
         Returns:
             list: A list of label - index pairs
@@ -220,21 +887,254 @@ class FaerunWeb:
         input_json = cherrypy.request.json
         labels = input_json["label"]
         name = input_json["name"]
+        field = input_json.get("field")
+
+        if field is not None and field not in self.search_index:
+            raise cherrypy.HTTPError(400, "Field " + str(field) + " is not indexed.")
 
         labels = str(labels).upper().strip()
 
         results = []
         for label in labels.split(","):
             label = label.strip().lower()
-            try:
-                results.append(
-                    [label, [i for i, v in enumerate(self.ids[name]) if v == label]]
-                )
-            except ValueError:
-                results.append([label, []])
+            positions = self.label_indexes[name].lookup(label, field)
+
+            # Spatially ordered layers store the points in a different order
+            results.append(
+                [label, sorted(self.to_index(name, position) for position in positions)]
+            )
 
         return results
 
+    def format_label(self, name: str, position: int, index: int) -> str:
+        """Gets the formatted label of a data point, which is looked up if the labels
+        were formatted in advance.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            position (:obj:`int`): The position of the data point in the data
+            index (:obj:`int`): The original index of the data point
+
+        Returns:
+            str: The formatted label
+        """
+        layer = self.data[name]
+        if "formatted_labels" in layer:
+            return layer["formatted_labels"][position]
+
+        return self.label_formatter(layer["labels"][position], index, name)
+
+    def format_link(self, name: str, position: int, index: int) -> str:
+        """Gets the formatted link of a data point, which is looked up if the links
+        were formatted in advance.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            position (:obj:`int`): The position of the data point in the data
+            index (:obj:`int`): The original index of the data point
+
+        Returns:
+            str: The formatted link
+        """
+        layer = self.data[name]
+        if "links" in layer:
+            return layer["links"][position]
+
+        return self.link_formatter(layer["labels"][position], index, name)
+
+    def thumbnail_request(self, name: str, index: Union[int, str]) -> tuple:
+        """Validates the layer name and data point index of a thumbnail request.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            index (:obj:`Union[int, str]`): The original index of the data point
+
+        Returns:
+            tuple: The name and index
+        """
+        if self.thumbnail_renderer is None:
+            raise cherrypy.HTTPError(404, "No thumbnail renderer is set.")
+
+        if name not in self.label_indexes:
+            raise cherrypy.HTTPError(400, "Unknown layer: " + str(name))
+
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            raise cherrypy.HTTPError(400, "Invalid index: " + str(index))
+
+        if index < 0 or index >= len(self.data[name]["labels"]):
+            raise cherrypy.HTTPError(400, "Index out of range.")
+
+        return name, index
+
+    def thumbnail(self, name: str, index: int) -> bytes:
+        """Gets the thumbnail of a data point from the memory cache or renders it.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            index (:obj:`int`): The original index of the data point
+
+        Returns:
+            bytes: The image
+        """
+        image = self.thumbnails.get((name, index))
+        self.request_metrics.observe_cache("thumbnails", image is not None)
+
+        if image is None:
+            image = self.render_thumbnail(name, index)
+
+        return image
+
+    def render_thumbnail(self, name: str, index: int) -> bytes:
+        """Renders the thumbnail of a data point, unless it is in the disk cache, and
+        adds it to the memory cache.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            index (:obj:`int`): The original index of the data point
+
+        Returns:
+            bytes: The image
+        """
+        label = self.data[name]["labels"][self.to_position(name, index)]
+        image = None
+
+        # The key depends on the label, so entries of changed data are not reused
+        if self.thumbnail_cache is not None:
+            key = hash_values("thumbnail", self.label_type, name, index, label)
+            image = self.thumbnail_cache.get(key)
+
+        if image is None:
+            image = self.thumbnail_renderer(label, index, name)
+            if isinstance(image, str):
+                image = image.encode("utf8")
+
+            if self.thumbnail_cache is not None:
+                self.thumbnail_cache.put(key, image)
+
+        self.thumbnails.put((name, index), image)
+
+        return image
+
+    def record_view(self, name: str, index: int) -> None:
+        """Counts a view of a data point (its label or thumbnail being requested).
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            index (:obj:`int`): The original index of the data point
+        """
+        if self.thumbnail_renderer is None:
+            return
+
+        self.views.add((name, int(index)))
+
+    def prerender_thumbnails(self, count: int = None) -> int:
+        """Renders the thumbnails of the most viewed data points that are not in the
+        memory cache. When hosting, this runs in the background every minute.
+
+        Keyword Arguments:
+            count (:obj:`int`, optional): The number of most viewed data points. Defaults to thumbnail_prerender
+
+        Returns:
+            int: The number of rendered thumbnails
+        """
+        if self.thumbnail_renderer is None:
+            return 0
+
+        if count is None:
+            count = self.thumbnail_prerender
+
+        rendered = 0
+        for (name, index), _ in self.views.most_common(count):
+            if self.thumbnails.get((name, index)) is None:
+                self.render_thumbnail(name, index)
+                rendered += 1
+
+        return rendered
+
+    @staticmethod
+    def thumbnail_type(image: bytes) -> str:
+        """Gets the content type of a thumbnail from its first bytes.
+
+        Arguments:
+            image (:obj:`bytes`): The image
+
+        Returns:
+            str: The content type
+        """
+        if image.startswith(b"\x89PNG"):
+            return "image/png"
+
+        if image.startswith(b"\xff\xd8"):
+            return "image/jpeg"
+
+        return "image/svg+xml"
+
+    def tile_index(self, level: int, x: int, y: int) -> int:
+        """Gets the index of a tile of a density layer from its column and row.
+
+        Arguments:
+            level (:obj:`int`): The level, which has 2^level tiles per side
+            x (:obj:`int`): The column of the tile
+            y (:obj:`int`): The row of the tile
+
+        Returns:
+            int: The index of the tile
+        """
+        tiles = 1 << level
+        x, y = int(x), int(y)
+
+        if x < 0 or y < 0 or x >= tiles or y >= tiles:
+            raise cherrypy.HTTPError(400, "Tile out of range.")
+
+        return y * tiles + x
+
+    def to_position(self, name: str, index: int) -> int:
+        """Gets the position of a data point in the (possibly spatially ordered) data of a layer.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            index (:obj:`int`): The original index of the data point
+
+        Returns:
+            int: The position of the data point in the data
+        """
+        if name in self.positions:
+            return int(self.positions[name][index])
+
+        return int(index)
+
+    def encode_indices(self, name: str, positions: np.ndarray) -> bytes:
+        """Encodes the original indices of data points as bytes.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            positions (:obj:`np.ndarray`): The positions of the data points in the data
+
+        Returns:
+            bytes: The original indices as little-endian uint32
+        """
+        if name in self.permutations:
+            positions = self.permutations[name][positions]
+
+        return np.asarray(positions, dtype="<u4").tobytes()
+
+    def to_index(self, name: str, position: int) -> int:
+        """Gets the original index of a data point from its position in the (possibly spatially ordered) data of a layer.
+
+        Arguments:
+            name (:obj:`str`): The name of the layer
+            position (:obj:`int`): The position of the data point in the data
+
+        Returns:
+            int: The original index of the data point
+        """
+        if name in self.permutations:
+            return int(self.permutations[name][position])
+
+        return int(position)
+
 
 def host(
     path: str,
@@ -247,12 +1147,18 @@ def host(
     legend: bool = False,
     legend_title: str = "Legend",
     view: str = "front",
-    search_index: int = 1,
+    search_index: Union[int, List[int]] = 1,
+    slow_request_seconds: float = None,
+    thumbnail_renderer: Callable[[str, int, str], Union[bytes, str]] = None,
+    thumbnail_cache: Union[str, ExportCache] = None,
+    thumbnail_prerender: int = 0,
+    precompute_labels: bool = False,
+    label_workers: int = None,
 ):
     """Start a cherrypy server hosting a Faerun visualization.
 
     Arguments:
-        path (:obj:`str`): The path to the fearun data file
+        path (:obj:`str`): The path to the fearun data file or data directory
 
     Keyword Arguments:
         label_type (:obj:`str`): The type of the labels
@@ -264,7 +1170,13 @@ def host(
         legend (:obj:`bool`): Whether or not to show the legend
         legend_title (:obj:`str`): The title of the legend
         view (:obj:`str`): The view type ('front', 'back', 'top', 'bottom', 'right', 'left', or 'free')
-        search_index (:obj:`int`): The index in the label values that is used for searching
+        search_index (:obj:`Union[int, List[int]]`): The index (or indices) of the '__'-separated label values that are indexed for searching, the first of which is searched by default
+        slow_request_seconds (:obj:`float`): If set, requests taking longer are logged with their layer name and payload size
+        thumbnail_renderer (:obj:`Callable[[str, int, str], Union[bytes, str]]`): A function rendering the label of a data point as an SVG, PNG or JPEG image
+        thumbnail_cache (:obj:`Union[str, ExportCache]`): A directory in which rendered thumbnails are kept across restarts
+        thumbnail_prerender (:obj:`int`): The number of most viewed data points whose thumbnails are rendered in the background
+        precompute_labels (:obj:`bool`): Whether to format all labels and links when the server starts instead of on every request
+        label_workers (:obj:`int`): The maximum number of processes formatting labels when they are precomputed
 
     """
 
@@ -272,19 +1184,30 @@ def host(
         {"server.socket_host": "0.0.0.0", "server.socket_port": 8080}
     )
 
-    cherrypy.quickstart(
-        FaerunWeb(
-            path,
-            label_type,
-            theme,
-            title=title,
-            label_formatter=label_formatter,
-            link_formatter=link_formatter,
-            info=info,
-            legend=legend,
-            legend_title=legend_title,
-            view=view,
-            search_index=search_index,
-        )
+    web = FaerunWeb(
+        path,
+        label_type,
+        theme,
+        title=title,
+        label_formatter=label_formatter,
+        link_formatter=link_formatter,
+        info=info,
+        legend=legend,
+        legend_title=legend_title,
+        view=view,
+        search_index=search_index,
+        slow_request_seconds=slow_request_seconds,
+        thumbnail_renderer=thumbnail_renderer,
+        thumbnail_cache=thumbnail_cache,
+        thumbnail_prerender=thumbnail_prerender,
+        precompute_labels=precompute_labels,
+        label_workers=label_workers,
     )
 
+    if thumbnail_renderer is not None and thumbnail_prerender > 0:
+        cherrypy.process.plugins.Monitor(
+            cherrypy.engine, web.prerender_thumbnails, frequency=60
+        ).subscribe()
+
+    cherrypy.quickstart(web)
+
@@ -21,13 +21,12 @@ INSTALL_DEPENDENCIES = [
     "Jinja2>=2.10",
     "ujson>=1.35",
     "numpy>=1.15.4",
-    "colour>=0.1.5",
     "CherryPy>=18.1.0",
     "pandas>=0.24.2",
 ]
 SETUP_DEPENDENCIES = []
 TEST_DEPENDENCIES = ["pytest"]
-EXTRA_DEPENDENCIES = {"dev": ["pytest"]}
+EXTRA_DEPENDENCIES = {"dev": ["pytest"], "parquet": ["pyarrow"]}
 
 if sys.version_info < REQUIRED_PYTHON_VERSION:
     sys.exit("Python >= 3.0 is required. Your version:\n" + sys.version)
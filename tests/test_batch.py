@@ -0,0 +1,82 @@
+import os
+import re
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from faerun import Faerun, plot_batch
+
+
+def create_figures(n=2000, **kwargs):
+    rng = np.random.default_rng(0)
+    x, y = rng.random(n), rng.random(n)
+    figures = {}
+
+    for i in range(3):
+        f = Faerun(**kwargs)
+        f.add_scatter(
+            "S",
+            {
+                "x": x,
+                "y": y,
+                "c": rng.random(n),
+                "labels": ["L" + str(j) for j in range(n)],
+            },
+        )
+        figures["figure" + str(i)] = f
+
+    return figures
+
+
+def script_files(path, file_name):
+    with open(os.path.join(path, file_name + ".html")) as f:
+        return re.findall(r'<script src="(data-[^"]+)"', f.read())
+
+
+def test_figures_share_the_parts_they_have_in_common(tmp_path):
+    figures = create_figures()
+    data_files = plot_batch(figures, str(tmp_path))
+
+    scripts = [script_files(str(tmp_path), file_name) for file_name in figures]
+    assert [files[-1] for files in scripts] == list(data_files.values())
+
+    # The coordinates and labels are shared, the colors and data files are not
+    shared = set.intersection(*[set(files) for files in scripts])
+    assert len(shared) == 2
+    assert len(set().union(*scripts)) == 2 + 2 * len(figures)
+
+    total = sum(
+        entry.stat().st_size
+        for entry in os.scandir(str(tmp_path))
+        if entry.name.endswith(".js")
+    )
+    assert total < sum(len(figure.create_data()) for figure in figures.values())
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="requires node")
+@pytest.mark.parametrize(
+    "options", [{}, {"quantization_bits": 16, "color_encoding": "lut"}]
+)
+def test_assembled_data_equals_plotted_data(tmp_path, options):
+    figures = create_figures(200, **options)
+    plot_batch(figures, str(tmp_path))
+    dump = (
+        "\nconsole.log(JSON.stringify(data, "
+        "(k, v) => ArrayBuffer.isView(v) ? Array.from(v) : v));"
+    )
+
+    for file_name, figure in figures.items():
+        code = ""
+        for script in script_files(str(tmp_path), file_name):
+            with open(os.path.join(str(tmp_path), script)) as f:
+                code += f.read()
+
+        outputs = [
+            subprocess.run(
+                ["node", "-e", js + dump], capture_output=True, text=True, check=True
+            ).stdout
+            for js in [code, figure.create_data()]
+        ]
+        assert outputs[0] == outputs[1]
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from faerun import Faerun
+from faerun.cache import DecayingCounter, ExportCache
+
+
+def test_export_cache_evicts_least_recently_used(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=100, binary=True)
+    for key in "abcd":
+        cache.put(key, bytes(30))
+
+    # a is evicted once d is added, which leaves the cache at 90% of its size
+    assert cache.get("a") is None
+    assert cache.get("c") == bytes(30)
+
+    cache.put("e", bytes(30))
+    cache.put("f", bytes(30))
+    assert cache.get("b") is None and cache.get("d") is None
+    assert cache.get("c") == bytes(30) and cache.get("f") == bytes(30)
+    assert cache.size == sum(
+        entry.stat().st_size for entry in os.scandir(str(tmp_path))
+    )
+
+
+def test_export_cache_scans_only_when_full(tmp_path, monkeypatch):
+    ExportCache(str(tmp_path)).put("a", "x" * 10)
+
+    cache = ExportCache(str(tmp_path), max_bytes=1000)
+    assert cache.size == 10
+
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    for i in range(50):
+        cache.put(str(i), "x" * 10)
+    assert scans == [] and cache.size == 510
+
+    cache.put("large", "x" * 500)
+    assert len(scans) == 1 and cache.size <= 900
+
+
+def test_export_cache_stays_bounded_across_figures(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=200000)
+    data = {"x": np.random.rand(2000), "y": np.random.rand(2000)}
+
+    for i in range(10):
+        f = Faerun(view="front", cache=cache)
+        f.add_scatter("s", dict(data, c=np.random.rand(2000)))
+        expected = f.create_data()
+        assert cache.size <= cache.max_bytes
+
+        # The layer is exported from the cache when plotting again
+        assert f.create_data() == expected
+
+    # Older layers were evicted and the index matches the directory
+    assert len(cache.entries) < 10
+    assert cache.size == sum(
+        entry.stat().st_size for entry in os.scandir(str(tmp_path))
+    )
+
+
+def test_decaying_counter():
+    counter = DecayingCounter(max_keys=10)
+    for i in range(100):
+        counter.add(i)
+        if i % 5 == 0:
+            counter.add("popular")
+
+        assert len(counter) <= 10
+
+    assert counter.most_common(1)[0][0] == "popular"
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from faerun import Faerun, load_data, write_chunked
+from faerun.density import dequantize
+
+N = 1000
+
+
+def create_data(categorical):
+    rng = np.random.default_rng(42)
+    c = rng.integers(0, 5, N) if categorical else rng.random(N)
+
+    return {
+        "x": rng.random(N) * 10 - 5,
+        "y": rng.random(N),
+        "z": rng.random(N),
+        "c": c,
+        "labels": np.array(["label" + str(i) for i in range(N)]),
+    }
+
+
+def to_chunks(data, size=300):
+    return [{k: v[i : i + size] for k, v in data.items()} for i in range(0, N, size)]
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"color_encoding": "palette"},
+        {"color_encoding": "lut"},
+        {"keep_values": True},
+        {"quantization_bits": 12},
+    ],
+)
+def test_write_chunked_matches_in_memory(tmp_path, categorical, options):
+    data = create_data(categorical)
+    colormap = "tab10" if categorical else "viridis"
+
+    f = Faerun(view="front", **options)
+    f.add_scatter("s", dict(data), categorical=categorical, colormap=colormap)
+    expected = f.create_python_data()["s"]
+
+    write_chunked(
+        str(tmp_path),
+        "s",
+        to_chunks(data),
+        categorical=categorical,
+        colormap=colormap,
+        **options
+    )
+    layer = load_data(str(tmp_path))["s"]
+
+    assert sorted(layer) == sorted(expected)
+
+    if "quantization_bits" in options:
+        # The bounds are computed in double instead of single precision
+        step = max(expected["meta"]["quantization"]["step"])
+        for coords, expected_coords in zip(dequantize(layer), dequantize(expected)):
+            assert np.allclose(coords, expected_coords, rtol=0, atol=step * 1.01)
+    else:
+        for coord in ["x", "y", "z"]:
+            assert np.array_equal(layer[coord], expected[coord])
+
+    assert list(layer["labels"]) == list(expected["labels"])
+
+    for colors, expected_colors in zip(layer["colors"], expected["colors"]):
+        assert sorted(colors) == sorted(expected_colors)
+        for key in expected_colors:
+            assert np.array_equal(colors[key], expected_colors[key])
+
+    for values, expected_values in zip(
+        layer.get("values", []), expected.get("values", [])
+    ):
+        assert np.array_equal(values, expected_values)
+
+    for key in ["categorical", "palettes", "lut_bins", "min_c", "max_c"]:
+        assert str(layer["meta"].get(key)) == str(expected["meta"].get(key))
+
+
+def test_write_chunked_data_frames(tmp_path):
+    data = create_data(False)
+    write_chunked(str(tmp_path / "dicts"), "s", to_chunks(data))
+    write_chunked(
+        str(tmp_path / "frames"),
+        "s",
+        lambda: (pd.DataFrame(chunk) for chunk in to_chunks(data, 128)),
+    )
+
+    dicts = load_data(str(tmp_path / "dicts"))["s"]
+    frames = load_data(str(tmp_path / "frames"))["s"]
+
+    for coord in ["x", "y", "z"]:
+        assert np.array_equal(dicts[coord], frames[coord])
+
+    for key in ["r", "g", "b"]:
+        assert np.array_equal(dicts["colors"][0][key], frames["colors"][0][key])
+
+
+def test_write_chunked_rejects_iterators(tmp_path):
+    with pytest.raises(TypeError):
+        write_chunked(str(tmp_path), "s", iter(to_chunks(create_data(False))))
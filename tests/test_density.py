@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from faerun import Faerun
+from faerun.density import create_density, dequantize
+
+
+def dense_grid(tile, tile_size, level, values):
+    # Places the values of the non-empty bins of all tiles of a level in one grid
+    tiles = 1 << level
+    grid = np.zeros((tiles * tile_size, tiles * tile_size), dtype=values.dtype)
+
+    for i in range(tiles * tiles):
+        start, end = tile["offsets"][i], tile["offsets"][i + 1]
+        bins = tile["bins"][start:end].astype(np.int64)
+        rows = (i // tiles) * tile_size + bins // tile_size
+        columns = (i % tiles) * tile_size + bins % tile_size
+        grid[rows, columns] = values[start:end]
+
+    return grid
+
+
+@pytest.mark.parametrize("tile_size, levels", [(4, 3), (16, 2), (1, 4)])
+@pytest.mark.parametrize("quantization_bits", [None, 10])
+def test_density_counts(tile_size, levels, quantization_bits):
+    n = 3000
+    f = Faerun(
+        view="front", color_encoding="palette", quantization_bits=quantization_bits
+    )
+    f.add_scatter(
+        "s",
+        {
+            "x": np.random.rand(n) ** 2,
+            "y": np.random.rand(n),
+            "c": np.arange(n) % 3,
+        },
+        categorical=True,
+        colormap="tab10",
+    )
+    data = f.create_python_data()
+    density = create_density(data, "s", tile_size=tile_size, levels=levels)
+
+    x, y, _ = dequantize(data["s"])
+    x0, y0, extent = density["meta"]["bounds"]
+    categories = np.asarray(data["s"]["colors"][0]["index"], dtype=np.int64)
+
+    for level, tile in enumerate(density["tiles"]):
+        size = tile_size << level
+        bx = np.minimum(((x - x0) * (size / extent)).astype(np.int64), size - 1)
+        by = np.minimum(((y - y0) * (size / extent)).astype(np.int64), size - 1)
+        expected = np.zeros((size, size), dtype=np.int64)
+        np.add.at(expected, (by, bx), 1)
+
+        counts = dense_grid(tile, tile_size, level, tile["counts"].astype(np.int64))
+        assert np.array_equal(counts, expected)
+        assert density["meta"]["max_counts"][level] == expected.max()
+
+        # Ties are broken in favor of the lower category
+        per_category = np.zeros((3, size, size), dtype=np.int64)
+        np.add.at(per_category, (categories, by, bx), 1)
+        dominant = dense_grid(tile, tile_size, level, tile["index"])
+        nonempty = expected > 0
+        assert np.array_equal(dominant[nonempty], per_category.argmax(axis=0)[nonempty])
+
+    assert sum(density["meta"]["tile_points"]) == n
+    assert np.array_equal(np.sort(density["points"]["positions"]), np.arange(n))
@@ -0,0 +1,42 @@
+import csv
+import io
+import sys
+
+import numpy as np
+import pytest
+
+from faerun.export import export_rows
+from faerun.store import LabelStore
+
+LABELS = ["CCO__1__ethanol", "CO__2", "C"]
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(b"".join(chunks).decode("utf8"))))
+
+
+@pytest.mark.parametrize("labels", [LABELS, LabelStore.from_list(LABELS)])
+def test_export_splits_ids_like_the_server(labels):
+    rows = read_csv(export_rows(np.arange(3), labels, chunk_size=2))
+    assert rows == [
+        ["index", "label", "id"],
+        ["0", "CCO", "1"],
+        ["1", "CO", "2"],
+        ["2", "C", ""],
+    ]
+
+
+def test_export_values_in_spatial_order():
+    positions = np.array([2, 0, 1])
+    labels = [LABELS[i] for i in np.argsort(positions)]
+    values = [np.array([10, 20, 30])[np.argsort(positions)]]
+    rows = read_csv(
+        export_rows(np.array([0, 2]), labels, values, ["v"], positions, formatted=True)
+    )
+    assert rows == [["index", "label", "v"], ["0", LABELS[0], "10"], ["2", "C", "30"]]
+
+
+def test_export_parquet_without_pyarrow(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError):
+        export_rows(np.arange(3), LABELS, file_format="parquet")
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from faerun import Faerun
+
+
+def test_create_categories():
+    legend_labels, codes = Faerun.create_categories(["b", "a", "b"])
+    assert legend_labels == [(0, "a"), (1, "b")]
+    assert codes == [1, 0, 1]
+
+    _, codes = Faerun.create_categories(["b", "a", "b"], as_array=True)
+    assert codes.dtype == np.uint8 and codes.tolist() == [1, 0, 1]
+
+
+def test_create_categories_missing_values():
+    values = pd.Series(pd.Categorical(["x", None, "y", "x"]))
+    legend_labels, codes = Faerun.create_categories(values, as_array=True)
+    assert legend_labels == [(0, "x"), (1, "y"), (2, "Missing")]
+    assert codes.dtype == np.uint8 and codes.tolist() == [0, 2, 1, 0]
+
+
+def test_create_categories_keeps_pandas_codes():
+    values = pd.Categorical(["x", "y", "x"])
+    _, codes = Faerun.create_categories(values, as_array=True)
+    assert np.shares_memory(codes, values.codes)
+
+
+def test_map_lut_maps_missing_values_to_the_bad_color():
+    cmap = Faerun.get_cmap("viridis")
+    values = np.array([0.0, 0.5, np.nan, 1.0])
+    index, lut = Faerun.map_lut(cmap, values)
+
+    assert len(lut) == 257 and index[2] == 256
+    assert (lut[index] == Faerun.map_colors(cmap, values)).all()
+
+    index, lut = Faerun.map_lut(cmap, values[[0, 1, 3]])
+    assert len(lut) == 256 and index.dtype == np.uint8
+
+
+def test_create_lut_resamples_small_colormaps():
+    assert (Faerun.create_lut("viridis") == Faerun.create_lut("viridis", 512)).all()
+    assert Faerun.create_lut("tab10").shape == (10, 3)
+    assert Faerun.create_lut("viridis", 16).shape == (16, 3)
+
+
+@pytest.mark.parametrize("bits", [1, 8, 12, 16])
+def test_quantize_error_is_bounded(bits):
+    values = np.random.rand(10000) * 100 - 50
+    quantized, offset, step = Faerun.quantize(values, bits)
+
+    assert quantized.dtype == (np.uint8 if bits <= 8 else np.uint16)
+    assert quantized.max() <= 2**bits - 1
+    assert np.abs(offset + step * quantized - values).max() <= step / 2 * (1 + 1e-9)
+
+
+def test_quantized_coordinates_are_bounded():
+    data = {
+        "x": np.random.rand(1000),
+        "y": np.random.rand(1000),
+        "c": np.random.rand(1000),
+    }
+
+    exact = Faerun(view="front")
+    exact.add_scatter("s", data)
+    expected = exact.create_python_data()["s"]
+
+    quantized = Faerun(view="front", quantization_bits=16)
+    quantized.add_scatter("s", data)
+    layer = quantized.create_python_data()["s"]
+    quantization = layer["meta"]["quantization"]
+
+    for i, coord in enumerate(["x", "y", "z"]):
+        assert layer[coord].dtype == np.uint16
+        values = quantization["offset"][i] + quantization["step"][i] * layer[coord]
+        error = np.abs(values - expected[coord]).max()
+        assert error <= quantization["step"][i] / 2 + 1e-4
+
+
+@pytest.mark.parametrize(
+    "c, categorical, colormap",
+    [
+        (np.arange(1000) % 7, True, "tab10"),
+        (np.random.rand(1000), False, "viridis"),
+        (
+            np.where(np.arange(1000) % 10 == 0, np.nan, np.random.rand(1000)),
+            False,
+            "viridis",
+        ),
+    ],
+)
+def test_palette_colors_equal_rgb_colors(c, categorical, colormap):
+    data = {"x": np.random.rand(1000), "y": np.random.rand(1000), "c": c}
+    colors = {}
+
+    for encoding in ["rgb", "palette", "lut"]:
+        f = Faerun(view="front", color_encoding=encoding)
+        f.add_scatter("s", data, categorical=categorical, colormap=colormap)
+        colors[encoding] = f.create_python_data()["s"]["colors"][0]
+
+    # Categorical series use a palette with both encodings, continuous ones with "lut"
+    assert "index" in colors["lut"]
+
+    rgb = np.stack([colors["rgb"][channel] for channel in "rgb"], axis=1)
+    for encoding in ["palette", "lut"]:
+        if "index" in colors[encoding]:
+            palette = colors[encoding]["palette"]
+            assert np.array_equal(palette[colors[encoding]["index"]], rgb)
+
+
+def test_morton_order_is_a_permutation():
+    coords = [np.random.rand(5000) for _ in range(3)]
+    order = Faerun.morton_order(coords)
+    inverse = Faerun.inverse_permutation(order)
+
+    assert np.array_equal(np.sort(order), np.arange(5000))
+    assert np.array_equal(inverse[order], np.arange(5000))
+    assert np.array_equal(order[inverse], np.arange(5000))
+
+    # The keys of the points are sorted along the curve
+    keys = np.zeros(5000, dtype=np.uint64)
+    for axis, values in enumerate(coords):
+        quantized, _, _ = Faerun.quantize(values, 16)
+        keys |= Faerun.spread_bits(quantized.astype(np.uint64)) << np.uint64(axis)
+    assert (np.diff(keys[order].astype(np.float64)) >= 0).all()
+
+
+def test_spatial_order_permutes_the_points():
+    n = 2000
+    data = {
+        "x": np.random.rand(n),
+        "y": np.random.rand(n),
+        "c": np.random.rand(n),
+        "labels": [str(i) for i in range(n)],
+    }
+    edges = {"from": np.arange(n - 1), "to": np.random.permutation(n)[: n - 1]}
+
+    layers = {}
+    for spatial_order in [False, True]:
+        f = Faerun(view="front", spatial_order=spatial_order)
+        f.add_scatter("s", data)
+        f.add_tree("t", edges, point_helper="s")
+        layers[spatial_order] = f.create_python_data()
+
+    ordered = layers[True]
+    permutation = ordered["s"]["permutation"]
+    inverse = Faerun.inverse_permutation(permutation)
+
+    for key in ["x", "y", "z"]:
+        assert np.array_equal(ordered["s"][key][inverse], layers[False]["s"][key])
+
+    assert [ordered["s"]["labels"][i] for i in inverse] == layers[False]["s"]["labels"]
+
+    # The edges refer to the reordered points
+    for key in ["from", "to"]:
+        assert np.array_equal(permutation[ordered["t"][key]], edges[key])
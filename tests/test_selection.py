@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from faerun.selection import filter_mask
+
+VALUES = [np.arange(10), np.arange(10) % 3, np.array(list("abcdeabcde"))]
+TITLES = ["a", "b", "c"]
+
+
+def test_filter_mask():
+    mask = filter_mask(
+        VALUES,
+        [{"series": "a", "min": 2, "max": 5}, {"series": 1, "values": [0]}],
+        TITLES,
+    )
+    assert np.flatnonzero(mask).tolist() == [3]
+
+
+def test_filter_mask_strings():
+    mask = filter_mask(VALUES, [{"series": "c", "min": "b", "max": "c"}], TITLES)
+    assert np.flatnonzero(mask).tolist() == [1, 2, 6, 7]
+
+
+@pytest.mark.parametrize(
+    "predicate",
+    [
+        {"series": 0, "in": [1, 2]},
+        {"series": 0, "min": 1, "maxx": 2},
+        {"series": 0},
+        {"series": 0, "min": None},
+        {"min": 1},
+        {"series": 3, "min": 1},
+        {"series": -1, "min": 1},
+        {"series": "d", "min": 1},
+        {"series": 0, "min": "a"},
+        {"series": 0, "max": [1]},
+        {"series": 0, "min": True},
+        {"series": 0, "values": 1},
+        {"series": 0, "values": [1, "a"]},
+        {"series": 2, "min": 1},
+    ],
+)
+def test_filter_mask_rejects_invalid_predicates(predicate):
+    with pytest.raises(ValueError):
+        filter_mask(VALUES, [predicate], TITLES)
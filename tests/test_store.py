@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from faerun import Faerun, LabelStore, load_data, save_data
+
+LABELS = ["a", "", "Ünïcödé", "C1=CC=CC=C1__id3", "", "last"]
+
+
+@pytest.mark.parametrize("indices", [[0, 1, 2, 3, 4, 5], [5, 0, 5], [1, 4], []])
+def test_label_store_take(indices):
+    store = LabelStore.from_list(LABELS)
+    assert len(store) == len(LABELS)
+    assert store.take(indices) == [LABELS[i] for i in indices]
+    assert store[np.array(indices, dtype=np.int64)] == [LABELS[i] for i in indices]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("labels", [LABELS, ["", ""]])
+def test_label_store_save_load(tmp_path, mmap, labels):
+    LabelStore.from_list(labels).save(str(tmp_path / "labels"))
+    store = LabelStore.load(str(tmp_path / "labels"), mmap=mmap)
+
+    assert list(store) == labels
+    assert store.take(np.arange(len(labels))) == labels
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_data(tmp_path, mmap):
+    f = Faerun(view="front", spatial_order=True, keep_values=True)
+    n = 500
+    f.add_scatter(
+        "s",
+        {
+            "x": np.random.rand(n),
+            "y": np.random.rand(n),
+            "c": [np.random.rand(n), np.arange(n) % 4],
+            "s": np.random.rand(n),
+            "labels": [LABELS[i % len(LABELS)] for i in range(n)],
+        },
+        categorical=[False, True],
+    )
+    f.add_tree("t", {"from": np.arange(n - 1), "to": np.arange(1, n)}, point_helper="s")
+
+    data = f.create_python_data()
+    save_data(data, str(tmp_path))
+    loaded = load_data(str(tmp_path), mmap=mmap)
+
+    assert sorted(loaded) == sorted(data)
+    for name in data:
+        assert sorted(loaded[name]) == sorted(data[name])
+        assert loaded[name]["type"] == data[name]["type"]
+
+        for key in ["x", "y", "z", "s", "permutation", "from", "to"]:
+            if key in data[name]:
+                assert loaded[name][key].dtype == data[name][key].dtype
+                assert np.array_equal(loaded[name][key], data[name][key])
+
+    layer = loaded["s"]
+    assert isinstance(layer["labels"], LabelStore)
+    assert list(layer["labels"]) == data["s"]["labels"]
+    assert layer["labels"].take([3, 0, 499]) == [
+        data["s"]["labels"][i] for i in [3, 0, 499]
+    ]
+
+    for colors, expected in zip(layer["colors"], data["s"]["colors"]):
+        assert sorted(colors) == sorted(expected)
+        for key in expected:
+            assert np.array_equal(colors[key], expected[key])
+
+    for values, expected in zip(layer["values"], data["s"]["values"]):
+        assert np.array_equal(values, expected)
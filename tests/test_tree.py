@@ -0,0 +1,118 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from faerun.tree import TreeIndex
+
+
+def random_forest(n, components, seed):
+    # Each vertex (except the first of each component) is attached to a random
+    # earlier vertex of its component, the vertices are shuffled afterwards
+    rng = np.random.default_rng(seed)
+    labels = rng.permutation(n)
+    starts = np.sort(rng.choice(np.arange(1, n), components - 1, replace=False))
+    starts = np.r_[0, starts]
+
+    sources = []
+    targets = []
+    for i in range(n):
+        start = starts[np.searchsorted(starts, i, side="right") - 1]
+        if i > start:
+            sources.append(labels[i])
+            targets.append(labels[rng.integers(start, i)])
+
+    adjacency = [[] for _ in range(n)]
+    for u, v in zip(sources, targets):
+        adjacency[u].append(v)
+        adjacency[v].append(u)
+
+    return sources, targets, adjacency
+
+
+def distances(adjacency, source):
+    distance = {source: 0}
+    parent = {source: -1}
+    queue = deque([source])
+
+    while queue:
+        u = queue.popleft()
+        for v in adjacency[u]:
+            if v not in distance:
+                distance[v] = distance[u] + 1
+                parent[v] = u
+                queue.append(v)
+
+    return distance, parent
+
+
+@pytest.fixture(scope="module", params=[0, 1])
+def forest(request):
+    n = 300
+    sources, targets, adjacency = random_forest(n, 4, request.param)
+    return TreeIndex(sources, targets, n), adjacency
+
+
+def test_neighborhood(forest):
+    index, adjacency = forest
+    rng = np.random.default_rng(0)
+
+    for vertex in rng.integers(0, index.n, 20):
+        distance, _ = distances(adjacency, vertex)
+        for hops in [0, 1, 2, 5]:
+            neighborhood = index.neighborhood(vertex, hops)
+            expected = {v for v, d in distance.items() if d <= hops}
+
+            assert len(neighborhood) == len(expected)
+            assert set(neighborhood.tolist()) == expected
+            assert neighborhood[0] == vertex
+            assert (np.diff([distance[v] for v in neighborhood]) >= 0).all()
+
+
+def test_subtree(forest):
+    index, adjacency = forest
+
+    for vertex in range(index.n):
+        for exclude in [None] + adjacency[vertex]:
+            if exclude is None:
+                exclude = int(index.parent[vertex])
+
+            # The subtree is what remains connected after cutting the edge
+            cut = [
+                [w for w in ws if {u, w} != {vertex, exclude}]
+                for u, ws in enumerate(adjacency)
+            ]
+            expected, _ = distances(cut, vertex)
+
+            subtree = index.subtree(vertex, None if exclude < 0 else exclude)
+            assert len(subtree) == len(expected)
+            assert set(subtree.tolist()) == set(expected)
+
+
+def test_path(forest):
+    index, adjacency = forest
+    rng = np.random.default_rng(1)
+
+    for u, v in rng.integers(0, index.n, (200, 2)):
+        distance, parent = distances(adjacency, v)
+        path = index.path(u, v)
+
+        if u not in distance:
+            assert len(path) == 0 and index.lca(u, v) == -1
+            continue
+
+        # The path in a tree is unique, so it equals the one found by a search
+        expected = [u]
+        while expected[-1] != v:
+            expected.append(parent[expected[-1]])
+
+        assert path.tolist() == expected
+
+
+def test_subtree_rejects_non_neighbors(forest):
+    index, adjacency = forest
+    vertex = int(np.argmax([len(a) for a in adjacency]))
+    far = [v for v in range(index.n) if v != vertex and v not in adjacency[vertex]]
+
+    with pytest.raises(ValueError):
+        index.subtree(vertex, far[0])
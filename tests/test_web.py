@@ -0,0 +1,177 @@
+import http.client
+import json
+import socket
+import sys
+
+import cherrypy
+import numpy as np
+import pytest
+
+from faerun import Faerun, save_data
+from faerun.web import FaerunWeb
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    f = Faerun(
+        view="front", spatial_order=True, keep_values=True, color_encoding="palette"
+    )
+    n = 5000
+    f.add_scatter(
+        "s",
+        {
+            "x": np.random.rand(n),
+            "y": np.random.rand(n),
+            "c": np.random.rand(n),
+            "labels": ["C" * (i % 5 + 1) + "__id" + str(i % 100) for i in range(n)],
+        },
+    )
+    f.add_scatter(
+        "p",
+        {
+            "x": np.random.rand(100),
+            "y": np.random.rand(100),
+            "c": np.arange(100) % 3,
+            "labels": [str(i) for i in range(100)],
+        },
+        categorical=True,
+    )
+    path = str(tmp_path_factory.mktemp("data"))
+    save_data(f.create_python_data(), path)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    web = FaerunWeb(path)
+    cherrypy.config.update(
+        {
+            "server.socket_host": "127.0.0.1",
+            "server.socket_port": port,
+            "log.screen": False,
+        }
+    )
+    cherrypy.tree.mount(web, "/")
+    cherrypy.engine.start()
+    cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+
+    yield web, port
+
+    cherrypy.engine.exit()
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    connection.request(method, path, json.dumps(body) if body else None, headers)
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+
+    return response.status, data
+
+
+def test_export_bytes_are_recorded(server):
+    web, port = server
+    status, data = request(port, "POST", "/export", {"name": "s"})
+    assert status == 200 and len(data) > 0
+
+    status, metrics = request(port, "GET", "/metrics")
+    lines = [
+        line
+        for line in metrics.decode().splitlines()
+        if line.startswith("faerun_response_bytes_total") and '"export"' in line
+    ]
+    assert len(lines) == 1
+    assert float(lines[0].split()[-1]) == len(data)
+
+
+def test_search_results_are_sorted(server):
+    web, port = server
+    status, data = request(port, "POST", "/get_index", {"name": "s", "label": "id7"})
+    assert status == 200
+
+    indices = json.loads(data)[0][1]
+    assert indices == list(range(7, 5000, 100))
+
+
+def test_filter_rejects_invalid_predicates(server):
+    web, port = server
+    status, _ = request(
+        port,
+        "POST",
+        "/filter",
+        {"name": "s", "predicates": [{"series": 0, "min": "a"}]},
+    )
+    assert status == 400
+
+
+@pytest.mark.parametrize("quantiles", [0.5, [1.5], [-0.1], ["a"], [[0.5]]])
+def test_stats_rejects_invalid_quantiles(server, quantiles):
+    web, port = server
+    status, _ = request(
+        port,
+        "POST",
+        "/get_stats",
+        {"name": "s", "selection": {"ranges": [[0, 10]]}, "quantiles": quantiles},
+    )
+    assert status == 400
+
+
+def test_stats(server):
+    web, port = server
+    status, data = request(
+        port,
+        "POST",
+        "/get_stats",
+        {"name": "s", "selection": {"ranges": [[0, 10]]}, "quantiles": [0, 1]},
+    )
+    assert status == 200
+
+    values = web.data["s"]["values"][0][np.sort(web.positions["s"][:10])]
+    series = json.loads(data)["series"][0]
+    assert series["count"] == 10
+    assert series["quantiles"] == [[0, values.min()], [1, values.max()]]
+
+
+def test_parquet_export_without_pyarrow(server, monkeypatch):
+    web, port = server
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    status, _ = request(port, "POST", "/export", {"name": "s", "format": "parquet"})
+    assert status == 400
+
+
+def test_colors_are_views_of_the_encoded_series(server):
+    web, port = server
+    for name in ["s", "p"]:
+        for colors, encoded in zip(web.data[name]["colors"], web.series[name]):
+            buffer = np.frombuffer(encoded, dtype=np.uint8)
+            for channel in ["r", "g", "b", "index"]:
+                if channel in colors:
+                    assert np.shares_memory(colors[channel], buffer)
+
+
+@pytest.mark.parametrize(
+    "name, coord, dtype, expected",
+    [
+        ("s", "g", "uint8", 200),
+        ("s", "g", "float32", 200),
+        ("s", "index", "uint8", 400),
+        ("p", "index", "uint8", 200),
+        ("p", "r", "uint8", 400),
+        ("s", "g", "int64", 400),
+    ],
+)
+def test_get_values(server, name, coord, dtype, expected):
+    web, port = server
+    status, data = request(
+        port,
+        "POST",
+        "/get_values",
+        {"name": name, "coord": coord, "dtype": dtype, "series": 0},
+    )
+    assert status == expected
+
+    if status == 200:
+        values = np.asarray(web.data[name]["colors"][0][coord], dtype=dtype)
+        assert data == values.tobytes()